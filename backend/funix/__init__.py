@@ -12,13 +12,16 @@ from gitignore_parser import parse_gitignore
 
 import funix.decorator as decorator
 import funix.decorator.call as call
+import funix.decorator.file as file
 import funix.decorator.limit as limit
 import funix.decorator.lists as lists
 import funix.decorator.secret as secret
 import funix.decorator.theme as theme
 import funix.decorator.widget as widget
 import funix.hint as hint
+import funix.session as session
 from funix.app import app, sock, enable_funix_host_checker
+from funix.app.server import parse_server, run_production_server
 from funix.config.switch import GlobalSwitchOption
 from funix.frontend import run_open_frontend, start
 from funix.jupyter import jupyter
@@ -55,6 +58,9 @@ new_funix_type_with_config_func = hint.new_funix_type_with_config_func
 new_funix_type = hint.new_funix_type
 set_app_secret = secret.set_app_secret
 generate_redirect_link = widget.generate_redirect_link
+set_file_storage = file.set_file_storage
+set_limit_store = limit.set_limit_store
+set_session_store = session.set_session_store
 # ---- Util ----
 
 # ---- Exports ----
@@ -292,6 +298,9 @@ def get_flask_application(
     app_secret: Optional[str | bool] = False,
     global_rate_limit: decorator.Limiter | list | dict = None,
     ip_headers: Optional[list[str]] = None,
+    limit_store: Optional[str] = None,
+    session_store: Optional[str] = None,
+    share_globals: Optional[bool] = False,
     __kumo_callback_url: Optional[str] = None,
     __kumo_callback_token: Optional[str] = None,
     __host_regex: Optional[str] = None,
@@ -311,6 +320,13 @@ def get_flask_application(
             default is an empty list
         ip_headers (list[str] | None): IP headers for extraction instead of peer IP, useful for applications
             behind reverse proxies
+        limit_store (str): Where the rate limits are counted, `memory`, `sqlite:///path/to/file.db` or
+                           `redis://host:port/db`, default is None (memory of each worker)
+        session_store (str): Where the session variables are kept, `memory`, `sqlite:///path/to/file.db` or
+                             `redis://host:port/db`, default is None (memory of each worker)
+        share_globals (bool): If you want the browsers to share the default global variables copy-on-write instead of
+                              deep copying them, see `GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES`, default is
+                              False
         __kumo_callback_url (str): The Kumo callback url, default is None, do not set it if you don't know what it is.
         __kumo_callback_token (str): The Kumo callback token, default is None, do not set it if you don't know what
                                      it is.
@@ -321,8 +337,14 @@ def get_flask_application(
     """
     new_global_rate_limit = [] if global_rate_limit is None else global_rate_limit
     call.set_kumo_info(__kumo_callback_url, __kumo_callback_token)
+    if limit_store is not None:
+        limit.set_limit_store(limit_store)
+    if session_store is not None:
+        session.set_session_store(session_store)
+    if share_globals:
+        GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES = True
     limit.set_rate_limiters(
-        limit.parse_limiter_args(new_global_rate_limit, "global_rate_limit")
+        limit.parse_limiter_args(new_global_rate_limit, "global_rate_limit", "global")
     )
     limit.set_ip_header(ip_headers)
     if __host_regex:
@@ -364,6 +386,13 @@ def run(
     transform: Optional[bool] = False,
     app_secret: Optional[str | bool] = False,
     default: Optional[str] = None,
+    server: Optional[str] = None,
+    workers: Optional[int] = None,
+    threads: Optional[int] = None,
+    file_storage: Optional[str] = None,
+    limit_store: Optional[str] = None,
+    session_store: Optional[str] = None,
+    share_globals: Optional[bool] = False,
 ) -> None:
     """
     Run the funix app.
@@ -382,10 +411,33 @@ def run(
         transform (bool): If you want to enable transform mode, default is False
         app_secret (str | bool): If you want to set an app secret, default is False
         default (str): Default function name, default is None
+        server (str): The server to use, `werkzeug` (development server) or `gunicorn`, default is None.
+                      If `workers` is set and `server` is None, `gunicorn` is used.
+        workers (int): The number of worker processes for the production server, default is None
+        threads (int): The number of threads per worker for the production server, default is None
+        file_storage (str): Where the returned files are kept, `memory`, `file:///path/to/directory` or
+                            `s3://bucket/prefix?endpoint_url=...`, default is None (memory)
+        limit_store (str): Where the rate limits are counted, `memory`, `sqlite:///path/to/file.db` or
+                           `redis://host:port/db`, default is None (memory of each worker)
+        session_store (str): Where the session variables are kept, `memory`, `sqlite:///path/to/file.db` or
+                             `redis://host:port/db`, default is None (memory of each worker)
+        share_globals (bool): If you want the browsers to share the default global variables copy-on-write instead of
+                              deep copying them, see `GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES`, default is
+                              False
 
     Returns:
         None
     """
+    server_ = parse_server(server, workers)
+    if file_storage is not None:
+        file.set_file_storage(file_storage)
+    if limit_store is not None:
+        limit.set_limit_store(limit_store)
+    if session_store is not None:
+        session.set_session_store(session_store)
+    if share_globals:
+        GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES = True
+
     dir_mode = exists(file_or_module_name) and isdir(file_or_module_name)
 
     if dir_mode and package_mode:
@@ -437,4 +489,9 @@ def run(
         print(f"Starting Funix backend only at http://{host}:{parsed_port}")
     if not no_frontend and not no_browser:
         run_open_frontend(parsed_ip, parsed_port)
-    app.run(host=host, port=parsed_port, debug=dev)
+    if server_ == "gunicorn":
+        if dev:
+            print("WARNING: Development mode is not supported by gunicorn, ignored.")
+        run_production_server(app, host, parsed_port, workers, threads)
+    else:
+        app.run(host=host, port=parsed_port, debug=dev)
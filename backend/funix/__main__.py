@@ -22,10 +22,42 @@ from funix.util.secret import get_secret_key_from_option
 @plac.flg("package", "Enable package mode", abbrev="P")
 @plac.flg("dev", "Enable development mode", abbrev="d")
 @plac.flg("transform", "Transform the globals to a session variables", abbrev="t")
+@plac.flg(
+    "share_globals",
+    "Share the default globals copy-on-write between the browsers instead of copying them",
+    abbrev="c",
+)
 @plac.opt("from_git", "Import module from git", abbrev="g")
 @plac.opt("repo_dir", "The directories in the repo that need to be used", abbrev="r")
 @plac.opt("secret", "The secret key for the full app", abbrev="s")
 @plac.opt("default", "The default function to run", abbrev="D")
+@plac.opt(
+    "server",
+    "The server to run Funix, `werkzeug` (development server) or `gunicorn`",
+    abbrev="S",
+)
+@plac.opt(
+    "workers",
+    "The number of worker processes, implies `--server gunicorn`",
+    type=int,
+    abbrev="w",
+)
+@plac.opt("threads", "The number of threads per worker", type=int, abbrev="T")
+@plac.opt(
+    "file_storage",
+    "Where the returned files are kept, `memory`, `file:///path/to/directory` or `s3://bucket/prefix`",
+    abbrev="f",
+)
+@plac.opt(
+    "limit_store",
+    "Where the rate limits are counted, `memory`, `sqlite:///path/to/file.db` or `redis://host:port/db`",
+    abbrev="l",
+)
+@plac.opt(
+    "session_store",
+    "Where the session variables are kept, `memory`, `sqlite:///path/to/file.db` or `redis://host:port/db`",
+    abbrev="G",
+)
 def main(
     file_folder_or_module_name=None,
     host="0.0.0.0",
@@ -39,6 +71,13 @@ def main(
     repo_dir=None,
     secret=None,
     default=None,
+    server=None,
+    workers=None,
+    threads=None,
+    file_storage=None,
+    limit_store=None,
+    session_store=None,
+    share_globals=False,
 ):
     """Funix: Building web apps without manually creating widgets
 
@@ -72,6 +111,13 @@ def main(
         transform=transform,
         app_secret=parsed_secret,
         default=default,
+        server=server,
+        workers=workers,
+        threads=threads,
+        file_storage=file_storage,
+        limit_store=limit_store,
+        session_store=session_store,
+        share_globals=share_globals,
     )
 
 
@@ -9,6 +9,7 @@ import re
 from datetime import datetime, timezone
 from io import BytesIO
 from pathlib import Path
+from typing import Callable
 from urllib.parse import urlparse
 from uuid import uuid4
 
@@ -22,6 +23,7 @@ from funix.decorator.file import get_file_info
 from funix.decorator.lists import get_uuid_with_name
 from funix.frontend import start
 from funix.hint import LogLevel
+from funix.session import save_session_variables
 
 from json import loads
 
@@ -175,6 +177,7 @@ def get_new_app_and_sock_for_jupyter() -> tuple[Flask, Sock]:
     new_sock = Sock(new_app)
     add_sock_route(new_sock)
     new_app.after_request(funix_auto_cors)
+    new_app.teardown_request(save_session_variables)
     start(new_app)
 
     return new_app, new_sock
@@ -253,7 +256,8 @@ def __api_call_data(
         req_json = None
 
     try:
-        resp_json = response.json
+        # Reading a streamed response would consume it before it is sent, see `__log_response`
+        resp_json = None if response.is_streamed else response.json
     except:
         resp_json = None
 
@@ -297,6 +301,36 @@ def __api_call_data(
     }
 
 
+def __log_response(
+    response: Response,
+    data: dict,
+    write: Callable[[dict], None],
+    dict_to_json: bool = False,
+) -> None:
+    """
+    Write the log of a response. A streamed JSON response is logged once it is sent, with its size and head instead
+    of its value.
+
+    Parameters:
+        response (flask.Response): The response.
+        data (dict): The log, from `__api_call_data`.
+        write (Callable[[dict], None]): Write the log.
+        dict_to_json (bool): Whether the values of the log are dumped to JSON.
+    """
+    summary = getattr(response, "funix_stream_summary", None)
+    if summary is None:
+        write(data)
+        return
+
+    def write_summary():
+        data["response"] = (
+            json.dumps(summary.to_dict()) if dict_to_json else summary.to_dict()
+        )
+        write(data)
+
+    response.call_on_close(write_summary)
+
+
 if funix_log_level != LogLevel.OFF:
     storage_path = Path(os.environ.get("FUNIX_TELEMETRY_STORAGE", default="logs.jsonl"))
     if storage_path.suffix == ".db":
@@ -322,15 +356,17 @@ if funix_log_level != LogLevel.OFF:
             if data is None:
                 return response
 
-            with engine.connect() as con:
-                con.execute(
-                    text(
-                        "INSERT INTO logs (log_time, request, response) VALUES (:time, :request, :response)"
-                    ),
-                    [data],
-                )
-                con.commit()
-
+            def write(data: dict) -> None:
+                with engine.connect() as con:
+                    con.execute(
+                        text(
+                            "INSERT INTO logs (log_time, request, response) VALUES (:time, :request, :response)"
+                        ),
+                        [data],
+                    )
+                    con.commit()
+
+            __log_response(response, data, write, dict_to_json=True)
             return response
 
     elif storage_path.suffix == ".jsonl":
@@ -344,9 +380,10 @@ if funix_log_level != LogLevel.OFF:
             if data is None:
                 return response
 
-            jsonl_file.write(json.dumps(data))
-            jsonl_file.write("\n")
+            def write(data: dict) -> None:
+                jsonl_file.write(json.dumps(data) + "\n")
 
+            __log_response(response, data, write)
             return response
 
     else:
@@ -0,0 +1,143 @@
+"""
+Production server for funix.
+
+The Flask development server (Werkzeug) has a single process and no worker management, this module runs the same
+`app` and `sock` objects under gunicorn with multiple worker processes and threads instead.
+"""
+
+from ipaddress import ip_address
+from sys import platform
+from typing import Literal, Optional
+
+from flask import Flask
+
+ServerType = Literal["werkzeug", "gunicorn"]
+"""
+Supported servers, `werkzeug` is the Flask development server.
+"""
+
+__gunicorn_use = False
+"""
+Whether Funix can use gunicorn as the production server.
+"""
+
+try:
+    from gunicorn.app.base import BaseApplication
+
+    __gunicorn_use = True
+except:
+    pass
+
+
+def get_bind_address(host: str, port: int) -> str:
+    """
+    Get the gunicorn bind address, IPv6 addresses are wrapped in brackets.
+
+    Parameters:
+        host (str): The host.
+        port (int): The port.
+
+    Returns:
+        str: The bind address.
+
+    Examples / Doctest:
+        >>> assert get_bind_address("0.0.0.0", 3000) == "0.0.0.0:3000"
+        >>> assert get_bind_address("::", 3000) == "[::]:3000"
+    """
+    if ip_address(host).version == 6:
+        return f"[{host}]:{port}"
+    return f"{host}:{port}"
+
+
+def parse_server(server: Optional[str], workers: Optional[int]) -> ServerType:
+    """
+    Decide which server to use. Passing `workers` without a server implies gunicorn.
+
+    Parameters:
+        server (str | None): The server name, `werkzeug` or `gunicorn`.
+        workers (int | None): The number of workers.
+
+    Returns:
+        ServerType: The server to use.
+
+    Raises:
+        ValueError: If the server is not supported.
+    """
+    if server is None:
+        return "gunicorn" if workers else "werkzeug"
+    server = server.lower()
+    if server not in ("werkzeug", "gunicorn"):
+        raise ValueError(
+            f"Unsupported server: {server}, Funix only supports `werkzeug` and `gunicorn`."
+        )
+    return server
+
+
+def run_production_server(
+    flask_app: Flask,
+    host: str,
+    port: int,
+    workers: Optional[int] = None,
+    threads: Optional[int] = None,
+) -> None:
+    """
+    Run the flask app (and the websocket routes registered by `flask_sock`) under gunicorn.
+
+    The app is already imported when this function is called, so the workers are forked from this process
+    (like `--preload`) and share the decorated functions, the session key and the routes.
+    Websockets need a threaded worker, so the `gthread` worker class is always used.
+
+    Parameters:
+        flask_app (Flask): The flask app.
+        host (str): The host.
+        port (int): The port.
+        workers (int | None): The number of worker processes, default is 1.
+        threads (int | None): The number of threads per worker, default is 32.
+
+    Raises:
+        RuntimeError: If gunicorn is not installed or the platform is not supported.
+    """
+    if platform == "win32":
+        raise RuntimeError(
+            "gunicorn is not supported on Windows, please use WSL or the default server."
+        )
+    if not __gunicorn_use:
+        raise RuntimeError(
+            "gunicorn is not installed, please install it first! `pip install funix[production]`"
+        )
+
+    options = {
+        "bind": get_bind_address(host, port),
+        "workers": workers if workers else 1,
+        "threads": threads if threads else 32,
+        "worker_class": "gthread",
+        "preload_app": True,
+        "accesslog": "-",
+    }
+
+    class FunixApplication(BaseApplication):
+        """
+        Gunicorn application that serves an existing flask app.
+        """
+
+        def __init__(self, application: Flask, config: dict):
+            self.application = application
+            self.options = config
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if key in self.cfg.settings and value is not None:
+                    self.cfg.set(key.lower(), value)
+
+        def load(self):
+            return self.application
+
+    if options["workers"] > 1:
+        print(
+            "WARNING: Funix is running with multiple worker processes, file links and the handles of paged "
+            "DataFrame results are kept in each worker process (use sticky sessions), and so are rate limits "
+            "and session variables unless `limit_store` and `session_store` are set."
+        )
+
+    FunixApplication(flask_app, options).run()
@@ -1,55 +1,223 @@
 """
 Websocket class to redirect
 """
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
 from io import StringIO
 from json import dumps
+from threading import Lock
+from time import monotonic
+from typing import Generator, TextIO
+
+from funix.config.switch import GlobalSwitchOption
+from funix.util.scheduler import ScheduledCall, call_later
 
 
 class StdoutToWebsocket:
     """
     Stdout to websocket.
+
+    Only the new text is sent, as `{"stream_delta": text}` frames. Writes within
+    `GlobalSwitchOption.STREAM_FLUSH_INTERVAL` are merged into one frame, the trailing ones are sent later by the
+    shared scheduler (`funix.util.scheduler`).
+    After `flush`, the next write starts a new buffer, the frame has `"stream_reset": true`. Frames of stderr have
+    `"stream_error": true`. The frontend rebuilds the full text.
     """
 
     encoding = "utf-8"
 
-    def __init__(self, ws, is_err=False):
+    def __init__(self, ws, is_err=False, send_lock=None):
         """
         Initialize the StdoutToWebsocket.
 
         Parameters:
             ws (WebSocket): The websocket.
+            is_err (bool): Whether this is stderr.
+            send_lock (Lock | None): The lock for sending, shared by the streams of the same websocket.
         """
         self.ws = ws
         self.is_err = is_err
         self.value = StringIO()
+        self.reset = False
+        self.reset_on_write = False
+        self.last_send = 0.0
+        self.timer: ScheduledCall | None = None
+        self.lock = Lock()
+        self.send_lock = send_lock if send_lock else Lock()
 
-    def _get_html(self):
+    def _send(self):
         """
-        Get the html data.
+        Send the pending data to the websocket. Must be called with `self.lock`.
         """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
         value = self.value.getvalue()
-        if self.is_err and value.strip():
-            return f"`{value}`"
-        return value
+        if not value and not self.reset:
+            return
+        message = {"stream_delta": value}
+        if self.reset:
+            message["stream_reset"] = True
+        if self.is_err:
+            message["stream_error"] = True
+        self.value = StringIO()
+        self.reset = False
+        self.last_send = monotonic()
+        with self.send_lock:
+            self.ws.send(dumps(message))
+
+    def _send_later(self):
+        """
+        Send the trailing data, called by the scheduler.
+        """
+        with self.lock:
+            self.timer = None
+            self._send()
 
     def write(self, data):
         """
         Write the data to the websocket.
         """
-        self.value.write(data)
-        self.ws.send(dumps([self._get_html()]))
+        with self.lock:
+            if self.reset_on_write:
+                # The unsent data would be cleared by the reset anyway
+                self.value = StringIO()
+                self.reset = True
+                self.reset_on_write = False
+            self.value.write(data)
+            interval = GlobalSwitchOption.STREAM_FLUSH_INTERVAL
+            elapsed = monotonic() - self.last_send
+            if (
+                interval <= 0
+                or elapsed >= interval
+                or self.value.tell() >= GlobalSwitchOption.STREAM_FLUSH_SIZE
+            ):
+                self._send()
+            elif self.timer is None:
+                self.timer = call_later(interval - elapsed, self._send_later)
+        return len(data)
 
     def writelines(self, data):
         """
         Write the lines to the websocket.
         """
-        self.value.writelines(data)
-        self.ws.send(dumps([self._get_html()]))
+        self.write("".join(data))
 
     def flush(self):
         """
-        Flush the data to the websocket.
+        Flush the data to the websocket, the next write starts a new buffer.
         """
-        self.value.flush()
-        self.ws.send(dumps([self._get_html()]))
-        self.value = StringIO()
+        with self.lock:
+            self.reset_on_write = True
+
+    def close(self):
+        """
+        Send the pending data, must be called before the websocket is closed.
+        """
+        with self.lock:
+            self._send()
+
+
+class StdoutRouter:
+    """
+    Stdout router.
+
+    Installed once as `sys.stdout` (or `sys.stderr`), every write goes to the `StdoutToWebsocket` of the current
+    context, or to the original stream if there is none. So concurrent `print_to_web` calls each get their own output,
+    and the global `sys.stdout` is never swapped per request.
+    """
+
+    def __init__(self, original: TextIO, target: ContextVar):
+        """
+        Initialize the StdoutRouter.
+
+        Parameters:
+            original (TextIO): The original stream.
+            target (ContextVar): The context variable holding the `StdoutToWebsocket` of the current request.
+        """
+        self.original = original
+        self.target = target
+
+    def _get_stream(self):
+        """
+        Get the stream of the current context.
+        """
+        stream = self.target.get()
+        return self.original if stream is None else stream
+
+    def write(self, data):
+        """
+        Write the data to the stream of the current context.
+        """
+        return self._get_stream().write(data)
+
+    def writelines(self, data):
+        """
+        Write the lines to the stream of the current context.
+        """
+        return self._get_stream().writelines(data)
+
+    def flush(self):
+        """
+        Flush the stream of the current context.
+        """
+        return self._get_stream().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._get_stream(), name)
+
+
+__stdout_target: ContextVar[StdoutToWebsocket | None] = ContextVar(
+    "funix_stdout_target", default=None
+)
+"""
+The `StdoutToWebsocket` for stdout of the current request.
+"""
+
+__stderr_target: ContextVar[StdoutToWebsocket | None] = ContextVar(
+    "funix_stderr_target", default=None
+)
+"""
+The `StdoutToWebsocket` for stderr of the current request.
+"""
+
+__router_lock = Lock()
+"""
+Lock for installing the routers.
+"""
+
+
+def install_stdout_router() -> None:
+    """
+    Install the routers as `sys.stdout` and `sys.stderr`, if they are not installed (or were replaced by others).
+    """
+    with __router_lock:
+        if not isinstance(sys.stdout, StdoutRouter):
+            sys.stdout = StdoutRouter(sys.stdout, __stdout_target)
+        if not isinstance(sys.stderr, StdoutRouter):
+            sys.stderr = StdoutRouter(sys.stderr, __stderr_target)
+
+
+@contextmanager
+def redirect_stdout_to_websocket(ws) -> Generator[None, None, None]:
+    """
+    Redirect the stdout and stderr of the current context (request) to the websocket.
+    The coroutines run by funix on the shared event loop get the context too.
+
+    Parameters:
+        ws (WebSocket): The websocket.
+    """
+    install_stdout_router()
+    send_lock = Lock()
+    stdout = StdoutToWebsocket(ws, send_lock=send_lock)
+    stderr = StdoutToWebsocket(ws, is_err=True, send_lock=send_lock)
+    stdout_token = __stdout_target.set(stdout)
+    stderr_token = __stderr_target.set(stderr)
+    try:
+        yield
+    finally:
+        __stdout_target.reset(stdout_token)
+        __stderr_target.reset(stderr_token)
+        stdout.close()
+        stderr.close()
@@ -27,13 +27,26 @@ supported_upload_widgets = ["image", "video", "audio", "file"]
 A list, contains the upload widget names.
 """
 
-banned_function_name_and_path = ["list", "file", "static", "config", "param", "call"]
+banned_function_name_and_path = [
+    "list",
+    "file",
+    "static",
+    "config",
+    "param",
+    "call",
+    "__funix",
+]
 """
 The banned function name and path.
 
 Reason: Funix has used these paths.
 """
 
+internal_route_prefix = "/__funix"
+"""
+The prefix of the other routes of funix, e.g. `/__funix/metrics`, so they take no more names from the apps.
+"""
+
 basic_widgets = [
     "slider",
     "input",
@@ -77,6 +90,7 @@ A dict, key is the IPython type name, value is the Funix type name.
 dataframe_convert_dict = {
     "pandera.typing.pandas.DataFrame": "Dataframe",
     "pandas.core.frame.DataFrame": "Dataframe",
+    "pandas.DataFrame": "Dataframe",
 }
 """
 A dict, key is the dataframe type name, value is the Funix type name.
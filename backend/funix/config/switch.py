@@ -38,9 +38,68 @@ class SwitchOption:
     BIGGER_DATA_SAVE_TO_TEMP: int = 1024 * 1024 * 10
     """The bigger data size to save to temp (bytes), -1 for always in memory"""
 
+    FILE_MEMORY_LIMIT: int = 1024 * 1024 * 256
+    """The max total size (bytes) of the files kept in memory, the least recently served ones are moved to temp files
+    when it is exceeded, -1 for no limit"""
+
+    FIGURE_CACHE_SIZE: int = 1024 * 1024 * 32
+    """The max total size (bytes) of the rendered matplotlib images kept to serve the same figures again, 0 for no
+    cache"""
+
+    FIGURE_CACHE_KEY_LIMIT: int = 1024 * 1024
+    """The max pickled size (bytes) of the matplotlib figures looked up in the render cache, the larger ones are
+    rendered without a key, -1 for no limit"""
+
+    FIGURE_RENDER_THREADS: int = 4
+    """The number of threads rendering matplotlib figures, read when the first figure is rendered, 1 for rendering
+    them one by one"""
+
     NOTEBOOK_AUTO_EXECUTION: bool = False
     """In notebook, auto run the flask app"""
 
+    STREAM_FLUSH_INTERVAL: float = 0.05
+    """The min interval (seconds) between two websocket frames of `print_to_web`, prints in between are merged, 0 for
+    sending every print"""
+
+    STREAM_FLUSH_SIZE: int = 1024 * 64
+    """The pending `print_to_web` output size (characters) that is sent at once, regardless of the interval"""
+
+    RESULT_PAGE_SIZE: int = 1000
+    """DataFrame results with more rows are kept on the server and sent page by page, -1 for always sending all
+    rows"""
+
+    RESULT_EXPIRE_TIME: int = 60 * 30
+    """The expire time (seconds) of the DataFrame results kept on the server, -1 for never expire"""
+
+    RESULT_MEMORY_LIMIT: int = 1024 * 1024 * 256
+    """The max estimated total size (bytes) of the DataFrame results kept in the memory of a worker, the least
+    recently used ones are evicted when it is exceeded, -1 for no limit"""
+
+    UPLOAD_LIMIT: int = 1024 * 1024 * 100
+    """The max size (bytes) of one upload request of the upload widgets, for the functions without `upload_limit`,
+    -1 for no limit"""
+
+    UPLOAD_SESSION_LIMIT: int = 1024 * 1024 * 500
+    """The max total size (bytes) of the uploaded files kept for one browser, until they expire, -1 for no limit"""
+
+    UPLOAD_EXPIRE_TIME: int = 60 * 30
+    """The expire time (seconds) of the uploaded files, -1 for never expire"""
+
+    LIMIT_SWEEP_INTERVAL: int = 60
+    """The interval (seconds) between two sweeps of the rate limit states of the idle clients, -1 for never"""
+
+    SESSION_EXPIRE_TIME: int = 60 * 60 * 24
+    """The time (seconds) the session variables (`funix.session`) of a browser are kept without requests, -1 for
+    never expire"""
+
+    SESSION_MEMORY_LIMIT: int = 1024 * 1024 * 256
+    """The max estimated total size (bytes) of the session variables kept in memory, the least recently used browsers
+    are evicted when it is exceeded, -1 for no limit"""
+
+    SHARE_DEFAULT_GLOBAL_VARIABLES: bool = False
+    """Share the default global variables (`funix.session`, and the globals of apps run with `-t`) copy-on-write
+    between the browsers, unless set with `shared=False`, see `funix.session.shared`"""
+
     __session_key = None
 
     @property
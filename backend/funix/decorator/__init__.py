@@ -6,7 +6,7 @@ import ast
 import inspect
 from functools import wraps
 from importlib import import_module
-from inspect import getsource, isgeneratorfunction, signature
+from inspect import getsource, isasyncgenfunction, isgeneratorfunction, signature
 from secrets import token_hex
 from types import ModuleType
 from typing import Callable, Optional, ParamSpec, TypeVar, Union, Literal
@@ -22,9 +22,20 @@ from funix.config.switch import GlobalSwitchOption
 from funix.decorator.all_of import parse_all_of
 from funix.decorator.annnotation_analyzer import register_ipywidgets, register_pandera
 from funix.decorator.call import funix_call
+from funix.decorator.executor import create_executor
 from funix.decorator.file import enable_file_service
 from funix.decorator.layout import handle_input_layout, handle_output_layout
 from funix.decorator.limit import Limiter, parse_limiter_args
+from funix.decorator.metrics import enable_metrics
+from funix.decorator.result import enable_result_service
+from funix.decorator.upload import (
+    UploadFunction,
+    enable_upload_service,
+    get_upload_keys,
+    get_upload_limit,
+    get_upload_mode,
+    register_upload_function,
+)
 from funix.decorator.lists import (
     decorated_functions_list_append,
     enable_list,
@@ -61,6 +72,7 @@ from funix.hint import (
     DirectionType,
     DynamicDefaultsType,
     ExamplesType,
+    ExecutorType,
     InputLayout,
     LabelsType,
     Markdown,
@@ -68,10 +80,15 @@ from funix.hint import (
     PreFillType,
     ReactiveType,
     TreatAsType,
+    UploadType,
+    VectorizedType,
     WhitelistType,
     WidgetsType,
 )
 from funix.jupyter import jupyter
+from funix.session import enable_session_store
+from funix.util.arrow import is_arrow_enabled
+from funix.util.json_stream import json_response
 from funix.util.module import funix_menu_to_safe_function_name
 from funix.util.text import un_indent
 from funix.util.uri import get_endpoint
@@ -185,6 +202,10 @@ def enable_wrapper() -> None:
 
         enable_list(app)
         enable_file_service(app)
+        enable_metrics(app)
+        enable_result_service(app)
+        enable_upload_service(app)
+        enable_session_store(app)
 
 
 def object_is_handled(app_: Flask, object_id: int) -> bool:
@@ -231,6 +252,13 @@ def funix(
     menu: Optional[str] = None,
     default: bool = False,
     rate_limit: RateLimiter = None,
+    concurrency: Optional[int] = None,
+    executor: ExecutorType = None,
+    max_queue: Optional[int] = None,
+    vectorized: VectorizedType = False,
+    batch_size: Optional[int] = None,
+    upload: UploadType = "bytes",
+    upload_limit: Optional[int] = None,
     reactive: ReactiveType = None,
     print_to_web: bool = False,
     autorun: AutoRunType = False,
@@ -281,6 +309,18 @@ def funix(
             You don't need to set it unless you are funixing a directory and package.
         default(bool): whether this function is the default function
         rate_limit(Limiter | list[Limiter]): rate limiters, an object or a list
+        concurrency(int): max number of calls of this function running at the same time, the others wait in a queue
+        executor(ExecutorType): run the calls in a "thread" or "process" pool of `concurrency` workers
+            "process" is not available for generator and `print_to_web` functions
+        max_queue(int): max number of waiting calls, the others get a 503 response, unlimited if None
+        vectorized(VectorizedType): for `treat_as="cell"`, call the function once with whole columns instead of once
+            per row, the function returns a column. True for lists, "numpy" for NumPy arrays
+        batch_size(int): for `treat_as="cell"`, split the rows into chunks of this size and run them in parallel,
+            the results are merged in order
+        upload(UploadType): pass the files of the upload widgets as "bytes", a "path" or an opened "file",
+            for the parameters not annotated with `PathFile` or `StreamFile`
+        upload_limit(int): max size of one upload request (bytes) of the upload widgets, -1 for no limit,
+            `GlobalSwitchOption.UPLOAD_LIMIT` if None
         reactive(ReactiveType): reactive config
         print_to_web(bool): handle all stdout to web
         autorun(bool): allow users to use continuity runs on the front end
@@ -471,7 +511,9 @@ def funix(
             else:
                 __decorated_functions_names_list[app_.name].append(function_title)
 
-            need_websocket = isgeneratorfunction(function)
+            need_websocket = isgeneratorfunction(function) or isasyncgenfunction(
+                function
+            )
 
             function_signature = signature(function)
             function_params = function_signature.parameters
@@ -687,6 +729,76 @@ def funix(
             )
             all_of = parse_all_of(safe_conditional_visible, json_schema_props)
 
+            if executor == "process" and need_websocket:
+                raise ValueError(
+                    f"{function_name} is a generator or `print_to_web` function, "
+                    f"it cannot run in a process pool, please use `executor='thread'`"
+                )
+            call_executor = create_executor(endpoint, concurrency, executor, max_queue)
+
+            if vectorized or batch_size is not None:
+                if batch_size is not None and (
+                    type(batch_size) is not int or batch_size < 1
+                ):
+                    raise ValueError(
+                        f"{function_name}: `batch_size` must be a positive int"
+                    )
+                if need_websocket:
+                    raise ValueError(
+                        f"{function_name}: `vectorized` and `batch_size` are not available for generator and "
+                        f"`print_to_web` functions"
+                    )
+                if not any(
+                    prop.get("treat_as") == "cell"
+                    for prop in json_schema_props.values()
+                ):
+                    raise ValueError(
+                        f"{function_name}: `vectorized` and `batch_size` need parameters with `treat_as='cell'`"
+                    )
+
+            upload_keys = get_upload_keys(json_schema_props)
+            if upload not in ("bytes", "path", "file"):
+                raise ValueError(
+                    f"{function_name}: `upload` must be 'bytes', 'path' or 'file'"
+                )
+            if upload_limit is not None and (
+                type(upload_limit) is not int
+                or (upload_limit < 1 and upload_limit != -1)
+            ):
+                raise ValueError(
+                    f"{function_name}: `upload_limit` must be a positive int or -1"
+                )
+            upload_modes = {
+                upload_key: get_upload_mode(
+                    function_params[upload_key].annotation, upload
+                )
+                for upload_key in upload_keys
+                if upload_key in function_params
+            }
+            if "file" in upload_modes.values() and executor == "process":
+                raise ValueError(
+                    f"{function_name}: opened files cannot be passed to a process pool, please use "
+                    f"`upload='path'` or `PathFile`"
+                )
+            limiters = parse_limiter_args(rate_limit, scope=endpoint)
+
+            if upload_keys:
+                register_upload_function(
+                    UploadFunction(
+                        function_id,
+                        upload_limit,
+                        limiters,
+                        call_executor,
+                        app_.name,
+                        secret_key,
+                    ),
+                    endpoint,
+                )
+                for upload_key in upload_keys:
+                    json_schema_props[upload_key]["upload_limit"] = get_upload_limit(
+                        upload_limit
+                    )
+
             decorated_function = {
                 "id": function_id,
                 "name": function_name,
@@ -708,6 +820,7 @@ def funix(
                 },
                 "destination": destination,
                 "source": source_code,
+                "arrow": is_arrow_enabled(),
             }
 
             get_wrapper_id = app_.get(f"/param/{function_id}")
@@ -780,8 +893,6 @@ def funix(
                 verify_secret_endpoint(verify_secret)
                 verify_secret_id(verify_secret)
 
-            limiters = parse_limiter_args(rate_limit)
-
             @wraps(function)
             def wrapper(ws=None):
                 result = funix_call(
@@ -798,8 +909,14 @@ def funix(
                     print_to_web,
                     secret_key,
                     matplotlib_format,
+                    call_executor,
+                    vectorized,
+                    batch_size,
+                    upload_modes,
                     ws,
                 )
+                if isinstance(result, (list, dict)):
+                    return json_response(result)
                 if result is not None:
                     return result
 
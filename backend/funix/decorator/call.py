@@ -1,25 +1,33 @@
-import sys
-from copy import deepcopy
+from contextvars import copy_context
 from functools import wraps
-from inspect import isgeneratorfunction
+from inspect import isasyncgenfunction, iscoroutinefunction, isgeneratorfunction
 from json import dumps, loads
+from time import perf_counter
 from traceback import format_exc
 from typing import Any, Callable
-from urllib.request import urlopen
 from uuid import uuid4
 
 from flask import request, session
+from numpy import asarray
 from requests import post
 
-from funix.app.websocket import StdoutToWebsocket
-from funix.config import supported_upload_widgets
-from funix.decorator.limit import Limiter, global_rate_limiters
+from funix.app.websocket import redirect_stdout_to_websocket
+from funix.config import supported_basic_types_dict
+from funix.decorator.executor import CallExecutor, get_batch_pool
+from funix.decorator.limit import Limiter, check_rate_limits, get_rate_limiters
 from funix.decorator.magic import anal_function_result
 from funix.decorator.param import get_dataframe_parse_metadata, get_parse_type_metadata
 from funix.decorator.pre_fill import get_pre_fill_metadata
 from funix.decorator.secret import get_secret_by_id
-from funix.hint import PreFillEmpty, WrapperException
-from funix.session import set_global_variable
+from funix.decorator.upload import (
+    get_upload_argument,
+    get_upload_arguments,
+    get_upload_keys,
+)
+from funix.hint import PreFillEmpty, UploadType, VectorizedType, WrapperException
+from funix.session import set_global_variable, unshare_result
+from funix.util.arrow import pop_arrow_table
+from funix.util.loop import iterate_async_generator, run_coroutine
 
 kumo_callback_url: str | None = None
 """
@@ -63,29 +71,59 @@ def kumo_callback():
             pass
 
 
-def call_function_get_frame(func, *args, **kwargs):
+def call_function(func: Callable, **kwargs) -> Any:
     """
-    From: https://stackoverflow.com/a/52358426
-    Calls the function *func* with the specified arguments and keyword
-    arguments and snatches its local frame before it actually executes.
+    Call the function, coroutine functions are run on the shared event loop.
+
+    Parameters:
+        func (Callable): The function.
+        **kwargs: The arguments.
+
+    Returns:
+        Any: The result.
     """
+    if iscoroutinefunction(func):
+        return run_coroutine(func(**kwargs))
+    return func(**kwargs)
 
-    frame = None
-    trace = sys.gettrace()
 
-    def snatch_locals(_frame, name, arg):
-        nonlocal frame
-        if frame is None and name == "call":
-            frame = _frame
-            sys.settrace(trace)
-        return trace
+def iterate_function(func: Callable, **kwargs) -> Any:
+    """
+    Call the generator function, async generators are iterated on the shared event loop.
 
-    sys.settrace(snatch_locals)
-    try:
-        result = func(*args, **kwargs)
-    finally:
-        sys.settrace(trace)
-    return frame, result
+    Parameters:
+        func (Callable): The generator or async generator function.
+        **kwargs: The arguments.
+
+    Returns:
+        Any: The generator.
+    """
+    if isasyncgenfunction(func):
+        return iterate_async_generator(func(**kwargs))
+    return func(**kwargs)
+
+
+def get_cell_arguments(
+    function_kwargs: dict, cell_names: list[str], static_keys: set[str], row: int
+) -> dict:
+    """
+    Get the arguments of one row of the cells.
+
+    Parameters:
+        function_kwargs (dict): The arguments, cells are lists.
+        cell_names (list[str]): The names of the cells.
+        static_keys (set[str]): The arguments that are not cells, passed to every row.
+        row (int): The row.
+
+    Returns:
+        dict: The arguments of the row.
+    """
+    arg = {}
+    for cell_name in cell_names:
+        arg[cell_name] = function_kwargs[cell_name][row]
+    for static_key in static_keys:
+        arg[static_key] = function_kwargs[static_key]
+    return arg
 
 
 def funix_call(
@@ -102,32 +140,60 @@ def funix_call(
     print_to_web: bool,
     secret_key: bool,
     matplotlib_format: str,
+    executor: CallExecutor | None = None,
+    vectorized: VectorizedType = False,
+    batch_size: int | None = None,
+    upload_modes: dict[str, UploadType] | None = None,
     ws=None,
 ):
-    for limiter in global_rate_limiters + limiters:
-        limit_result = limiter.rate_limit()
-        if limit_result is not None:
-            return limit_result
+    # Before the limiters, or the first call of a browser is counted for all the new browsers
+    if not session.get("__funix_id"):
+        session["__funix_id"] = uuid4().hex
+    # Read at each call, the module variable is replaced by `set_rate_limiters`
+    allowed_limiters = get_rate_limiters() + limiters
+    limit_result = check_rate_limits(allowed_limiters)
+    if limit_result is not None:
+        return limit_result
 
+    limit_start = perf_counter()
+    call_start: float | None = None
+    opened_files = []
     try:
-        if not session.get("__funix_id"):
-            session["__funix_id"] = uuid4().hex
         if need_websocket:
             function_kwargs = loads(ws.receive())
         else:
             function_kwargs = request.get_json()
         kumo_callback()
+        # The sheet columns, if the frontend sent them in Arrow IPC
+        arrow_table = pop_arrow_table(function_kwargs, json_schema_props)
         if use_pandas:
             if function_id in get_dataframe_parse_metadata():
                 dataframe_metadata = get_dataframe_parse_metadata()[function_id]
                 for need_argument in dataframe_metadata:
-                    big_dict = {}
                     get_args = dataframe_metadata[need_argument]
+                    if arrow_table is not None:
+                        arrow_columns = [
+                            get_arg
+                            for get_arg in get_args
+                            if get_arg in arrow_table.column_names
+                        ]
+                        if arrow_columns:
+                            function_kwargs[need_argument] = arrow_table.select(
+                                arrow_columns
+                            ).to_pandas()
+                            arrow_table = arrow_table.drop_columns(arrow_columns)
+                            continue
+                    big_dict = {}
                     for get_arg in get_args:
                         if get_arg in function_kwargs:
-                            big_dict[get_arg] = deepcopy(function_kwargs[get_arg])
-                            del function_kwargs[get_arg]
+                            # Parsed from this request only, no need to copy
+                            big_dict[get_arg] = function_kwargs.pop(get_arg)
                     function_kwargs[need_argument] = pandas_module.DataFrame(big_dict)
+        if arrow_table is not None:
+            for column_name in arrow_table.column_names:
+                function_kwargs[column_name] = arrow_table.column(
+                    column_name
+                ).to_pylist()
         if function_id in get_parse_type_metadata():
             for func_arg, func_arg_type_class in get_parse_type_metadata()[
                 function_id
@@ -162,19 +228,22 @@ def funix_call(
                             function_call_result[index_or_key],
                         )
 
-        def pre_anal_result(frame: Any, function_call_result: Any):
+        def pre_anal_result(function_call_result: Any):
             """
             Document is on the way
             """
             try:
                 original_result_to_pre_fill_metadata(id(function), function_call_result)
+                # The recorded pre-fill values keep the views, they may be the shared defaults
+                function_call_result = unshare_result(function_call_result)
                 return anal_function_result(
-                    frame,
                     app_name,
                     function_call_result,
                     return_type_parsed,
                     cast_to_list_flag,
                     matplotlib_format,
+                    # HTTP results are encoded by `json_response`, it writes dataframes directly
+                    not need_websocket,
                 )
             except:
                 return {
@@ -189,10 +258,15 @@ def funix_call(
             """
             # TODO: Best result handling, refactor it if possible
             try:
-                function_call_result = call_function_get_frame(
-                    function, **wrapped_function_kwargs
-                )
-                return pre_anal_result(function_call_result[0], function_call_result[1])
+                if executor is None:
+                    function_call_result = call_function(
+                        function, **wrapped_function_kwargs
+                    )
+                else:
+                    function_call_result = executor.run(
+                        function, wrapped_function_kwargs
+                    )
+                return pre_anal_result(function_call_result)
             except WrapperException as e:
                 return {
                     "error_type": "wrapper",
@@ -207,28 +281,27 @@ def funix_call(
         @wraps(function)
         def output_to_web_function(**wrapped_function_kwargs):
             try:
-                fake_stdout = StdoutToWebsocket(ws)
-                fake_stderr = StdoutToWebsocket(ws, is_err=True)
-                org_stdout, sys.stdout = sys.stdout, fake_stdout
-                org_stderr, sys.stderr = sys.stderr, fake_stderr
-                if isgeneratorfunction(function):
-                    for single_result in function(**wrapped_function_kwargs):
-                        if single_result:
-                            if isinstance(single_result, tuple):
-                                for single_result_item in single_result:
+                with redirect_stdout_to_websocket(ws):
+                    if isgeneratorfunction(function) or isasyncgenfunction(function):
+                        for single_result in iterate_function(
+                            function, **wrapped_function_kwargs
+                        ):
+                            if single_result:
+                                if isinstance(single_result, tuple):
+                                    for single_result_item in single_result:
+                                        print(single_result_item)
+                                else:
+                                    print(single_result)
+                    else:
+                        function_result_ = call_function(
+                            function, **wrapped_function_kwargs
+                        )
+                        if function_result_:
+                            if isinstance(function_result_, tuple):
+                                for single_result_item in function_result_:
                                     print(single_result_item)
                             else:
-                                print(single_result)
-                else:
-                    function_result_ = function(**wrapped_function_kwargs)
-                    if function_result_:
-                        if isinstance(function_result_, tuple):
-                            for single_result_item in function_result_:
-                                print(single_result_item)
-                        else:
-                            print(function_result_)
-                sys.stdout = org_stdout
-                sys.stderr = org_stderr
+                                print(function_result_)
             except:
                 ws.send(
                     dumps(
@@ -240,8 +313,83 @@ def funix_call(
                 )
             ws.close()
 
+        def run_cell_rows(start: int, end: int, static_keys: set[str]) -> list:
+            """
+            Run the rows `[start, end)` of the cells. Row by row, or once with the columns if vectorized.
+
+            Parameters:
+                start (int): The first row.
+                end (int): The end row, exclusive.
+                static_keys (set[str]): The arguments that are not cells.
+
+            Returns:
+                list: The results of the rows.
+            """
+            if vectorized:
+                arg = {
+                    static_key: function_kwargs[static_key]
+                    for static_key in static_keys
+                }
+                for cell_name in cell_names:
+                    column = function_kwargs[cell_name][start:end]
+                    arg[cell_name] = (
+                        asarray(column) if vectorized == "numpy" else column
+                    )
+                try:
+                    if executor is None:
+                        column_result = call_function(function, **arg)
+                    else:
+                        column_result = executor.run(function, arg)
+                except:
+                    return [{"error_type": "function", "error_body": format_exc()}]
+                if hasattr(column_result, "tolist"):
+                    # NumPy arrays and pandas Series, also converts NumPy scalars to Python ones
+                    column_result = column_result.tolist()
+                rows = list(column_result)
+                if len(rows) != end - start:
+                    return [
+                        {
+                            "error_type": "wrapper",
+                            "error_body": f"The vectorized function returned {len(rows)} rows "
+                            f"for {end - start} input rows.",
+                        }
+                    ]
+                if return_type_parsed in supported_basic_types_dict.values() and (
+                    not get_pre_fill_metadata(str(id(function)))
+                ):
+                    # Same as `anal_function_result` for scalars, without its per-row overhead
+                    row_results = (
+                        (
+                            [row]
+                            if isinstance(row, str)
+                            else (
+                                [dumps(row)]
+                                if row is None or isinstance(row, (int, float))
+                                else pre_anal_result(row)
+                            )
+                        )
+                        for row in rows
+                    )
+                else:
+                    row_results = (pre_anal_result(row) for row in rows)
+            else:
+                row_results = (
+                    wrapped_function(
+                        **get_cell_arguments(
+                            function_kwargs, cell_names, static_keys, i
+                        )
+                    )
+                    for i in range(start, end)
+                )
+            result = []
+            for row_result in row_results:
+                if isinstance(row_result, list):
+                    result.extend(row_result)
+                else:
+                    result.append(row_result)
+            return result
+
         cell_names = []
-        upload_base64_files = {}
 
         # TODO: And the logic below, refactor it if possible
 
@@ -249,19 +397,7 @@ def funix_call(
             if "treat_as" in json_schema_props[json_schema_prop_key]:
                 if json_schema_props[json_schema_prop_key]["treat_as"] == "cell":
                     cell_names.append(json_schema_prop_key)
-            if "widget" in json_schema_props[json_schema_prop_key]:
-                if (
-                    json_schema_props[json_schema_prop_key]["widget"]
-                    in supported_upload_widgets
-                ):
-                    upload_base64_files[json_schema_prop_key] = "single"
-            if "items" in json_schema_props[json_schema_prop_key]:
-                if "widget" in json_schema_props[json_schema_prop_key]["items"]:
-                    if (
-                        json_schema_props[json_schema_prop_key]["items"]["widget"]
-                        in supported_upload_widgets
-                    ):
-                        upload_base64_files[json_schema_prop_key] = "multiple"
+        upload_files = get_upload_keys(json_schema_props)
 
         if function_kwargs is None:
             empty_function_kwargs_error = {
@@ -301,17 +437,33 @@ def funix_call(
                 else:
                     return no_secret_error
 
+        if executor is not None:
+            if need_websocket:
+
+                def send_queue_position(position: int) -> None:
+                    ws.send(dumps({"queue_position": position}))
+
+                acquired = executor.acquire(send_queue_position)
+            else:
+                acquired = executor.acquire()
+            if not acquired:
+                if need_websocket:
+                    ws.send(dumps(executor.busy_error()))
+                    ws.close()
+                    return
+                else:
+                    return executor.busy_response()
+            call_start = perf_counter()
+
         if len(cell_names) > 0:
             length = len(function_kwargs[cell_names[0]])
             static_keys = function_kwargs.keys() - cell_names
-            result = []
-            for i in range(length):
-                arg = {}
-                for cell_name in cell_names:
-                    arg[cell_name] = function_kwargs[cell_name][i]
-                for static_key in static_keys:
-                    arg[static_key] = function_kwargs[static_key]
-                if need_websocket:
+            if need_websocket:
+                result = []
+                for i in range(length):
+                    arg = get_cell_arguments(
+                        function_kwargs, cell_names, static_keys, i
+                    )
                     if print_to_web:
                         ws.send(
                             dumps(
@@ -326,46 +478,62 @@ def funix_call(
                         return
                     else:
                         result = []
-                        for temp_function_result in function(**arg):
-                            function_result = pre_anal_result(
-                                None, temp_function_result
-                            )
+                        for temp_function_result in iterate_function(function, **arg):
+                            function_result = pre_anal_result(temp_function_result)
                             if isinstance(function_result, list):
                                 result.extend(function_result)
                             else:
                                 result.append(function_result)
-                else:
-                    temp_result = wrapped_function(**arg)
-                    if isinstance(temp_result, list):
-                        result.extend(temp_result)
-                    else:
-                        result.append(temp_result)
-            if need_websocket:
                 ws.send(dumps({"result": result}))
                 ws.close()
                 return
             else:
+                chunk_size = batch_size if batch_size else max(length, 1)
+                chunks = [
+                    (start, min(start + chunk_size, length))
+                    for start in range(0, length, chunk_size)
+                ]
+                result = []
+                if len(chunks) == 1:
+                    result = run_cell_rows(*chunks[0], static_keys)
+                elif len(chunks) > 1:
+                    # Each chunk runs in a copy of the request context, for `funix.session` and pre-fill
+                    batch_pool = get_batch_pool()
+                    futures = [
+                        batch_pool.submit(
+                            copy_context().run, run_cell_rows, start, end, static_keys
+                        )
+                        for start, end in chunks
+                    ]
+                    for future in futures:
+                        result.extend(future.result())
                 return [{"result": result}]
-        elif len(upload_base64_files) > 0:
+        elif len(upload_files) > 0:
             new_args = function_kwargs
-            for upload_base64_file_key in upload_base64_files.keys():
-                if upload_base64_file_key not in function_kwargs:
+            for upload_file_key in upload_files.keys():
+                if upload_file_key not in function_kwargs:
                     continue
-                if not function_kwargs[upload_base64_file_key]:
+                if not function_kwargs[upload_file_key]:
                     continue
-                if upload_base64_files[upload_base64_file_key] == "single":
-                    with urlopen(function_kwargs[upload_base64_file_key]) as rsp:
-                        new_args[upload_base64_file_key] = rsp.read()
-                elif upload_base64_files[upload_base64_file_key] == "multiple":
-                    for pos, each in enumerate(function_kwargs[upload_base64_file_key]):
-                        with urlopen(each) as rsp:
-                            new_args[upload_base64_file_key][pos] = rsp.read()
+                upload = (upload_modes or {}).get(upload_file_key, "bytes")
+                if upload_files[upload_file_key] == "single":
+                    new_args[upload_file_key] = get_upload_argument(
+                        function_kwargs[upload_file_key], function_id, upload
+                    )
+                    if upload == "file":
+                        opened_files.append(new_args[upload_file_key])
+                elif upload_files[upload_file_key] == "multiple":
+                    new_args[upload_file_key] = get_upload_arguments(
+                        function_kwargs[upload_file_key], function_id, upload
+                    )
+                    if upload == "file":
+                        opened_files.extend(new_args[upload_file_key])
             if need_websocket:
                 if print_to_web:
                     output_to_web_function(**new_args)
                 else:
-                    for temp_function_result in function(**new_args):
-                        function_result = pre_anal_result(None, temp_function_result)
+                    for temp_function_result in iterate_function(function, **new_args):
+                        function_result = pre_anal_result(temp_function_result)
                         ws.send(dumps(function_result))
                     ws.close()
             else:
@@ -375,8 +543,10 @@ def funix_call(
                 if print_to_web:
                     output_to_web_function(**function_kwargs)
                 else:
-                    for temp_function_result in function(**function_kwargs):
-                        function_result = pre_anal_result(None, temp_function_result)
+                    for temp_function_result in iterate_function(
+                        function, **function_kwargs
+                    ):
+                        function_result = pre_anal_result(temp_function_result)
                         ws.send(dumps(function_result))
                     ws.close()
             else:
@@ -388,3 +558,10 @@ def funix_call(
             ws.close()
         else:
             return error
+    finally:
+        if call_start is not None:
+            executor.release(perf_counter() - call_start)
+        for opened_file in opened_files:
+            opened_file.close()
+        for limiter in allowed_limiters:
+            limiter.finish(perf_counter() - limit_start)
@@ -0,0 +1,377 @@
+"""
+Bounded executors for funix calls.
+
+A function decorated with `concurrency=` or `executor=` gets its own `CallExecutor`: at most `concurrency` calls run
+at the same time, the others wait in FIFO order (up to `max_queue`), and the calls are run on a thread or process pool
+of the same size.
+"""
+
+from asyncio import run
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import copy_context
+from inspect import iscoroutinefunction
+from json import dumps
+from math import ceil
+from multiprocessing import get_all_start_methods, get_context
+from os import cpu_count, getpid
+from threading import Condition, Lock
+from typing import Any, Callable, Optional
+
+from flask import Response
+
+from funix.decorator.metrics import register_metrics_provider
+from funix.hint import ExecutorType
+from funix.util.loop import run_coroutine
+
+executors: dict[str, "CallExecutor"] = {}
+"""
+A dict, key is the function endpoint, value is the executor.
+"""
+
+
+def run_in_process(function: Callable, kwargs: dict) -> Any:
+    """
+    Run the function in a worker process. Coroutine functions get their own event loop there.
+
+    Parameters:
+        function (Callable): The function, must be picklable (defined at the top level of a module).
+        kwargs (dict): The arguments.
+
+    Returns:
+        Any: The result, must be picklable.
+    """
+    if iscoroutinefunction(function):
+        return run(function(**kwargs))
+    return function(**kwargs)
+
+
+def run_in_thread(function: Callable, kwargs: dict) -> Any:
+    """
+    Run the function in a pool thread. Coroutine functions are run on the shared event loop.
+
+    Parameters:
+        function (Callable): The function.
+        kwargs (dict): The arguments.
+
+    Returns:
+        Any: The result.
+    """
+    if iscoroutinefunction(function):
+        return run_coroutine(function(**kwargs))
+    return function(**kwargs)
+
+
+class CallExecutor:
+    """
+    A bounded executor for one function.
+
+    Attributes:
+        name (str): The function endpoint, for metrics.
+        concurrency (int): The max number of calls running at the same time.
+        executor (ExecutorType): Run the calls in a `thread` pool or a `process` pool.
+        max_queue (int | None): The max number of waiting calls, None for unlimited.
+        completed (int): The number of completed calls.
+        rejected (int): The number of calls rejected because the queue is full.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: Optional[int] = None,
+        executor: ExecutorType = None,
+        max_queue: Optional[int] = None,
+    ):
+        """
+        Create a new CallExecutor.
+
+        Parameters:
+            name (str): The function endpoint.
+            concurrency (int | None): The max number of running calls, default is the number of CPUs.
+            executor (ExecutorType): `thread` or `process`, default is `thread`.
+            max_queue (int | None): The max number of waiting calls, default is unlimited.
+
+        Raises:
+            ValueError: If the arguments are not valid.
+        """
+        if concurrency is not None and (
+            type(concurrency) is not int or concurrency < 1
+        ):
+            raise ValueError("`concurrency` must be a positive int")
+        if executor not in (None, "thread", "process"):
+            raise ValueError("`executor` must be `thread` or `process`")
+        if max_queue is not None and (type(max_queue) is not int or max_queue < 0):
+            raise ValueError("`max_queue` must be a non-negative int")
+        self.name = name
+        self.concurrency = concurrency if concurrency else (cpu_count() or 1)
+        self.executor = executor if executor else "thread"
+        self.max_queue = max_queue
+        self.completed = 0
+        self.rejected = 0
+        self.__condition = Condition()
+        self.__running = 0
+        self.__waiting: deque[object] = deque()
+        self.__average_time: Optional[float] = None
+        self.__pool: Optional[Executor] = None
+        self.__pool_pid: Optional[int] = None
+
+    def __get_pool(self) -> Executor:
+        """
+        Get the pool, create it in the current process if needed (the pool does not survive `fork`).
+
+        Returns:
+            Executor: The pool.
+        """
+        with self.__condition:
+            if self.__pool is None or self.__pool_pid != getpid():
+                if self.executor == "process":
+                    # Fork, so functions imported by funix can be found by the workers
+                    context = (
+                        get_context("fork")
+                        if "fork" in get_all_start_methods()
+                        else get_context()
+                    )
+                    self.__pool = ProcessPoolExecutor(
+                        self.concurrency, mp_context=context
+                    )
+                else:
+                    self.__pool = ThreadPoolExecutor(
+                        self.concurrency, thread_name_prefix=f"funix-{self.name}"
+                    )
+                self.__pool_pid = getpid()
+            return self.__pool
+
+    def acquire(self, on_wait: Optional[Callable[[int], None]] = None) -> bool:
+        """
+        Wait for a free slot, in FIFO order.
+
+        Parameters:
+            on_wait (Callable[[int], None] | None): Called with the queue position (1-based) every time it changes,
+                                                    outside the lock. Used to send websocket progress messages.
+
+        Returns:
+            bool: True if the slot is acquired, False if the queue is full.
+        """
+        with self.__condition:
+            if self.__running < self.concurrency and not self.__waiting:
+                self.__running += 1
+                return True
+            if self.max_queue is not None and len(self.__waiting) >= self.max_queue:
+                self.rejected += 1
+                return False
+            ticket = object()
+            self.__waiting.append(ticket)
+
+        last_position = None
+        try:
+            while True:
+                with self.__condition:
+                    if (
+                        self.__waiting[0] is ticket
+                        and self.__running < self.concurrency
+                    ):
+                        self.__waiting.popleft()
+                        self.__running += 1
+                        # The next one may be able to run too
+                        self.__condition.notify_all()
+                        return True
+                    position = self.__waiting.index(ticket) + 1
+                    if position == last_position:
+                        self.__condition.wait(timeout=1)
+                        continue
+                last_position = position
+                if on_wait is not None:
+                    on_wait(position)
+        except BaseException:
+            with self.__condition:
+                if ticket in self.__waiting:
+                    self.__waiting.remove(ticket)
+                self.__condition.notify_all()
+            raise
+
+    def release(self, elapsed: Optional[float] = None) -> None:
+        """
+        Release the slot.
+
+        Parameters:
+            elapsed (float | None): The wall time of the call, for the `Retry-After` estimation.
+        """
+        with self.__condition:
+            self.__running -= 1
+            self.completed += 1
+            if elapsed is not None:
+                if self.__average_time is None:
+                    self.__average_time = elapsed
+                else:
+                    self.__average_time = self.__average_time * 0.8 + elapsed * 0.2
+            self.__condition.notify_all()
+
+    def run(self, function: Callable, kwargs: dict) -> Any:
+        """
+        Run the function on the pool and wait for the result.
+        Threads run in a copy of the caller's context, so `flask.session` and `funix.session` still work.
+
+        Parameters:
+            function (Callable): The function.
+            kwargs (dict): The arguments.
+
+        Returns:
+            Any: The result.
+        """
+        pool = self.__get_pool()
+        if self.executor == "process":
+            return pool.submit(run_in_process, function, kwargs).result()
+        return pool.submit(copy_context().run, run_in_thread, function, kwargs).result()
+
+    def retry_after(self) -> int:
+        """
+        Estimate the seconds until a new call could start.
+
+        Returns:
+            int: The seconds, at least 1.
+        """
+        with self.__condition:
+            if self.__average_time is None:
+                return 1
+            rounds = (len(self.__waiting) + 1) / self.concurrency
+            return max(1, ceil(self.__average_time * rounds))
+
+    def busy_error(self) -> dict:
+        """
+        Get the error for a rejected call.
+
+        Returns:
+            dict: The error, with the queue depth.
+        """
+        queued = self.queued
+        return {
+            "error_type": "safe_checker",
+            "error_body": f"The function is busy, {queued} calls are waiting. Please try again later.",
+            "queue": queued,
+        }
+
+    def busy_response(self) -> Response:
+        """
+        Get the HTTP response for a rejected call.
+
+        Returns:
+            flask.Response: 503 with `Retry-After`.
+        """
+        return Response(
+            dumps(self.busy_error()),
+            status=503,
+            mimetype="application/json",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    @property
+    def running(self) -> int:
+        """
+        The number of running calls.
+        """
+        return self.__running
+
+    @property
+    def queued(self) -> int:
+        """
+        The number of waiting calls.
+        """
+        return len(self.__waiting)
+
+    @property
+    def full(self) -> bool:
+        """
+        Whether a new call would be rejected now, the queue is full.
+        """
+        return self.max_queue is not None and len(self.__waiting) >= self.max_queue
+
+    def stats(self) -> dict:
+        """
+        Get the occupancy and queue depth of the executor.
+
+        Returns:
+            dict: The stats.
+        """
+        with self.__condition:
+            return {
+                "executor": self.executor,
+                "concurrency": self.concurrency,
+                "running": self.__running,
+                "queued": len(self.__waiting),
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "average_time": self.__average_time,
+            }
+
+
+__batch_pool: Optional[ThreadPoolExecutor] = None
+"""
+The pool running the chunks of cells, for `batch_size`.
+"""
+
+__batch_pool_pid: Optional[int] = None
+"""
+The process that created the batch pool.
+"""
+
+__batch_pool_lock = Lock()
+"""
+Lock for creating the batch pool.
+"""
+
+
+def get_batch_pool() -> ThreadPoolExecutor:
+    """
+    Get the pool running the chunks of cells, one thread per CPU. The function itself still runs on its own executor
+    if it has one, so `executor="process"` chunks run in parallel in the process pool.
+
+    Returns:
+        ThreadPoolExecutor: The pool.
+    """
+    global __batch_pool, __batch_pool_pid
+    with __batch_pool_lock:
+        if __batch_pool is None or __batch_pool_pid != getpid():
+            __batch_pool = ThreadPoolExecutor(
+                cpu_count() or 1, thread_name_prefix="funix-batch"
+            )
+            __batch_pool_pid = getpid()
+        return __batch_pool
+
+
+def create_executor(
+    name: str,
+    concurrency: Optional[int],
+    executor: ExecutorType,
+    max_queue: Optional[int],
+) -> Optional[CallExecutor]:
+    """
+    Create the executor for a function, if any of the options is set.
+
+    Parameters:
+        name (str): The function endpoint.
+        concurrency (int | None): The max number of running calls.
+        executor (ExecutorType): `thread` or `process`.
+        max_queue (int | None): The max number of waiting calls.
+
+    Returns:
+        CallExecutor | None: The executor, None if the function runs inline.
+    """
+    if concurrency is None and executor is None and max_queue is None:
+        return None
+    call_executor = CallExecutor(name, concurrency, executor, max_queue)
+    executors[name] = call_executor
+    return call_executor
+
+
+def get_executors_stats() -> dict:
+    """
+    Get the stats of all executors.
+
+    Returns:
+        dict: Key is the function endpoint, value is the stats.
+    """
+    return {name: executor.stats() for name, executor in executors.items()}
+
+
+register_metrics_provider("executors", get_executors_stats)
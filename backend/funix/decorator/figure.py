@@ -0,0 +1,230 @@
+"""
+Static images of matplotlib figures.
+
+The figures are rendered in a small pool of render threads (`GlobalSwitchOption.FIGURE_RENDER_THREADS`), instead of
+in the request threads, and closed under a lock, pyplot keeps global state that is not thread-safe. The same figure
+(same content and format) is rendered once, the images are cached by a hash of the pickled figure. The figure is
+hashed while it is pickled, and only up to `GlobalSwitchOption.FIGURE_CACHE_KEY_LIMIT` bytes: the larger figures, and
+the ones that cannot be pickled, are rendered without looking up the cache.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from io import BytesIO
+from os import getpid
+from pickle import Pickler
+from threading import Lock
+from typing import Any
+
+from funix.config.switch import GlobalSwitchOption
+from funix.decorator.metrics import register_metrics_provider
+
+__render_pool: ThreadPoolExecutor | None = None
+"""
+The pool rendering the figures, `GlobalSwitchOption.FIGURE_RENDER_THREADS` threads.
+"""
+
+__render_pool_pid: int | None = None
+"""
+The process that created the render pool.
+"""
+
+__render_cache: OrderedDict[str, bytes] = OrderedDict()
+"""
+The rendered images, key is the figure key (see `get_figure_key`), in least recently used order.
+"""
+
+__render_cache_bytes = 0
+"""
+The total size of `__render_cache` (bytes).
+"""
+
+__render_stats = {"renders": 0, "cache_hits": 0, "uncached": 0}
+"""
+The number of figures rendered, of figures found in the cache, and of figures rendered without a cache key.
+"""
+
+__render_lock = Lock()
+"""
+Lock for creating the render pool.
+"""
+
+__render_cache_lock = Lock()
+"""
+Lock for `__render_cache`, `__render_cache_bytes` and `__render_stats`, shared by the render threads.
+"""
+
+__pyplot_lock = Lock()
+"""
+Lock for closing the figures, pyplot keeps the open figures in global state.
+"""
+
+
+class FigureTooLarge(Exception):
+    """
+    The pickled figure is over `GlobalSwitchOption.FIGURE_CACHE_KEY_LIMIT`.
+    """
+
+
+class HashWriter:
+    """
+    A file object hashing what is written, the pickled figure is never kept.
+    """
+
+    def __init__(self, limit: int):
+        """
+        Initialize the HashWriter.
+
+        Parameters:
+            limit (int): The max size (bytes) written, -1 for no limit.
+        """
+        self.hash = sha256()
+        self.size = 0
+        self.limit = limit
+
+    def write(self, data: bytes) -> int:
+        """
+        Hash the data.
+
+        Raises:
+            FigureTooLarge: If more than `limit` bytes are written.
+        """
+        self.size += len(data)
+        if self.limit != -1 and self.size > self.limit:
+            raise FigureTooLarge()
+        self.hash.update(data)
+        return len(data)
+
+
+class FigurePickler(Pickler):
+    """
+    Pickles the figure the same way every time for the same content, only to hash it.
+
+    The transforms keep their parents by `id`, and pyplot figures keep their number, they are left out.
+    """
+
+    def __init__(self, file: HashWriter):
+        """
+        Initialize the FigurePickler.
+
+        Parameters:
+            file (HashWriter): The writer hashing the pickle.
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.transforms import TransformNode
+
+        super().__init__(file, 5)
+        self._types = (TransformNode, Figure)
+
+    def reducer_override(self, obj: Any) -> Any:
+        if isinstance(obj, self._types):
+            state = obj.__getstate__()
+            state.pop("_parents", None)
+            state.pop("_number", None)
+            return type(obj), (), state
+        return NotImplemented
+
+
+def get_figure_key(figure: Any, format_: str) -> str | None:
+    """
+    Get the cache key of the figure.
+
+    Parameters:
+        figure (matplotlib.figure.Figure): The figure.
+        format_ (str): The format of the image.
+
+    Returns:
+        str | None: The key, None if the figure cannot be pickled (e.g. it has lambdas) or is pickled larger than
+                    `GlobalSwitchOption.FIGURE_CACHE_KEY_LIMIT`, and is not cached.
+    """
+    writer = HashWriter(GlobalSwitchOption.FIGURE_CACHE_KEY_LIMIT)
+    try:
+        FigurePickler(writer).dump(figure)
+    except Exception:
+        return None
+    return f"{format_}:{writer.hash.hexdigest()}"
+
+
+def __render(figure: Any, format_: str) -> bytes:
+    """
+    Render the figure, in a render thread.
+
+    Parameters:
+        figure (matplotlib.figure.Figure): The figure.
+        format_ (str): The format of the image.
+
+    Returns:
+        bytes: The image.
+    """
+    global __render_cache_bytes
+    import matplotlib.pyplot
+
+    try:
+        limit = GlobalSwitchOption.FIGURE_CACHE_SIZE
+        # No key for a disabled cache, pickling costs about as much as rendering a small figure
+        key = get_figure_key(figure, format_) if limit > 0 else None
+        with __render_cache_lock:
+            image = __render_cache.get(key) if key is not None else None
+            if image is not None:
+                __render_cache.move_to_end(key)
+                __render_stats["cache_hits"] += 1
+                return image
+        with BytesIO() as buf:
+            figure.savefig(buf, format=format_, bbox_inches="tight")
+            image = buf.getvalue()
+        with __render_cache_lock:
+            __render_stats["renders"] += 1
+            if key is None:
+                __render_stats["uncached"] += 1
+            elif len(image) <= limit and key not in __render_cache:
+                __render_cache[key] = image
+                __render_cache_bytes += len(image)
+                while __render_cache_bytes > limit:
+                    __render_cache_bytes -= len(__render_cache.popitem(last=False)[1])
+        return image
+    finally:
+        # The function is done with the figure, pyplot would keep it open
+        with __pyplot_lock:
+            matplotlib.pyplot.close(figure)
+
+
+def render_figure(figure: Any, format_: str) -> bytes:
+    """
+    Render the figure in a render thread, or get it from the cache.
+
+    Parameters:
+        figure (matplotlib.figure.Figure): The figure.
+        format_ (str): The format of the image, e.g., "svg", "png".
+
+    Returns:
+        bytes: The image.
+    """
+    global __render_pool, __render_pool_pid
+    with __render_lock:
+        if __render_pool is None or __render_pool_pid != getpid():
+            __render_pool = ThreadPoolExecutor(
+                max(GlobalSwitchOption.FIGURE_RENDER_THREADS, 1),
+                thread_name_prefix="funix-render",
+            )
+            __render_pool_pid = getpid()
+        render_pool = __render_pool
+    return render_pool.submit(__render, figure, format_).result()
+
+
+def get_render_stats() -> dict:
+    """
+    Get the stats of the figure rendering.
+
+    Returns:
+        dict: The number of renders, cache hits and renders without a cache key, and the cache size.
+    """
+    with __render_cache_lock:
+        return {
+            **__render_stats,
+            "cached": len(__render_cache),
+            "cache_bytes": __render_cache_bytes,
+        }
+
+
+register_metrics_provider("figures", get_render_stats)
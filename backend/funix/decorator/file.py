@@ -2,52 +2,282 @@
 HTTP File service for funix.
 """
 
-from io import BytesIO
-from os.path import abspath, join, splitext
-from threading import Timer
-from typing import Any
+from hashlib import sha256
+from io import FileIO
+from os.path import abspath, splitext
+from re import fullmatch
+from threading import Lock
+from time import monotonic, time
+from typing import Any, Callable
 from uuid import uuid4
 
-from flask import Flask, abort, send_file
+from flask import Flask, Response, abort, request, send_file
 
 from funix.config.switch import GlobalSwitchOption
-from funix.util.file import create_safe_tempdir
+from funix.decorator.metrics import register_metrics_provider
+from funix.util.mime import SNIFF_SIZE, get_mimetype
+from funix.util.scheduler import call_later, get_pending_count
+from funix.util.storage import (
+    FileStorage,
+    MemoryStorage,
+    parse_file_storage,
+    to_buffer,
+)
 from funix.util.uri import is_valid_uri
 
-__files_dict: dict[str, bytes | str] = {}
+
+class FileEntry:
+    """
+    A file served at `/file/<fid>`.
+    """
+
+    def __init__(self, key: str, path: str | None = None):
+        """
+        Initialize the FileEntry.
+
+        Parameters:
+            key (str): The content key, `sha256:<hex digest>` for bytes, `path:<absolute path>` for paths.
+            path (str | None): The path of the file, None for bytes, which are kept in the file storage.
+        """
+        self.key = key
+        self.path = path
+        self.expire_at: float | None = None
+        """The `time.monotonic` time the link expires, None for never."""
+        self.scheduled = False
+        """Whether an expire check is pending in the scheduler."""
+        self.touched_at = 0.0
+        """The `time.time` the bytes were last stored or renewed in the file storage."""
+        self.mimetype: str | None = None
+        """The MIME type, sniffed when first served."""
+
+    @property
+    def digest(self) -> str | None:
+        """
+        The SHA-256 hex digest, the key in the file storage, None for paths.
+        """
+        return self.key[len("sha256:") :] if self.key.startswith("sha256:") else None
+
+
+__files_dict: dict[str, FileEntry] = {}
 """
-A dict, key is file id, value is file content (path or bytes).
+A dict, key is file id, value is the file entry.
 """
 
+__files_index: dict[str, str] = {}
+"""
+A dict, key is the content key (see `FileEntry`), value is file id. The same content gets the same file id.
+"""
+
+__files_lock = Lock()
+"""
+Lock for `__files_dict` and `__files_index`, the server runs requests in multiple threads.
+"""
+
+__file_storage: FileStorage = MemoryStorage()
+"""
+Where the bytes are kept, see `set_file_storage`.
+"""
+
+
+def set_file_storage(storage: FileStorage | str) -> None:
+    """
+    Set where the returned bytes are kept. With a shared storage, the file id of bytes is their SHA-256 hex digest,
+    so any replica serves the link, and the links survive restarts until they expire.
+
+    Parameters:
+        storage (FileStorage | str): The storage, or its URL, see `funix.util.storage.parse_file_storage`.
+
+    Raises:
+        ValueError: If the URL is not supported.
+    """
+    global __file_storage
+    if isinstance(storage, str):
+        storage = parse_file_storage(storage)
+    __file_storage = storage
+    if storage.shared:
+        sweep_file_storage(storage)
+
+
+def get_file_storage() -> FileStorage:
+    """
+    Get the file storage.
+
+    Returns:
+        FileStorage: The storage.
+    """
+    return __file_storage
+
+
+def sweep_file_storage(storage: FileStorage) -> None:
+    """
+    Delete the expired files from the shared storage, also the ones left by other processes, and check again when the
+    next ones may expire.
+
+    Parameters:
+        storage (FileStorage): The storage.
+    """
+    if GlobalSwitchOption.FILE_LINK_EXPIRE_TIME == -1 or storage is not __file_storage:
+        return
+    storage.sweep(time() - GlobalSwitchOption.FILE_LINK_EXPIRE_TIME)
+    call_later(GlobalSwitchOption.FILE_LINK_EXPIRE_TIME, sweep_file_storage, storage)
+
+
+def __pop_file(fid: str) -> FileEntry | None:
+    """
+    Remove the file from the registry, must be called with `__files_lock`.
+
+    Parameters:
+        fid (str): The file id.
+
+    Returns:
+        FileEntry | None: The removed entry, None if not found.
+    """
+    entry = __files_dict.pop(fid, None)
+    if entry is not None and __files_index.get(entry.key) == fid:
+        del __files_index[entry.key]
+    return entry
+
+
+def __delete_content(entry: FileEntry | None, renewed: bool = False) -> None:
+    """
+    Delete the bytes of the removed entry from the file storage.
+
+    Parameters:
+        entry (FileEntry | None): The removed entry.
+        renewed (bool): Keep the bytes if they were renewed after the entry, e.g. registered again by another thread
+                        or replica.
+    """
+    if entry is not None and entry.digest is not None:
+        __file_storage.delete(entry.digest, entry.touched_at if renewed else None)
+
 
 def delete_file(fid: str) -> None:
     """
-    Delete the file.
+    Delete the file, and its bytes.
+
+    Parameters:
+        fid (str): The file id.
+    """
+    with __files_lock:
+        entry = __pop_file(fid)
+    __delete_content(entry)
+
+
+def expire_file(fid: str) -> None:
+    """
+    Delete the file if its link has expired. If the same content was registered again in the meantime, check again
+    when the renewed link expires.
 
     Parameters:
         fid (str): The file id.
+    """
+    with __files_lock:
+        entry = __files_dict.get(fid)
+        if entry is None or entry.expire_at is None:
+            return
+        remaining = entry.expire_at - monotonic()
+        if remaining <= 0:
+            __pop_file(fid)
+        else:
+            # One pending check per file, renewals only move `expire_at`
+            call_later(remaining, expire_file, fid)
+            return
+    __delete_content(entry, True)
+
+
+def get_files_stats() -> dict:
+    """
+    Get the stats of the file service and its storage.
+
+    Returns:
+        dict: The number of files and of scheduled calls, and the stats of the storage.
+    """
+    return {
+        "files": len(__files_dict),
+        "scheduled_calls": get_pending_count(),
+        **__file_storage.stats(),
+    }
+
+
+def __renew_file(entry: FileEntry) -> bool:
+    """
+    Renew the expire time of the file link, must be called with `__files_lock`.
+
+    Parameters:
+        entry (FileEntry): The file entry.
 
-    Note:
-        Need lock, but it's not a big problem for now I think so?
+    Returns:
+        bool: Whether an expire check needs to be scheduled.
     """
-    global __files_dict
-    if fid in __files_dict:
-        del __files_dict[fid]
+    if GlobalSwitchOption.FILE_LINK_EXPIRE_TIME == -1:
+        return False
+    entry.expire_at = monotonic() + GlobalSwitchOption.FILE_LINK_EXPIRE_TIME
+    if entry.scheduled:
+        return False
+    entry.scheduled = True
+    return True
 
 
 def delete_file_task(fid: str) -> None:
-    if GlobalSwitchOption.FILE_LINK_EXPIRE_TIME != -1:
-        t = Timer(GlobalSwitchOption.FILE_LINK_EXPIRE_TIME, delete_file, args=(fid,))
-        t.start()
+    with __files_lock:
+        entry = __files_dict.get(fid)
+        if entry is None or not __renew_file(entry):
+            return
+    call_later(GlobalSwitchOption.FILE_LINK_EXPIRE_TIME, expire_file, fid)
+
+
+def register_file(
+    key: str,
+    store: Callable[[], str | None],
+    suffix: str = "",
+    fid: str | None = None,
+) -> str:
+    """
+    Register the file, the same content key always gets the same file id, until the link expires.
 
+    Parameters:
+        key (str): The content key, see `FileEntry`.
+        store (Callable[[], str | None]): Stores the bytes in the file storage and returns None, or returns the path.
+                                          Called for new content, and to renew bytes in the storage.
+        suffix (str): The suffix of the file id, e.g. the extension.
+        fid (str | None): The file id of new content, None for a random one.
 
-def get_real_uri(path_or_file_content: str | bytes) -> str:
+    Returns:
+        str: The file id.
+    """
+    with __files_lock:
+        found = __files_index.get(key)
+        entry = __files_dict[found] if found is not None else None
+        scheduled = entry is not None and __renew_file(entry)
+    if entry is None:
+        path = store()
+        with __files_lock:
+            # Another thread may have registered the same content in the meantime
+            found = __files_index.get(key)
+            if found is None:
+                found = fid or uuid4().hex + suffix
+                __files_dict[found] = FileEntry(key, path)
+                __files_index[key] = found
+            entry = __files_dict[found]
+            scheduled = __renew_file(entry)
+    elif entry.digest is not None:
+        store()
+    if entry.digest is not None:
+        # After the bytes are stored, so they are newer than this time only if renewed by someone else
+        entry.touched_at = time()
+    if scheduled:
+        call_later(GlobalSwitchOption.FILE_LINK_EXPIRE_TIME, expire_file, found)
+    return found
+
+
+def get_real_uri(path_or_file_content: Any) -> str:
     """
     Get the funix relative URI of the file or path.
     For URI, return directly
 
     Parameters:
-        path_or_file_content (str | bytes): The path or file content.
+        path_or_file_content (Any): The path, or the file content: bytes, or any bytes-like object (bytearray,
+                                    memoryview, numpy.ndarray), only read-only buffers are kept without copying.
 
     Returns:
         str: The funix relative URI.
@@ -55,35 +285,29 @@ def get_real_uri(path_or_file_content: str | bytes) -> str:
     Raises:
         ValueError: If the path or file content is not valid.
     """
-    global __files_dict
-    if isinstance(path_or_file_content, bytes):
-        fid = uuid4().hex
-        result = f"/file/{fid}"
-        new_ref = path_or_file_content
-        if GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP != -1:
-            if len(path_or_file_content) >= GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP:
-                new_ref = join(create_safe_tempdir(), fid)
-                with open(new_ref, "wb") as f:
-                    f.write(path_or_file_content)
-            __files_dict[fid] = new_ref
-            delete_file_task(fid)
-
-        if new_ref not in list(__files_dict.values()):
-            __files_dict[fid] = new_ref
-            delete_file_task(fid)
-        else:
-            return f"/file/{list(__files_dict.keys())[list(__files_dict.values()).index(new_ref)]}"
-        return result
+    buffer = to_buffer(path_or_file_content)
+    if buffer is not None:
+        digest = sha256(buffer).hexdigest()
+        storage = __file_storage
+
+        def store() -> None:
+            if not storage.touch(digest):
+                storage.put(digest, buffer)
+
+        fid = register_file(
+            f"sha256:{digest}", store, fid=digest if storage.shared else None
+        )
+        return f"/file/{fid}"
+    if not isinstance(path_or_file_content, str):
+        raise ValueError("Unsupported path type")
     if not is_valid_uri(path_or_file_content):
-        fid = uuid4().hex + splitext(path_or_file_content)[1]
-        result = f"/file/{fid}"
         abs_path = abspath(path_or_file_content)
-        if abs_path not in list(__files_dict.values()):
-            __files_dict[fid] = abs_path
-            delete_file_task(fid)
-        else:
-            return f"/file/{list(__files_dict.keys())[list(__files_dict.values()).index(abs_path)]}"
-        return result
+        fid = register_file(
+            f"path:{abs_path}",
+            lambda: abs_path,
+            splitext(path_or_file_content)[1],
+        )
+        return f"/file/{fid}"
     else:
         return path_or_file_content
 
@@ -93,7 +317,7 @@ def get_static_uri(path: str | list[str | bytes] | bytes) -> str | list[str]:
     Get the funix relative URI of the file(s), path(s), binary(ies) or uri(s).
     list -> list
     str -> str
-    bytes -> str
+    bytes (or bytes-like, e.g. memoryview, numpy.ndarray) -> str
 
     Parameters:
         path (str | list[str | bytes] | bytes): The path(s), file(s), binary(ies) or uri(s).
@@ -106,13 +330,27 @@ def get_static_uri(path: str | list[str | bytes] | bytes) -> str | list[str]:
             return path
         else:
             return get_real_uri(path)
-    if isinstance(path, bytes):
-        return get_real_uri(path)
     elif isinstance(path, list):
         uris = [get_real_uri(uri) for uri in path]
         return uris
     else:
-        raise Exception("Unsupported path type")
+        # Bytes-like, `get_real_uri` raises for other types
+        return get_real_uri(path)
+
+
+def __set_security_headers(response: Response) -> None:
+    """
+    Set the headers that keep the browser from running the served files as pages of this origin.
+
+    Parameters:
+        response (flask.Response): The response of a file.
+    """
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    if response.mimetype == "image/svg+xml":
+        # Opened directly, an SVG is a document and may have scripts
+        response.headers["Content-Security-Policy"] = (
+            "default-src 'none'; style-src 'unsafe-inline'; sandbox"
+        )
 
 
 def enable_file_service(flask_app: Flask):
@@ -121,6 +359,8 @@ def enable_file_service(flask_app: Flask):
         """
         Send the file. Funix does not store your file on disk, instead it just stores bytes and str.
         If it is str, then it is treated as path, but if it is bytes, then it is treated as binary.
+        Range requests and conditional requests (`If-None-Match`, `If-Range`) are supported, binaries have a strong
+        ETag (their SHA-256) and are cached until the link expires.
 
         Routes:
             /file/<string:fid>: The file path.
@@ -131,17 +371,66 @@ def enable_file_service(flask_app: Flask):
         Returns:
             flask.Response: The file.
         """
-        if fid in __files_dict:
-            if isinstance(__files_dict[fid], str):
-                # Like path
-                return send_file(__files_dict[fid])
-            else:
-                # Like binary
-                return send_file(
-                    BytesIO(__files_dict[fid]), mimetype="application/octet-stream"
-                )
+        with __files_lock:
+            entry = __files_dict.get(fid)
+        if entry is not None and entry.path is not None:
+            # Like path, the file may change, the browser revalidates it every time
+            try:
+                if entry.mimetype is None:
+                    entry.mimetype = get_mimetype(entry.path)
+                response = send_file(entry.path, mimetype=entry.mimetype)
+            except FileNotFoundError:
+                return abort(404)
+            __set_security_headers(response)
+            return response
+        # Like binary, the content of a file id never changes
+        if entry is not None:
+            digest = entry.digest
+        elif __file_storage.shared and fullmatch("[0-9a-f]{64}", fid):
+            # Registered by another replica, or before a restart
+            digest = fid
         else:
             return abort(404)
+        stored = __file_storage.open(digest)
+        if stored is None:
+            # Expired or removed in the meantime
+            return abort(404)
+        file, size = stored
+        mimetype = entry.mimetype if entry is not None else None
+        if mimetype is None:
+            mimetype = get_mimetype(file.read(SNIFF_SIZE))
+            file.seek(0)
+            if entry is not None:
+                entry.mimetype = mimetype
+        if entry is None or entry.expire_at is None:
+            max_age = max(GlobalSwitchOption.FILE_LINK_EXPIRE_TIME, 0)
+        else:
+            max_age = max(int(entry.expire_at - monotonic()), 0)
+        response = send_file(
+            file, mimetype=mimetype, etag=digest, max_age=max_age, conditional=False
+        )
+        response.content_length = size
+        try:
+            response = response.make_conditional(
+                request, accept_ranges=True, complete_length=size
+            )
+        except:
+            file.close()
+            raise
+        if (
+            response.status_code == 206
+            and isinstance(file, FileIO)
+            and "wsgi.file_wrapper" in request.environ
+            and request.environ.get("SERVER_SOFTWARE", "").startswith("gunicorn")
+        ):
+            # Gunicorn sends `Content-Length` bytes from the file position with `sendfile`, instead of werkzeug
+            # reading the range through Python buffers. Generic wrappers (e.g. wsgiref) read to the end of the file,
+            # they get the range iterator of werkzeug
+            file.seek(response.content_range.start)
+            response.response = request.environ["wsgi.file_wrapper"](file)
+        response.cache_control.immutable = True
+        __set_security_headers(response)
+        return response
 
 
 def handle_ipython_audio_image_video(obj: Any) -> str:
@@ -176,7 +465,8 @@ def handle_ipython_audio_image_video(obj: Any) -> str:
             ]:
                 data_class = getattr(obj.data, "__class__")
                 if f"{data_class.__module__}.{data_class.__name__}" == "numpy.ndarray":
-                    return get_static_uri(obj.data.tobytes())
+                    # The array is served from its own buffer
+                    return get_static_uri(obj.data)
                 elif isinstance(obj.data, (str, bytes)):
                     return get_static_uri(obj.data)
                 elif isinstance(obj.data, list):
@@ -197,15 +487,21 @@ def handle_ipython_audio_image_video(obj: Any) -> str:
 
 def get_file_info(file_id: str) -> str:
     if file_id in __files_dict:
-        result = __files_dict[file_id]
-        if isinstance(result, str):
-            return result
-        else:
-            size = len(result)
-            if size > 16:
-                first_16_bytes = result[:16].hex()
-            else:
-                first_16_bytes = result.hex()
-            return f"Binary, Size: {size}, First bytes: {first_16_bytes}"
+        entry = __files_dict[file_id]
+        if entry.path is not None:
+            return entry.path
+        path = __file_storage.get_path(entry.digest)
+        if path is not None:
+            return path
+        stored = __file_storage.open(entry.digest)
+        if stored is None:
+            return "Not found"
+        file, size = stored
+        with file:
+            first_16_bytes = file.read(16).hex()
+        return f"Binary, Size: {size}, First bytes: {first_16_bytes}"
     else:
         return "Not found"
+
+
+register_metrics_provider("files", get_files_stats)
@@ -1,16 +1,26 @@
 """
 Limiter
 """
+
 import dataclasses
-import time
-from collections import deque
 from json import dumps
-from typing import Optional, Union
+from math import ceil
+from os import getpid
+from threading import Lock
+from typing import Any, Literal, Optional, Union, get_args
 
 from flask import Response, request, session
 from requests.structures import CaseInsensitiveDict
 
-from funix.hint import LimitSource
+from funix.config.switch import GlobalSwitchOption
+from funix.hint import LimitAlgorithm, LimitSource
+from funix.util.limit_store import (
+    LimitStore,
+    LimitUpdate,
+    MemoryStore,
+    parse_limit_store,
+)
+from funix.util.scheduler import call_later
 
 ip_headers: list[str] = []
 """
@@ -19,21 +29,104 @@ IP headers for extraction, useful for applications behind reverse proxies
 e.g. `X-Forwarded-For`, `X-Real-Ip` e.t.c
 """
 
+__limit_store: LimitStore = MemoryStore()
+"""
+Where the states of the limiters are kept, see `set_limit_store`.
+"""
+
+
+def set_limit_store(store: LimitStore | str) -> None:
+    """
+    Set where the states of the limiters without their own store are kept. With a shared store, the workers and
+    replicas count the calls of a client together.
+
+    Parameters:
+        store (LimitStore | str): The store, or its URL, see `funix.util.limit_store.parse_limit_store`.
+
+    Raises:
+        ValueError: If the URL is not supported.
+    """
+    global __limit_store
+    if isinstance(store, str):
+        store = parse_limit_store(store)
+    __limit_store = store
+
+
+def get_limit_store() -> LimitStore:
+    """
+    Get the store of the limiters without their own store.
+
+    Returns:
+        LimitStore: The store.
+    """
+    return __limit_store
+
+
+__swept_stores: set[tuple[int, int]] = set()
+"""
+The stores swept periodically, `(process id, store id)`, the scheduled sweeps are not run by forked workers until
+they schedule again.
+"""
+
+__swept_stores_lock = Lock()
+"""
+Lock for `__swept_stores`.
+"""
+
+
+def watch_limit_store(store: LimitStore) -> None:
+    """
+    Sweep the idle keys of the store every `GlobalSwitchOption.LIMIT_SWEEP_INTERVAL`, from now on. The keys of the
+    clients that stopped calling are not kept forever, e.g. under a scraping attack from many IPs.
+
+    Parameters:
+        store (LimitStore): The store.
+    """
+    if GlobalSwitchOption.LIMIT_SWEEP_INTERVAL == -1:
+        return
+    with __swept_stores_lock:
+        if (getpid(), id(store)) in __swept_stores:
+            return
+        __swept_stores.add((getpid(), id(store)))
+    call_later(GlobalSwitchOption.LIMIT_SWEEP_INTERVAL, sweep_limit_store, store)
+
+
+def sweep_limit_store(store: LimitStore) -> None:
+    """
+    Delete the idle keys of the store, and sweep it again after `GlobalSwitchOption.LIMIT_SWEEP_INTERVAL`.
+
+    Parameters:
+        store (LimitStore): The store.
+    """
+    store.sweep()
+    call_later(GlobalSwitchOption.LIMIT_SWEEP_INTERVAL, sweep_limit_store, store)
+
 
 @dataclasses.dataclass
 class Limiter:
-    call_history: dict
-    # How many calls client can send between each interval set by `period`
+    # How many calls client can send between each interval set by `period`, the budget of the costs, or the max
+    # calls in flight for "concurrency"
     max_calls: int
     # Max call interval time, in seconds
     period: int
     source: LimitSource
+    # How the calls are counted, see `funix.hint.LimitAlgorithm`
+    algorithm: LimitAlgorithm
+    # What a call costs, or "time" for its wall time (seconds), charged when it finishes
+    cost: Union[int, float, Literal["time"]]
+    # Where the calls are counted, the global store (see `set_limit_store`) if None
+    store: Optional[LimitStore]
+    # The part of the store keys naming this limiter, the same in every worker and replica
+    scope: Optional[str]
 
     def __init__(
         self,
         max_calls: int = 10,
         period: int = 60,
         source: LimitSource = LimitSource.SESSION,
+        store: Optional[LimitStore] = None,
+        algorithm: LimitAlgorithm = "sliding_log",
+        cost: Union[int, float, Literal["time"]] = 1,
     ):
         if type(max_calls) is not int:
             raise TypeError("type of `max_calls` is not int")
@@ -41,19 +134,107 @@ class Limiter:
             raise TypeError("type of `period` is not int")
         if type(source) is not LimitSource:
             raise TypeError("type of `source` is not LimitSource")
+        if store is not None and not isinstance(store, LimitStore):
+            raise TypeError("type of `store` is not LimitStore")
+        if algorithm not in get_args(LimitAlgorithm):
+            raise ValueError(
+                f"`algorithm` should be one of {', '.join(get_args(LimitAlgorithm))}"
+            )
+        if cost != "time" and type(cost) not in (int, float):
+            raise TypeError('type of `cost` is not int, float or "time"')
+        if cost != 1 and algorithm in ("sliding_log", "concurrency"):
+            raise ValueError(
+                f'`cost` needs the "sliding_window" or "token_bucket" algorithm, not "{algorithm}"'
+            )
+        if cost != "time" and not 0 < cost <= max_calls:
+            raise ValueError("`cost` should be positive and at most `max_calls`")
 
         self.source = source
         self.max_calls = max_calls
         self.period = period
-        self.call_history = {}
+        self.store = store
+        self.algorithm = algorithm
+        self.cost = cost
+        self.scope = None
+
+    def set_scope(self, scope: str) -> None:
+        """
+        Name the limiter in the store keys, after the function or app it limits. A limiter shared by several
+        functions keeps its first scope, so they still count the calls together.
+
+        Parameters:
+            scope (str): The scope.
+        """
+        if self.scope is None:
+            self.scope = scope
+
+    @staticmethod
+    def ip(max_calls: int, period: int = 60, algorithm: LimitAlgorithm = "sliding_log"):
+        return Limiter(
+            max_calls=max_calls,
+            period=period,
+            source=LimitSource.IP,
+            algorithm=algorithm,
+        )
 
     @staticmethod
-    def ip(max_calls: int, period: int = 60):
-        return Limiter(max_calls=max_calls, period=period, source=LimitSource.IP)
+    def session(
+        max_calls: int, period: int = 60, algorithm: LimitAlgorithm = "sliding_log"
+    ):
+        return Limiter(
+            max_calls=max_calls,
+            period=period,
+            source=LimitSource.SESSION,
+            algorithm=algorithm,
+        )
 
     @staticmethod
-    def session(max_calls: int, period: int = 60):
-        return Limiter(max_calls=max_calls, period=period, source=LimitSource.SESSION)
+    def concurrent(
+        max_calls: int, source: LimitSource = LimitSource.SESSION, period: int = 3600
+    ):
+        """
+        At most `max_calls` calls in flight.
+
+        Parameters:
+            max_calls (int): The max calls in flight.
+            source (LimitSource): Per browser, IP, or for the function.
+            period (int): How long (seconds) the calls are counted without any call starting or finishing, in case
+                          their worker dies, longer than the calls.
+
+        Returns:
+            Limiter: The limiter.
+        """
+        return Limiter(
+            max_calls=max_calls, period=period, source=source, algorithm="concurrency"
+        )
+
+    @staticmethod
+    def budget(
+        budget: int,
+        period: int = 60,
+        source: LimitSource = LimitSource.SESSION,
+        cost: Union[int, float, Literal["time"]] = "time",
+    ):
+        """
+        Charge every call its cost against a budget, refilled over the period (token bucket), so expensive calls
+        are throttled sooner than cheap ones.
+
+        Parameters:
+            budget (int): The budget, in the unit of the cost, e.g. seconds of wall time.
+            period (int): The time (seconds) the budget takes to refill.
+            source (LimitSource): Per browser, IP, or for the function.
+            cost (int | float | "time"): What a call costs, "time" (default) for its wall time in seconds.
+
+        Returns:
+            Limiter: The limiter.
+        """
+        return Limiter(
+            max_calls=budget,
+            period=period,
+            source=source,
+            algorithm="token_bucket",
+            cost=cost,
+        )
 
     @staticmethod
     def dict_get_int(dictionary: dict | CaseInsensitiveDict, key: str) -> Optional[int]:
@@ -71,29 +252,209 @@ class Limiter:
     @staticmethod
     def from_dict(dictionary: dict):
         converted = CaseInsensitiveDict(dictionary)
-        ip = Limiter.dict_get_int(converted, "per_ip")
-        session_ = Limiter.dict_get_int(converted, "per_browser")
-
-        if ip is not None and session_ is not None:
+        sources = {
+            LimitSource.IP: Limiter.dict_get_int(converted, "per_ip"),
+            LimitSource.SESSION: Limiter.dict_get_int(converted, "per_browser"),
+            LimitSource.FUNCTION: Limiter.dict_get_int(converted, "per_function"),
+        }
+        sources = {
+            source: max_calls
+            for source, max_calls in sources.items()
+            if max_calls is not None
+        }
+
+        if len(sources) > 1:
             raise TypeError(
-                "`per_ip` and `per_browser` are conflicting options in a single dict"
+                "`per_ip`, `per_browser` and `per_function` are conflicting options in a single dict"
             )
 
-        if ip is None and session_ is None:
-            raise TypeError("`per_ip` or `per_browser` is required")
+        if len(sources) == 0:
+            raise TypeError("`per_ip`, `per_browser` or `per_function` is required")
 
-        max_calls = ip or session_
-        source = LimitSource.IP
-        if ip is not None:
-            source = LimitSource.IP
-        if session_ is not None:
-            source = LimitSource.SESSION
+        source, max_calls = sources.popitem()
         period = Limiter.dict_get_int(converted, "period") or 60
+        algorithm = converted.get("algorithm", "sliding_log")
+        cost = converted.get("cost", 1)
+
+        return Limiter(
+            max_calls=max_calls,
+            period=period,
+            source=source,
+            algorithm=algorithm,
+            cost=cost,
+        )
+
+    @property
+    def ttl(self) -> float:
+        """
+        How long (seconds) the state of an idle client matters.
+        """
+        if self.algorithm == "sliding_window":
+            return self.period * 2
+        return self.period
+
+    def _update(self, state: Any, now: float) -> tuple[Any, Any]:
+        """
+        Check and record a call.
+
+        Parameters:
+            state (Any): The state of the client, None for a new client.
+            now (float): The current time.
+
+        Returns:
+            tuple[Any, Any]: The new state, and the seconds to wait, None if the call is allowed.
+        """
+        # Calls charged by time only need some budget left, they are charged when they finish
+        cost = 0 if self.cost == "time" else self.cost
+        match self.algorithm:
+            case "sliding_window":
+                return self._sliding_window(state, now, cost, True)
+            case "token_bucket":
+                return self._token_bucket(state, now, cost, True)
+            case "concurrency":
+                return self._concurrency(state, now, False, None)
+            case _:
+                return self._sliding_log(state, now)
 
-        return Limiter(max_calls=max_calls, period=period, source=source)
+    def _finish_update(self, elapsed: Optional[float]) -> Optional[LimitUpdate]:
+        """
+        Get the update recording that a call finished.
 
-    def rate_limit(self) -> Optional[Response]:
-        call_history = self.call_history
+        Parameters:
+            elapsed (float | None): The wall time (seconds) of the call, None if it did not run.
+
+        Returns:
+            LimitUpdate | None: The update, None if nothing is recorded.
+        """
+        if self.algorithm == "concurrency":
+            return lambda state, now: self._concurrency(state, now, True, elapsed)
+        if self.cost != "time" or not elapsed:
+            return None
+        if self.algorithm == "sliding_window":
+            return lambda state, now: self._sliding_window(state, now, elapsed, False)
+        return lambda state, now: self._token_bucket(state, now, elapsed, False)
+
+    def _sliding_log(
+        self, calls: Optional[list[float]], now: float
+    ) -> tuple[list, Any]:
+        """
+        Check and record a call, the sliding log of the call times.
+
+        Parameters:
+            calls (list[float] | None): The times of the calls in the last `period`, None for a new client.
+            now (float): The current time.
+
+        Returns:
+            tuple[list, Any]: The new times, and the seconds to wait, None if the call is allowed.
+        """
+        calls = [call for call in calls or [] if now - call <= self.period]
+        if len(calls) >= self.max_calls:
+            return calls, self.period - (now - calls[0])
+        calls.append(now)
+        return calls, None
+
+    def _sliding_window(
+        self,
+        state: Optional[tuple[float, float, float]],
+        now: float,
+        cost: float,
+        check: bool,
+    ) -> tuple[tuple, Any]:
+        """
+        Check and record a call, the costs of the calls in the current and the last fixed window.
+
+        Parameters:
+            state (tuple[float, float, float] | None): The start of the current window, and the costs of the current
+                                                       and the last window, None for a new client.
+            now (float): The current time.
+            cost (float): The cost of the call, 0 to only check that some budget is left.
+            check (bool): Whether to check the budget, or only to charge the cost.
+
+        Returns:
+            tuple[tuple, Any]: The new state, and the seconds to wait, None if the call is allowed.
+        """
+        window = now - now % self.period
+        start, current, previous = state or (window, 0, 0)
+        if start != window:
+            # The last window counts only if it is right before this one
+            previous = current if window - start < self.period * 1.5 else 0
+            start, current = window, 0
+        elapsed = now - window
+        used = previous * (1 - elapsed / self.period) + current
+        if check and (used + cost > self.max_calls if cost else used >= self.max_calls):
+            budget = self.max_calls - current - cost
+            if budget < 0 or previous == 0:
+                time_to_wait = self.period - elapsed
+            else:
+                # When the weight of the last window has dropped enough
+                time_to_wait = self.period * (1 - budget / previous) - elapsed
+            return (start, current, previous), time_to_wait
+        return (start, current + cost, previous), None
+
+    def _token_bucket(
+        self, state: Optional[tuple[float, float]], now: float, cost: float, check: bool
+    ) -> tuple[tuple, Any]:
+        """
+        Check and record a call, the tokens left in the bucket.
+
+        Parameters:
+            state (tuple[float, float] | None): The tokens, and when they were counted, None for a new client (a full
+                                                bucket).
+            now (float): The current time.
+            cost (float): The cost of the call, 0 to only check that some tokens are left.
+            check (bool): Whether to check the tokens, or only to take them, the bucket may go into debt.
+
+        Returns:
+            tuple[tuple, Any]: The new state, and the seconds to wait, None if the call is allowed.
+        """
+        rate = self.max_calls / self.period
+        tokens, counted_at = state or (self.max_calls, now)
+        tokens = min(self.max_calls, tokens + max(now - counted_at, 0) * rate)
+        if check and (tokens < cost if cost else tokens <= 0):
+            return (tokens, now), (cost - tokens) / rate
+        return (tokens - cost, now), None
+
+    def _concurrency(
+        self,
+        state: Optional[tuple[int, float]],
+        now: float,
+        finished: bool,
+        elapsed: Optional[float],
+    ) -> tuple[tuple, Any]:
+        """
+        Check and record that a call starts, or that it finishes, the calls in flight.
+
+        Parameters:
+            state (tuple[int, float] | None): The calls in flight, and their average wall time, None for a new
+                                              client.
+            now (float): The current time.
+            finished (bool): False when a call starts, True when it finishes or is given back, its slot is released.
+            elapsed (float | None): The wall time (seconds) of the finished call, None if it did not run, the average
+                                    is kept.
+
+        Returns:
+            tuple[tuple, Any]: The new state, and the seconds to wait, None if the call is allowed.
+        """
+        in_flight, duration = state or (0, 0.0)
+        if finished:
+            if elapsed is not None:
+                duration = duration * 0.8 + elapsed * 0.2 if duration else elapsed
+            return (max(in_flight - 1, 0), duration), None
+        if in_flight >= self.max_calls:
+            # The calls in flight are expected to finish evenly spread over their average wall time
+            return (in_flight, duration), duration / in_flight if duration else 1
+        return (in_flight + 1, duration), None
+
+    def _key(self, kind: Optional[str] = None) -> str:
+        """
+        Get the store key of the client of this request.
+
+        Parameters:
+            kind (str | None): What is counted, e.g. "upload", counted apart from the calls. None for the calls.
+
+        Returns:
+            str: The key.
+        """
         match self.source:
             case LimitSource.IP:
                 source: Optional[str] = None
@@ -108,32 +469,84 @@ class Limiter:
             case LimitSource.SESSION:
                 source = session.get("__funix_id")
 
+            case LimitSource.FUNCTION:
+                source = "all"
+
             case _:
                 raise ValueError("Invalid source")
 
-        if source not in call_history:
-            call_history[source] = deque()
-
-        queue = call_history[source]
-        current_time = time.time()
-
-        while len(queue) > 0 and current_time - queue[0] > self.period:
-            queue.popleft()
-
-        if len(queue) >= self.max_calls:
-            time_passed = current_time - queue[0]
-            time_to_wait = int(self.period - time_passed)
+        # Not named by `funix` or `set_rate_limiters`, e.g. used by hand, counted per endpoint in every worker
+        scope = self.scope if self.scope is not None else request.endpoint
+        if kind is not None:
+            scope = f"{scope}:{kind}"
+        return f"{scope}:{self.source.name}:{source}"
+
+    def rate_limit(self, kind: Optional[str] = None) -> Optional[Response]:
+        """
+        Check and record a call of this request, call `finish` when it is done if it is allowed.
+
+        Parameters:
+            kind (str | None): What is counted, e.g. "upload", counted apart from the calls. None for the calls.
+
+        Returns:
+            flask.Response | None: 429 with `Retry-After` if the call is not allowed, else None.
+        """
+        store = self.store if self.store is not None else get_limit_store()
+        watch_limit_store(store)
+        time_to_wait = store.update(self._key(kind), self._update, self.ttl)
+        if time_to_wait is not None:
+            time_to_wait = ceil(time_to_wait)
             error_message = {
                 "error_body": f"Rate limit exceeded. Please try again in {time_to_wait} seconds.",
                 "error_type": "safe_checker",
             }
             return Response(
-                dumps(error_message), status=429, mimetype="application/json"
+                dumps(error_message),
+                status=429,
+                mimetype="application/json",
+                headers={"Retry-After": str(time_to_wait)},
             )
-
-        queue.append(current_time)
         return None
 
+    def finish(self, elapsed: Optional[float], kind: Optional[str] = None) -> None:
+        """
+        Record that a call allowed by `rate_limit` is done, in the same request.
+
+        Parameters:
+            elapsed (float | None): The wall time (seconds) of the call, None if it did not run and is given back,
+                                    the slot of a concurrency limiter is released either way.
+            kind (str | None): What is counted, the same as for `rate_limit`.
+        """
+        update = self._finish_update(elapsed)
+        if update is not None:
+            store = self.store if self.store is not None else get_limit_store()
+            store.update(self._key(kind), update, self.ttl)
+
+
+def check_rate_limits(
+    limiters: list[Limiter], kind: Optional[str] = None
+) -> Optional[Response]:
+    """
+    Check and record a call of this request with the limiters, in order. If one of them does not allow it, the
+    calls counted by the ones before are given back. Call `finish` of all the limiters when it is done if it is
+    allowed.
+
+    Parameters:
+        limiters (list[Limiter]): The limiters.
+        kind (str | None): What is counted, see `Limiter.rate_limit`.
+
+    Returns:
+        flask.Response | None: 429 with `Retry-After` if the call is not allowed, else None.
+    """
+    for index, limiter in enumerate(limiters):
+        limit_result = limiter.rate_limit(kind)
+        if limit_result is not None:
+            # Give back the calls in flight counted by the limiters before
+            for allowed_limiter in limiters[:index]:
+                allowed_limiter.finish(None, kind)
+            return limit_result
+    return None
+
 
 def set_ip_header(headers: Optional[list[str]]):
     global ip_headers
@@ -147,7 +560,9 @@ def set_ip_header(headers: Optional[list[str]]):
 
 
 def parse_limiter_args(
-    rate_limit: Union[Limiter, list, dict, None], arg_name: str = "rate_limit"
+    rate_limit: Union[Limiter, list, dict, None],
+    arg_name: str = "rate_limit",
+    scope: Optional[str] = None,
 ) -> Optional[list[Limiter]]:
     if rate_limit is None:
         return []
@@ -181,6 +596,9 @@ def parse_limiter_args(
     else:
         raise TypeError(f"Invalid arguments, unsupported type for `{arg_name}`")
 
+    if scope is not None:
+        for index, limiter in enumerate(limiters):
+            limiter.set_scope(f"{scope}:{index}")
     return limiters
 
 
@@ -189,4 +607,16 @@ global_rate_limiters: list[Limiter] = []
 
 def set_rate_limiters(limiters: list[Limiter]):
     global global_rate_limiters
+    for index, limiter in enumerate(limiters):
+        limiter.set_scope(f"global:{index}")
     global_rate_limiters = limiters
+
+
+def get_rate_limiters() -> list[Limiter]:
+    """
+    Get the limiters of all the functions, see `set_rate_limiters`.
+
+    Returns:
+        list[Limiter]: The limiters.
+    """
+    return global_rate_limiters
@@ -12,11 +12,9 @@ the types of parameters, the types of return values and the rough logic.
 """
 
 import ast
-import base64
-import io
 import json
 from importlib import import_module
-from inspect import Parameter, Signature, getsource, signature, getfile
+from inspect import Parameter, Signature, getfile, getsource, ismethod, signature
 from re import Match, search
 from types import ModuleType
 from typing import Any, Callable
@@ -30,13 +28,20 @@ from funix.config import (
     supported_basic_types_dict,
 )
 from funix.decorator.annnotation_analyzer import analyze
-from funix.decorator.file import get_static_uri, handle_ipython_audio_image_video
+from funix.decorator.figure import render_figure
+from funix.decorator.file import (
+    get_real_uri,
+    get_static_uri,
+    handle_ipython_audio_image_video,
+)
 from funix.decorator.lists import (
     get_function_detail_by_uuid,
     get_function_uuid_with_id,
     get_class_method_funix,
 )
+from funix.decorator.result import get_paged_dataframe
 from funix.app import matplotlib_figure_manager
+from funix.util.json_stream import DataFrameRecords
 
 __matplotlib_use = False
 """
@@ -369,16 +374,21 @@ def function_param_to_widget(annotation: any, widget: str) -> any:
     return widget
 
 
-def get_dataframe_json(dataframe) -> dict:
+def get_dataframe_json(dataframe, defer: bool = False) -> dict | DataFrameRecords:
     """
     Converts a pandas dataframe to a dictionary for drawing on the frontend
 
     Parameters:
         dataframe (pandas.DataFrame | pandera.typing.DataFrame): The dataframe to convert
+        defer (bool): Whether to defer the conversion to the response encoder, see `funix.util.json_stream`.
+                      Large dataframes are kept on the server, see `funix.decorator.result`.
 
     Returns:
-        dict: The converted dataframe
+        dict | DataFrameRecords: The converted dataframe, or the first page of it
     """
+    if defer:
+        paged = get_paged_dataframe(dataframe)
+        return DataFrameRecords(dataframe) if paged is None else paged
     return json.loads(dataframe.to_json(orient="records"))
 
 
@@ -420,25 +430,9 @@ def get_figure_image(figure, format_) -> str:
         format_ (str): The format of the image, e.g., "svg", "png"
 
     Returns:
-        # str: The converted image with static URI
-        str: The converted image with base64
+        str: The converted image with static URI
     """
-    import matplotlib.pyplot
-
-    matplotlib.pyplot.close()
-
-    with io.BytesIO() as buf:
-        figure.savefig(buf, format=format_, bbox_inches="tight")
-        buf.seek(0)
-        base64_image = base64.b64encode(buf.getvalue()).decode("utf-8")
-        mime = ""
-        if format_ == "svg":
-            mime = "image/svg+xml"
-        elif format_ == "png":
-            mime = "image/png"
-        elif format_ == "jpeg":
-            mime = "image/jpeg"
-        return f"data:{mime};base64,{base64_image}"
+    return get_real_uri(render_figure(figure, format_))
 
 
 class LambdaVisitor(ast.NodeVisitor):
@@ -471,6 +465,11 @@ class LambdaVisitor(ast.NodeVisitor):
                     .__class__.__dict__[self.lambda_call_function.__name__]
                     .__qualname__,
                 )
+            elif ismethod(self.lambda_call_function):
+                # `self` from the closure, the bound method is new every time
+                self.lambda_call_function = get_class_method_funix(
+                    self.app_name, self.lambda_call_function.__func__.__qualname__
+                )
 
             if (
                 get_function_uuid_with_id(self.app_name, id(self.lambda_call_function))
@@ -502,11 +501,37 @@ class LambdaVisitor(ast.NodeVisitor):
                 self.args = sign.arguments
 
 
-def get_callable_result(
-    app_name: str, function: Callable, function_locals: dict
-) -> dict:
+def get_closure_locals(function: Callable) -> dict:
+    """
+    Get the local variables that the function (usually a lambda) captured from the enclosing function.
+
+    Every local variable a lambda uses is a free variable of it, so the closure is all the lambda needs, and funix
+    does not have to snatch the frame of the enclosing function (with `sys.settrace`) to get them.
+
+    Parameters:
+        function (Callable): The function.
+
+    Returns:
+        dict: The captured variables, name to value.
+    """
+    closure = getattr(function, "__closure__", None)
+    if not closure:
+        return {}
+    function_locals = {}
+    for name, cell in zip(function.__code__.co_freevars, closure):
+        try:
+            function_locals[name] = cell.cell_contents
+        except ValueError:
+            # Empty cell, the variable is not assigned yet
+            continue
+    return function_locals
+
+
+def get_callable_result(app_name: str, function: Callable) -> dict:
     if function.__name__ == "<lambda>":
-        visitor = LambdaVisitor(app_name, function.__globals__, function_locals)
+        visitor = LambdaVisitor(
+            app_name, function.__globals__, get_closure_locals(function)
+        )
         visitor.visit(ast.parse(getsource(function).strip()))
         if visitor.lambda_call_function is None:
             return {"jump": "#", "title": "No jump"}
@@ -526,23 +551,23 @@ def get_callable_result(
 
 
 def anal_function_result(
-    frame: Any,
     app_name: str,
     function_call_result: Any,
     return_type_parsed: Any,
     cast_to_list_flag: bool,
     matplotlib_format: str,
+    defer_dataframe: bool = False,
 ) -> Any:
     """
     Analyze the function result to get the frontend-readable data.
 
     Parameters:
-        frame (Any): The frame.
         app_name (str): The app name.
         function_call_result (Any): The function call result.
         return_type_parsed (Any): The parsed return type.
         cast_to_list_flag (bool): Whether to cast the result to list.
         matplotlib_format (str): The matplotlib format, used for image conversion.
+        defer_dataframe (bool): Whether to defer the dataframe conversion to the response encoder.
 
     Returns:
         Any: The frontend-readable data.
@@ -556,10 +581,10 @@ def anal_function_result(
         return [get_figure_image(call_result, matplotlib_format)]
 
     if return_type_parsed == "Dataframe":
-        return [get_dataframe_json(call_result)]
+        return [get_dataframe_json(call_result, defer_dataframe)]
 
     if return_type_parsed == "Callable":
-        return [get_callable_result(app_name, call_result, frame.f_locals)]
+        return [get_callable_result(app_name, call_result)]
 
     if return_type_parsed in supported_basic_file_types:
         if __ipython_use:
@@ -643,12 +668,12 @@ def anal_function_result(
 
                     if single_return_type == "Callable":
                         call_result[position] = get_callable_result(
-                            app_name, call_result[position], frame.f_locals
+                            app_name, call_result[position]
                         )
 
                     if single_return_type == "Dataframe":
                         call_result[position] = get_dataframe_json(
-                            call_result[position]
+                            call_result[position], defer_dataframe
                         )
 
                     if single_return_type in supported_basic_file_types:
@@ -701,11 +726,9 @@ def anal_function_result(
                 if return_type_parsed == "FigureImage":
                     call_result = [get_figure_image(call_result[0], matplotlib_format)]
                 if return_type_parsed == "Dataframe":
-                    call_result = [get_dataframe_json(call_result[0])]
+                    call_result = [get_dataframe_json(call_result[0], defer_dataframe)]
                 if return_type_parsed == "Callable":
-                    call_result = [
-                        get_callable_result(app_name, call_result[0], frame.f_locals)
-                    ]
+                    call_result = [get_callable_result(app_name, call_result[0])]
                 if return_type_parsed in supported_basic_file_types:
                     if isinstance(call_result[0], list):
                         if __ipython_use:
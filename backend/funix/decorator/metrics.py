@@ -0,0 +1,50 @@
+"""
+Runtime metrics of funix, served at `/__funix/metrics`.
+"""
+
+from typing import Any, Callable
+
+from flask import Flask
+
+from funix.config import internal_route_prefix
+
+metrics_providers: dict[str, Callable[[], Any]] = {}
+"""
+A dict, key is the section name, value is the function that returns the section.
+"""
+
+
+def register_metrics_provider(name: str, provider: Callable[[], Any]) -> None:
+    """
+    Register a metrics section.
+
+    Parameters:
+        name (str): The section name.
+        provider (Callable[[], Any]): Returns the JSON-serializable section.
+    """
+    metrics_providers[name] = provider
+
+
+def get_metrics() -> dict:
+    """
+    Collect all metrics sections.
+
+    Returns:
+        dict: Key is the section name, value is the section.
+    """
+    return {name: provider() for name, provider in metrics_providers.items()}
+
+
+def enable_metrics(flask_app: Flask):
+    @flask_app.get(f"{internal_route_prefix}/metrics")
+    def __funix_metrics():
+        """
+        Get the runtime metrics, e.g. the occupancy and queue depth of the executors.
+
+        Routes:
+            /__funix/metrics: The metrics.
+
+        Returns:
+            flask.Response: The metrics.
+        """
+        return get_metrics()
@@ -0,0 +1,370 @@
+"""
+Result handles for large table outputs.
+
+A DataFrame result with more than `GlobalSwitchOption.RESULT_PAGE_SIZE` rows is kept on the server, only its first
+page is sent with the call result. The frontend fetches the other pages, sorted and filtered on the server, from
+`/__funix/result/<handle>`.
+
+The tables are kept in the memory of the worker process that ran the function, the least recently used ones are evicted
+over `GlobalSwitchOption.RESULT_MEMORY_LIMIT` bytes.
+"""
+
+from collections import OrderedDict
+from json import loads
+from threading import Lock
+from typing import Any
+from uuid import uuid4
+
+from flask import Flask, abort, has_request_context, request, session
+
+from funix.config import internal_route_prefix
+from funix.config.switch import GlobalSwitchOption
+from funix.decorator.metrics import register_metrics_provider
+from funix.util.json_stream import DataFrameRecords, json_response
+from funix.util.scheduler import call_later
+
+RESULT_KEY = "__funix_result__"
+"""
+The key of the handle in a paged table.
+"""
+
+
+class ResultEntry:
+    """
+    A table kept on the server.
+    """
+
+    def __init__(self, dataframe: Any, owner: str | None):
+        """
+        Initialize the ResultEntry.
+
+        Parameters:
+            dataframe (pandas.DataFrame): The table.
+            owner (str | None): The funix id of the session that created it.
+        """
+        self.dataframe = dataframe
+        self.owner = owner
+        self.view: tuple[tuple[str, str], Any] | None = None
+        """The last (sort, filter) and the sorted and filtered table."""
+        self.table_size = get_dataframe_size(dataframe)
+        """The estimated size (bytes) of the table."""
+        self.size = self.table_size
+        """The estimated size (bytes) of the table and its view."""
+
+
+__results_dict: OrderedDict[str, ResultEntry] = OrderedDict()
+"""
+A dict, key is the result handle, value is the table. The least recently used tables are first.
+"""
+
+__results_lock = Lock()
+"""
+Lock for `__results_dict`, `__results_size` and `__results_evicted`.
+"""
+
+__results_size = 0
+"""
+The estimated total size (bytes) of the tables in `__results_dict`.
+"""
+
+__results_evicted = 0
+"""
+The number of tables evicted over the memory limit.
+"""
+
+
+def get_dataframe_size(dataframe: Any) -> int:
+    """
+    Estimate the memory used by a DataFrame.
+
+    Parameters:
+        dataframe (pandas.DataFrame): The DataFrame.
+
+    Returns:
+        int: The size in bytes, with the Python objects of the object columns.
+    """
+    return int(dataframe.memory_usage(index=True, deep=True).sum())
+
+
+def __evict_results(keep: str) -> None:
+    """
+    Evict the least recently used tables over the memory limit, with the lock held.
+
+    Parameters:
+        keep (str): The handle of the table that is being used, never evicted.
+    """
+    global __results_size, __results_evicted
+    limit = GlobalSwitchOption.RESULT_MEMORY_LIMIT
+    while limit != -1 and __results_size > limit:
+        handle = next(iter(__results_dict))
+        if handle == keep:
+            break
+        __results_size -= __results_dict.pop(handle).size
+        __results_evicted += 1
+
+
+def delete_result(handle: str) -> None:
+    """
+    Delete the result.
+
+    Parameters:
+        handle (str): The result handle.
+    """
+    global __results_size
+    with __results_lock:
+        entry = __results_dict.pop(handle, None)
+        if entry is not None:
+            __results_size -= entry.size
+
+
+def delete_result_task(handle: str) -> None:
+    """
+    Schedule the deletion of the result after `GlobalSwitchOption.RESULT_EXPIRE_TIME`, if it expires.
+
+    Parameters:
+        handle (str): The result handle.
+    """
+    if GlobalSwitchOption.RESULT_EXPIRE_TIME != -1:
+        call_later(GlobalSwitchOption.RESULT_EXPIRE_TIME, delete_result, handle)
+
+
+def get_result_count() -> int:
+    """
+    Get the number of tables kept on the server.
+
+    Returns:
+        int: The number of tables.
+    """
+    return len(__results_dict)
+
+
+def get_result_stats() -> dict:
+    """
+    Get the stats of the tables kept on the server.
+
+    Returns:
+        dict: The number of tables, their estimated size (bytes) and the number of evicted ones.
+    """
+    with __results_lock:
+        return {
+            "tables": len(__results_dict),
+            "bytes": __results_size,
+            "evicted": __results_evicted,
+        }
+
+
+def get_result_page(handle: str, dataframe: Any, offset: int, limit: int) -> dict:
+    """
+    Get a page of the table, in the format the frontend reads.
+
+    Parameters:
+        handle (str): The result handle.
+        dataframe (pandas.DataFrame): The table, sorted and filtered.
+        offset (int): The first row.
+        limit (int): The number of rows.
+
+    Returns:
+        dict: The page, rows are encoded by `json_response`.
+    """
+    return {
+        RESULT_KEY: handle,
+        "total": len(dataframe),
+        "offset": offset,
+        "rows": DataFrameRecords(dataframe.iloc[offset : offset + limit]),
+    }
+
+
+def get_paged_dataframe(dataframe: Any) -> dict | None:
+    """
+    Keep the DataFrame on the server if it is large, and get its first page.
+
+    Parameters:
+        dataframe (pandas.DataFrame): The DataFrame.
+
+    Returns:
+        dict | None: The first page, None if the DataFrame is small enough to be sent at once.
+    """
+    page_size = GlobalSwitchOption.RESULT_PAGE_SIZE
+    if page_size == -1 or len(dataframe) <= page_size:
+        return None
+    global __results_size
+    handle = uuid4().hex
+    owner = session.get("__funix_id") if has_request_context() else None
+    entry = ResultEntry(dataframe, owner)
+    with __results_lock:
+        __results_dict[handle] = entry
+        __results_size += entry.size
+        __evict_results(handle)
+    delete_result_task(handle)
+    return get_result_page(handle, dataframe, 0, page_size)
+
+
+def __filter_mask(column: Any, operator: str, value: Any) -> Any:
+    """
+    Get the mask of a filter item of the frontend table (MUI DataGrid filter model).
+
+    Parameters:
+        column (pandas.Series): The column.
+        operator (str): The operator.
+        value (Any): The value.
+
+    Returns:
+        pandas.Series | None: The mask, None if the item has no value and is ignored.
+
+    Raises:
+        ValueError: If the operator is not supported.
+    """
+    text = column.astype(str).str.lower()
+    empty = column.isna() | (text == "")
+    if operator == "isEmpty":
+        return empty
+    if operator == "isNotEmpty":
+        return ~empty
+    if value is None or value == "" or value == []:
+        return None
+    if operator == "isAnyOf":
+        return text.isin([str(item).lower() for item in value])
+    if operator in ("=", "!=", ">", ">=", "<", "<="):
+        number = float(value)
+        return {
+            "=": column == number,
+            "!=": column != number,
+            ">": column > number,
+            ">=": column >= number,
+            "<": column < number,
+            "<=": column <= number,
+        }[operator]
+    value = str(value).lower()
+    if operator == "contains":
+        return text.str.contains(value, regex=False)
+    if operator == "doesNotContain":
+        return ~text.str.contains(value, regex=False)
+    if operator in ("equals", "is"):
+        return text == value
+    if operator in ("doesNotEqual", "not"):
+        return text != value
+    if operator == "startsWith":
+        return text.str.startswith(value)
+    if operator == "endsWith":
+        return text.str.endswith(value)
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+def get_view(dataframe: Any, sort: str, filter_: str) -> Any:
+    """
+    Sort and filter the table.
+
+    Parameters:
+        dataframe (pandas.DataFrame): The table.
+        sort (str): The JSON sort model of the frontend table, `[{"field": "a", "sort": "asc"}]`.
+        filter_ (str): The JSON filter model of the frontend table,
+                       `{"items": [{"field": "a", "operator": ">", "value": 1}], "logicOperator": "and"}`.
+
+    Returns:
+        pandas.DataFrame: The sorted and filtered table.
+
+    Raises:
+        ValueError: If the models are not valid.
+    """
+    view = dataframe
+    if filter_:
+        filter_model = loads(filter_)
+        masks = []
+        for item in filter_model.get("items", []):
+            if item["field"] not in view.columns:
+                raise ValueError(f"Unknown column: {item['field']}")
+            mask = __filter_mask(
+                view[item["field"]], item["operator"], item.get("value")
+            )
+            if mask is not None:
+                masks.append(mask)
+        if masks:
+            combined = masks[0]
+            for mask in masks[1:]:
+                if filter_model.get("logicOperator") == "or":
+                    combined = combined | mask
+                else:
+                    combined = combined & mask
+            view = view[combined]
+    if sort:
+        sort_model = [item for item in loads(sort) if item.get("sort")]
+        for item in sort_model:
+            if item["field"] not in view.columns:
+                raise ValueError(f"Unknown column: {item['field']}")
+        if sort_model:
+            view = view.sort_values(
+                by=[item["field"] for item in sort_model],
+                ascending=[item["sort"] == "asc" for item in sort_model],
+                kind="stable",
+            )
+    return view
+
+
+def set_result_view(
+    handle: str, entry: ResultEntry, view_key: tuple[str, str], view: Any
+) -> None:
+    """
+    Keep the sorted and filtered table for the next pages, counted in the memory limit.
+
+    Parameters:
+        handle (str): The result handle.
+        entry (ResultEntry): The table.
+        view_key (tuple[str, str]): The sort and filter models.
+        view (pandas.DataFrame): The sorted and filtered table.
+    """
+    global __results_size
+    size = entry.table_size
+    if view is not entry.dataframe:
+        size += get_dataframe_size(view)
+    with __results_lock:
+        entry.view = (view_key, view)
+        if __results_dict.get(handle) is entry:
+            __results_size += size - entry.size
+            entry.size = size
+            __evict_results(handle)
+        else:
+            entry.size = size
+
+
+def enable_result_service(flask_app: Flask):
+    @flask_app.get(f"{internal_route_prefix}/result/<string:handle>")
+    def __funix_result(handle: str):
+        """
+        Get a page of a table kept on the server.
+
+        Routes:
+            /__funix/result/<string:handle>?offset=&limit=&sort=&filter=: The page.
+
+        Parameters:
+            handle (str): The result handle.
+
+        Returns:
+            flask.Response: The page, see `get_result_page`.
+        """
+        with __results_lock:
+            entry = __results_dict.get(handle)
+            if entry is not None:
+                __results_dict.move_to_end(handle)
+        if entry is None or entry.owner != session.get("__funix_id"):
+            return abort(404)
+        page_size = GlobalSwitchOption.RESULT_PAGE_SIZE
+        if page_size == -1:
+            page_size = len(entry.dataframe)
+        try:
+            offset = max(request.args.get("offset", 0, type=int), 0)
+            limit = request.args.get("limit", page_size, type=int)
+            limit = min(max(limit, 0), page_size * 10)
+            view_key = (request.args.get("sort", ""), request.args.get("filter", ""))
+            cached = entry.view
+            if cached is not None and cached[0] == view_key:
+                view = cached[1]
+            else:
+                view = get_view(entry.dataframe, *view_key)
+                # Paging through the same sort and filter reuses the view
+                set_result_view(handle, entry, view_key, view)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return {"error_type": "result", "error_body": str(e)}, 400
+        return json_response(get_result_page(handle, view, offset, limit))
+
+
+register_metrics_provider("results", get_result_stats)
@@ -0,0 +1,605 @@
+"""
+Streaming uploads for the upload widgets.
+
+The frontend posts the files of an upload widget to `/__funix/upload/<function_id>` as `multipart/form-data`, they are
+streamed to the upload directory and the response has one token per file. The call sends the tokens instead of the
+base64 data URIs, and they are resolved to bytes, paths or opened files when the function is called.
+
+An upload is checked like a call before its body is read: the secret of the function (`X-Funix-Secret` header), its
+rate limiters (counted apart from the calls) and its queue. The files kept for one browser are limited to
+`GlobalSwitchOption.UPLOAD_SESSION_LIMIT` bytes.
+"""
+
+from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from os import SEEK_END, cpu_count, getpid, remove
+from os.path import join
+from threading import Lock
+from tempfile import SpooledTemporaryFile
+from time import perf_counter
+from typing import IO, Any, Literal, Union, get_args, get_origin
+from urllib.parse import unquote_to_bytes
+from urllib.request import urlopen
+from uuid import uuid4
+
+from flask import Flask, abort, request, session
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+
+from funix.config import internal_route_prefix, supported_upload_widgets
+from funix.config.switch import GlobalSwitchOption
+from funix.decorator.executor import CallExecutor
+from funix.decorator.limit import Limiter, check_rate_limits, get_rate_limiters
+from funix.decorator.metrics import register_metrics_provider
+from funix.decorator.secret import get_secret_by_id
+from funix.hint import UploadType
+from funix.util.file import create_safe_tempdir
+from funix.util.scheduler import call_later
+
+UPLOAD_PREFIX = "funix-upload:"
+"""
+The prefix of the upload tokens.
+"""
+
+
+class UploadEntry:
+    """
+    A file uploaded to the server.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        filename: str,
+        content_type: str,
+        size: int,
+        owner: str | None,
+        function_id: str,
+    ):
+        """
+        Initialize the UploadEntry.
+
+        Parameters:
+            path (str): The path of the file in the upload directory.
+            filename (str): The name of the file on the client.
+            content_type (str): The content type sent by the client.
+            size (int): The size of the file (bytes).
+            owner (str | None): The funix id of the session that uploaded it.
+            function_id (str): The function the file is uploaded for.
+        """
+        self.path = path
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.owner = owner
+        self.function_id = function_id
+
+
+class UploadFunction:
+    """
+    A function accepting uploads, and how its uploads are checked.
+    """
+
+    def __init__(
+        self,
+        function_id: str,
+        limit: int | None,
+        limiters: list[Limiter],
+        executor: CallExecutor | None,
+        app_name: str,
+        secret: bool,
+    ):
+        """
+        Initialize the UploadFunction.
+
+        Parameters:
+            function_id (str): The function id.
+            limit (int | None): The max size of one upload request (bytes), None for
+                                `GlobalSwitchOption.UPLOAD_LIMIT`.
+            limiters (list[Limiter]): The rate limiters of the function.
+            executor (CallExecutor | None): The executor of the function, no upload is accepted while its queue is
+                                            full.
+            app_name (str): The app of the function, for its secret.
+            secret (bool): Whether the function needs a secret.
+        """
+        self.function_id = function_id
+        self.limit = limit
+        self.limiters = limiters
+        self.executor = executor
+        self.app_name = app_name
+        self.secret = secret
+
+
+__uploads_dict: dict[str, UploadEntry] = {}
+"""
+A dict, key is the upload token without the prefix, value is the file.
+"""
+
+__uploads_lock = Lock()
+"""
+Lock for `__uploads_dict`.
+"""
+
+__upload_dir: str | None = None
+"""
+The directory of the uploaded files, created on the first upload.
+"""
+
+__upload_functions: dict[str, UploadFunction] = {}
+"""
+A dict, key is the function id or endpoint, value is the function.
+"""
+
+__upload_owners: dict[str | None, int] = {}
+"""
+A dict, key is the funix id of a session, value is the total size (bytes) of its kept files and uploads in progress.
+"""
+
+__upload_pool: ThreadPoolExecutor | None = None
+"""
+The pool reading the files of the "multiple" upload widgets.
+"""
+
+__upload_pool_pid: int | None = None
+"""
+The process that created the upload pool.
+"""
+
+
+def get_upload_keys(
+    json_schema_props: dict,
+) -> dict[str, Literal["single", "multiple"]]:
+    """
+    Get the parameters with upload widgets.
+
+    Parameters:
+        json_schema_props (dict): The JSON schema properties of the function.
+
+    Returns:
+        dict[str, Literal["single", "multiple"]]: The parameters, "multiple" for lists of files.
+    """
+    upload_keys = {}
+    for key, prop in json_schema_props.items():
+        if prop.get("widget") in supported_upload_widgets:
+            upload_keys[key] = "single"
+        if prop.get("items", {}).get("widget") in supported_upload_widgets:
+            upload_keys[key] = "multiple"
+    return upload_keys
+
+
+def get_upload_mode(annotation: Any, default: UploadType) -> UploadType:
+    """
+    Get how the files of an upload widget are passed to the function, from the annotation of the parameter.
+
+    Parameters:
+        annotation (Any): The annotation, e.g. `PathFile`, `list[StreamFile]` or `Optional[BytesFile]`.
+        default (UploadType): The `upload` of the function, for the annotations without a mode.
+
+    Returns:
+        UploadType: The mode.
+    """
+    while get_origin(annotation) in (list, Union) and get_args(annotation):
+        annotation = get_args(annotation)[0]
+    return getattr(annotation, "__funix_upload__", default)
+
+
+def get_upload_limit(limit: int | None) -> int:
+    """
+    Get the upload limit in effect.
+
+    Parameters:
+        limit (int | None): The upload limit of the function, None for `GlobalSwitchOption.UPLOAD_LIMIT`.
+
+    Returns:
+        int: The upload limit (bytes), -1 for no limit.
+    """
+    return GlobalSwitchOption.UPLOAD_LIMIT if limit is None else limit
+
+
+def register_upload_function(upload_function: UploadFunction, endpoint: str) -> None:
+    """
+    Accept uploads for the function.
+
+    Parameters:
+        upload_function (UploadFunction): The function.
+        endpoint (str): The endpoint of the function.
+    """
+    __upload_functions[upload_function.function_id] = upload_function
+    __upload_functions[endpoint] = upload_function
+
+
+def __add_owner_bytes(owner: str | None, size: int) -> None:
+    """
+    Count the bytes kept for a session, with `__uploads_lock` held.
+
+    Parameters:
+        owner (str | None): The funix id of the session.
+        size (int): The bytes, negative when they are removed.
+    """
+    total = __upload_owners.get(owner, 0) + size
+    if total > 0:
+        __upload_owners[owner] = total
+    else:
+        __upload_owners.pop(owner, None)
+
+
+def reserve_upload(owner: str | None, size: int) -> int | None:
+    """
+    Reserve the bytes of an upload in progress for a session, under `GlobalSwitchOption.UPLOAD_SESSION_LIMIT`.
+
+    Parameters:
+        owner (str | None): The funix id of the session.
+        size (int): The bytes, the content length of the request.
+
+    Returns:
+        int | None: The bytes the session can still upload (-1 for no limit), after the reserved ones, None if the
+            upload is over the limit and nothing is reserved.
+    """
+    session_limit = GlobalSwitchOption.UPLOAD_SESSION_LIMIT
+    with __uploads_lock:
+        if session_limit == -1:
+            __add_owner_bytes(owner, size)
+            return -1
+        left = session_limit - __upload_owners.get(owner, 0) - size
+        if left < 0 or (size == 0 and left == 0):
+            return None
+        __add_owner_bytes(owner, size)
+        return left
+
+
+def release_upload(owner: str | None, size: int) -> None:
+    """
+    Release the bytes reserved by `reserve_upload`.
+
+    Parameters:
+        owner (str | None): The funix id of the session.
+        size (int): The bytes.
+    """
+    with __uploads_lock:
+        __add_owner_bytes(owner, -size)
+
+
+def __get_upload_dir() -> str:
+    """
+    Get the upload directory, create it if it does not exist.
+
+    Returns:
+        str: The upload directory.
+    """
+    global __upload_dir
+    with __uploads_lock:
+        if __upload_dir is None:
+            __upload_dir = create_safe_tempdir()
+        return __upload_dir
+
+
+def __remove_file(path: str) -> None:
+    """
+    Remove the file, ignore it if it is already removed.
+
+    Parameters:
+        path (str): The path.
+    """
+    try:
+        remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def delete_upload(token: str) -> None:
+    """
+    Delete the uploaded file.
+
+    Parameters:
+        token (str): The upload token, without the prefix.
+    """
+    with __uploads_lock:
+        entry = __uploads_dict.pop(token, None)
+        if entry is not None:
+            __add_owner_bytes(entry.owner, -entry.size)
+    if entry is not None:
+        __remove_file(entry.path)
+
+
+def add_upload(entry: UploadEntry) -> str:
+    """
+    Keep the uploaded file until `GlobalSwitchOption.UPLOAD_EXPIRE_TIME`.
+
+    Parameters:
+        entry (UploadEntry): The file.
+
+    Returns:
+        str: The upload token.
+    """
+    token = uuid4().hex
+    with __uploads_lock:
+        __uploads_dict[token] = entry
+        __add_owner_bytes(entry.owner, entry.size)
+    if GlobalSwitchOption.UPLOAD_EXPIRE_TIME != -1:
+        call_later(GlobalSwitchOption.UPLOAD_EXPIRE_TIME, delete_upload, token)
+    return UPLOAD_PREFIX + token
+
+
+def get_upload_stats() -> dict:
+    """
+    Get the stats of the uploaded files.
+
+    Returns:
+        dict: The number of the files and their total size (bytes).
+    """
+    with __uploads_lock:
+        entries = list(__uploads_dict.values())
+    return {"files": len(entries), "bytes": sum(entry.size for entry in entries)}
+
+
+def get_upload_pool() -> ThreadPoolExecutor:
+    """
+    Get the pool reading the files of the "multiple" upload widgets. The reads are mostly I/O (disk, remote URLs),
+    so the pool is a bit larger than the CPU count, like the default of `ThreadPoolExecutor`.
+
+    Returns:
+        ThreadPoolExecutor: The pool.
+    """
+    global __upload_pool, __upload_pool_pid
+    with __uploads_lock:
+        if __upload_pool is None or __upload_pool_pid != getpid():
+            __upload_pool = ThreadPoolExecutor(
+                min(32, (cpu_count() or 1) + 4), thread_name_prefix="funix-upload"
+            )
+            __upload_pool_pid = getpid()
+        return __upload_pool
+
+
+def read_url(url: str) -> bytes:
+    """
+    Read the content of a data URI or a remote URL.
+
+    Parameters:
+        url (str): The URL.
+
+    Returns:
+        bytes: The content.
+    """
+    if url.startswith("data:"):
+        # `urlopen` percent-decodes the whole payload in Python before decoding base64
+        header, _, data = url.partition(",")
+        if header.endswith(";base64"):
+            return b64decode(unquote_to_bytes(data) if "%" in data else data)
+        return unquote_to_bytes(data)
+    with urlopen(url) as rsp:
+        return rsp.read()
+
+
+def get_upload_argument(value: Any, function_id: str, mode: UploadType) -> Any:
+    """
+    Get the argument of an upload widget.
+
+    Parameters:
+        value (Any): The upload token, or a data URI from the clients that do not use `/upload`.
+        function_id (str): The function id.
+        mode (UploadType): How the file is passed to the function.
+
+    Returns:
+        bytes | str | IO[bytes]: The content, the path or the opened file, see `UploadType`.
+
+    Raises:
+        ValueError: If the token is unknown, expired, or uploaded by another session or for another function.
+    """
+    if isinstance(value, str) and value.startswith(UPLOAD_PREFIX):
+        with __uploads_lock:
+            entry = __uploads_dict.get(value[len(UPLOAD_PREFIX) :])
+        if (
+            entry is None
+            or entry.owner != session.get("__funix_id")
+            or entry.function_id != function_id
+        ):
+            raise ValueError(f"Unknown or expired upload: {value}")
+        if mode == "path":
+            return entry.path
+        if mode == "file":
+            return open(entry.path, "rb")
+        with open(entry.path, "rb") as f:
+            return f.read()
+    content = read_url(value)
+    if mode == "file":
+        file = SpooledTemporaryFile(GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP)
+        file.write(content)
+        file.seek(0)
+        return file
+    if mode == "path":
+        path = join(__get_upload_dir(), uuid4().hex)
+        with open(path, "wb") as f:
+            f.write(content)
+        add_upload(
+            UploadEntry(
+                path, "", "", len(content), session.get("__funix_id"), function_id
+            )
+        )
+        return path
+    return content
+
+
+def get_upload_arguments(values: list, function_id: str, mode: UploadType) -> list:
+    """
+    Get the arguments of a "multiple" upload widget. The data URIs and remote URLs are read in parallel in the upload
+    pool, the uploaded files are local and read in the request thread.
+
+    Parameters:
+        values (list): The upload tokens or data URIs.
+        function_id (str): The function id.
+        mode (UploadType): How the files are passed to the function.
+
+    Returns:
+        list: The arguments, in order, see `get_upload_argument`.
+
+    Raises:
+        ValueError: If a token is unknown, expired, or uploaded by another session or for another function.
+    """
+    urls = [
+        index
+        for index, value in enumerate(values)
+        if not (isinstance(value, str) and value.startswith(UPLOAD_PREFIX))
+    ]
+    futures = {}
+    if len(urls) > 1:
+        upload_pool = get_upload_pool()
+        # Each read runs in a copy of the request context, for the session
+        for index in urls:
+            futures[index] = upload_pool.submit(
+                copy_context().run,
+                get_upload_argument,
+                values[index],
+                function_id,
+                mode,
+            )
+    arguments = []
+    error = None
+    for index, value in enumerate(values):
+        try:
+            if index in futures:
+                arguments.append(futures[index].result())
+            else:
+                arguments.append(get_upload_argument(value, function_id, mode))
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        if mode == "file":
+            for argument in arguments:
+                argument.close()
+        raise error
+    return arguments
+
+
+def enable_upload_service(flask_app: Flask):
+    @flask_app.post(f"{internal_route_prefix}/upload/<string:function_id>")
+    def __funix_upload(function_id: str):
+        """
+        Upload the files of an upload widget.
+
+        Routes:
+            /__funix/upload/<string:function_id>: The files, in a `multipart/form-data` body, and the secret of the function
+                                          in the `X-Funix-Secret` header if it has one.
+
+        Parameters:
+            function_id (str): The function id or endpoint.
+
+        Returns:
+            flask.Response: The upload tokens, `{"tokens": [...]}`, in the order of the files.
+        """
+        upload_function = __upload_functions.get(function_id)
+        if upload_function is None:
+            return abort(404)
+        # Checked like a call, before reading the body
+        if upload_function.secret and request.headers.get(
+            "X-Funix-Secret"
+        ) != get_secret_by_id(upload_function.app_name, upload_function.function_id):
+            return {
+                "error_type": "wrapper",
+                "error_body": "Provided secret is incorrect.",
+            }, 403
+        if upload_function.executor is not None and upload_function.executor.full:
+            return upload_function.executor.busy_response()
+        if not session.get("__funix_id"):
+            session["__funix_id"] = uuid4().hex
+        limiters = get_rate_limiters() + upload_function.limiters
+        limit_result = check_rate_limits(limiters, "upload")
+        if limit_result is not None:
+            return limit_result
+        start = perf_counter()
+        try:
+            return __receive_upload(upload_function)
+        finally:
+            for limiter in limiters:
+                limiter.finish(perf_counter() - start, "upload")
+
+    def __receive_upload(upload_function: UploadFunction):
+        """
+        Stream the files of the request to the upload directory.
+
+        Parameters:
+            upload_function (UploadFunction): The function.
+
+        Returns:
+            flask.Response: The upload tokens, or 413 if the upload is over the limits.
+        """
+        owner = session["__funix_id"]
+        limit = get_upload_limit(upload_function.limit)
+        content_length = request.content_length or 0
+        if limit != -1 and content_length > limit:
+            return {
+                "error_type": "upload",
+                "error_body": f"The upload is bigger than the limit, {limit} bytes.",
+            }, 413
+        left = reserve_upload(owner, content_length)
+        session_error = {
+            "error_type": "upload",
+            "error_body": f"The files uploaded by this browser are bigger than the limit, "
+            f"{GlobalSwitchOption.UPLOAD_SESSION_LIMIT} bytes, try again when they expire.",
+        }, 413
+        if left is None:
+            return session_error
+        # Without `Content-Length`, the body is cut at the smaller limit
+        max_content_length = None if limit == -1 else limit
+        if left != -1 and (
+            max_content_length is None or content_length + left < max_content_length
+        ):
+            max_content_length = content_length + left
+        upload_dir = __get_upload_dir()
+        paths: list[str] = []
+
+        def stream_factory(
+            total_content_length: int | None,
+            content_type: str | None,
+            filename: str | None,
+            content_length: int | None = None,
+        ) -> IO[bytes]:
+            path = join(upload_dir, uuid4().hex)
+            paths.append(path)
+            return open(path, "wb+")
+
+        try:
+            try:
+                _, _, files = parse_form_data(
+                    request.environ,
+                    stream_factory=stream_factory,
+                    max_content_length=max_content_length,
+                )
+            except RequestEntityTooLarge:
+                for path in paths:
+                    __remove_file(path)
+                if max_content_length == limit:
+                    return {
+                        "error_type": "upload",
+                        "error_body": f"The upload is bigger than the limit, {limit} bytes.",
+                    }, 413
+                return session_error
+            except:
+                for path in paths:
+                    __remove_file(path)
+                raise
+            tokens = []
+            for _, file in files.items(multi=True):
+                stream = file.stream
+                # werkzeug rewinds the streams after parsing
+                size = stream.seek(0, SEEK_END)
+                stream.close()
+                tokens.append(
+                    add_upload(
+                        UploadEntry(
+                            stream.name,
+                            file.filename or "",
+                            file.content_type or "",
+                            size,
+                            owner,
+                            upload_function.function_id,
+                        )
+                    )
+                )
+            return {"tokens": tokens}
+        finally:
+            # The kept files are counted by `add_upload` now
+            release_upload(owner, content_length)
+
+
+register_metrics_provider("uploads", get_upload_stats)
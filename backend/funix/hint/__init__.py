@@ -176,6 +176,36 @@ The type of the `direction`.
 Default: "row".
 """
 
+VectorizedType = bool | Literal["numpy"]
+"""
+The type of the `vectorized`.
+
+Types:
+    False: The function is called once per row of the cells.
+    True: The function is called once with the columns of the cells as lists, and returns a column.
+    numpy: Like True, but the columns are NumPy arrays.
+"""
+
+ExecutorType = Optional[Literal["thread", "process"]]
+"""
+The type of the `executor`.
+
+Types:
+    thread: Run the calls in a thread pool, for functions that release the GIL (numpy, I/O, etc.).
+    process: Run the calls in a process pool, for pure Python CPU-heavy functions. The function, the arguments and
+             the result must be picklable.
+"""
+
+UploadType = Literal["bytes", "path", "file"]
+"""
+The type of the `upload`, how the files of the upload widgets are passed to the function.
+
+Types:
+    bytes: The content of the file.
+    path: The path of the uploaded file, it is removed after `GlobalSwitchOption.UPLOAD_EXPIRE_TIME`.
+    file: The uploaded file opened in binary mode, it is closed after the call.
+"""
+
 
 class ConditionalVisible(TypedDict):
     """
@@ -398,6 +428,8 @@ BytesImage: TypeAlias = builtin.BytesImage
 BytesVideo: TypeAlias = builtin.BytesVideo
 BytesAudio: TypeAlias = builtin.BytesAudio
 BytesFile: TypeAlias = builtin.BytesFile
+PathFile: TypeAlias = builtin.PathFile
+StreamFile: TypeAlias = builtin.StreamFile
 
 
 # ---- Built-in Input Widgets ----
@@ -640,3 +672,21 @@ class LimitSource(Enum):
 
     # Based on IP
     IP = auto()
+
+    # All the clients of the function (or the app) together
+    FUNCTION = auto()
+
+
+LimitAlgorithm = Literal["sliding_log", "sliding_window", "token_bucket", "concurrency"]
+"""
+The algorithm of a `Limiter`.
+
+Types:
+    sliding_log: Keeps the time of every call in the last period, exact, the state grows with `max_calls`.
+    sliding_window: Counts the calls of this and the last window (period), and weights the last one by the part of
+                    it still in the sliding period, approximate, constant state.
+    token_bucket: A bucket of `max_calls` tokens refilled over the period, each call takes its cost (one by default), allows bursts of
+                  `max_calls`, constant state.
+    concurrency: At most `max_calls` calls in flight, the calls are counted until they finish, or for `period`
+                 without any call starting or finishing if their worker dies.
+"""
@@ -2,6 +2,9 @@
 Experimental, AST Global preprocessing, looking to transform specific global variables into funix sessions
 
 Limited application cases/not fully considered
+
+The module level values become the defaults, copied for each browser, or shared copy-on-write with
+`GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES` (`funix -t -c`), see `funix.session`.
 """
 
 from _ast import Assign, Call, Constant, Expr, Global, Load, Module, Name
@@ -1,11 +1,30 @@
 """
 Control the global variables.
+
+The variables of a browser are loaded from the session store (see `set_session_store`) the first time a request uses
+them, and saved back when the request ends.
+
+A browser gets a deep copy of the default of a variable the first time it reads it, or, for the defaults set with
+`shared=True` (or all of them with `GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES`), a copy-on-write view of it,
+see `funix.session.shared`. Immutable defaults are never copied.
 """
 
 from copy import deepcopy
+from threading import Lock
+from traceback import print_exc
 from typing import Any
 
-from flask import session
+from flask import Flask, g, session
+
+from funix.config.switch import GlobalSwitchOption
+from funix.session.shared import SharedValue, is_immutable, share, unshare
+from funix.util.scheduler import call_later
+from funix.util.session_store import (
+    MemoryStore,
+    SessionStore,
+    Variables,
+    parse_session_store,
+)
 
 UserID = str
 """
@@ -22,11 +41,16 @@ VariableValue = Any
 Global variable value.
 """
 
-__funix_global_variables: dict[UserID, dict[VariableName, VariableValue]] = {}
+__session_store: SessionStore = MemoryStore()
 """
 Funix global variables.
 
-Record the global variables of each user.
+Where the global variables of each user are kept, see `set_session_store`.
+"""
+
+__session_store_lock = Lock()
+"""
+Lock for loading the variables of a request, the threads of a batch call share them.
 """
 
 __funix_default_global_variables: dict[VariableName, VariableValue] = {}
@@ -36,6 +60,113 @@ Funix default global variables.
 Record the default global variables.
 """
 
+__funix_shared_global_variables: dict[VariableName, bool | None] = {}
+"""
+Whether each default global variable is shared copy-on-write, None for
+`GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES`.
+"""
+
+
+def set_session_store(store: SessionStore | str) -> None:
+    """
+    Set where the global variables of each user are kept. With a shared store, the workers and replicas serve the
+    same variables to a browser.
+
+    Parameters:
+        store (SessionStore | str): The store, or its URL, see `funix.util.session_store.parse_session_store`.
+
+    Raises:
+        ValueError: If the URL is not supported.
+    """
+    global __session_store
+    if isinstance(store, str):
+        store = parse_session_store(store)
+    __session_store = store
+    sweep_session_store(store)
+
+
+def get_session_store() -> SessionStore:
+    """
+    Get where the global variables of each user are kept.
+
+    Returns:
+        SessionStore: The store.
+    """
+    return __session_store
+
+
+def sweep_session_store(store: SessionStore) -> None:
+    """
+    Delete the expired variables from the store, and check again when the next ones may expire.
+
+    Parameters:
+        store (SessionStore): The store.
+    """
+    if GlobalSwitchOption.SESSION_EXPIRE_TIME == -1 or store is not __session_store:
+        return
+    store.sweep()
+    call_later(GlobalSwitchOption.SESSION_EXPIRE_TIME, sweep_session_store, store)
+
+
+def __get_loaded() -> (
+    tuple[UserID, Variables, set[VariableName], dict[VariableName, SharedValue]]
+):
+    """
+    Get the variables of the user of this request, loaded from the store once per request.
+
+    Returns:
+        tuple[UserID, Variables, set[VariableName], dict[VariableName, SharedValue]]: The user id, the variables, the
+            names of the variables the request may change, and the views of the shared defaults it read.
+
+    Raises:
+        RuntimeError: If the user id is not found in session.
+    """
+    user_id = session.get("__funix_id")
+    if not user_id:
+        raise RuntimeError("User ID not found in session.")
+    loaded = g.get("funix_session_variables")
+    if loaded is not None and loaded[0] == user_id:
+        return loaded
+    with __session_store_lock:
+        loaded = g.get("funix_session_variables")
+        if loaded is None or loaded[0] != user_id:
+            loaded = (user_id, __session_store.load(user_id) or {}, set(), {})
+            g.funix_session_variables = loaded
+    return loaded
+
+
+def save_session_variables(_: BaseException | None = None) -> None:
+    """
+    Save the variables changed by this request back to the store, when the request ends.
+    """
+    loaded = g.pop("funix_session_variables", None)
+    if loaded is None:
+        return
+    user_id, variables, changed, viewed = loaded
+    # The shared defaults copied by a change are in the variables now
+    changed.update(name for name in viewed if name in variables)
+    try:
+        if changed:
+            __session_store.save(user_id, variables, changed)
+        elif variables:
+            __session_store.touch(user_id)
+    except:
+        # e.g. unpicklable variables in a shared store, the request is already done
+        print_exc()
+
+
+def enable_session_store(app: Flask) -> None:
+    """
+    Save the variables of the requests of the app back to the store.
+
+    Parameters:
+        app (Flask): The app.
+    """
+    from funix.decorator.metrics import register_metrics_provider
+
+    app.teardown_request(save_session_variables)
+    register_metrics_provider("sessions", lambda: __session_store.stats())
+
 
 def set_global_variable(name: str, value: Any) -> None:
     """
@@ -48,25 +179,44 @@ def set_global_variable(name: str, value: Any) -> None:
     Raises:
         RuntimeError: If the user id is not found in session.
     """
-    global __funix_global_variables
-    user_id = session.get("__funix_id")
-    if not user_id:
-        raise RuntimeError("User ID not found in session.")
-    if user_id not in __funix_global_variables:
-        __funix_global_variables[user_id] = {}
-    __funix_global_variables[user_id][name] = value
+    _, user_variables, changed, _ = __get_loaded()
+    user_variables[name] = value
+    changed.add(name)
 
 
-def set_default_global_variable(name: str, value: Any) -> None:
+def set_default_global_variable(
+    name: str, value: Any, shared: bool | None = None
+) -> None:
     """
     Set the default global variable.
 
     Parameters:
         name (str): The global variable name.
         value (Any): The global variable value.
+        shared (bool | None): Whether the browsers read a copy-on-write view of a list, dict or set default instead of
+                              a deep copy, see `funix.session.shared`. The views are not instances of `list`, `dict`
+                              or `set`. None for `GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES`, read when the
+                              variable is read.
     """
     global __funix_default_global_variables
     __funix_default_global_variables[name] = value
+    __funix_shared_global_variables[name] = shared
+
+
+def is_shared_global_variable(name: str) -> bool:
+    """
+    Check if the default global variable is shared copy-on-write.
+
+    Parameters:
+        name (str): The global variable name.
+
+    Returns:
+        bool: Whether the browsers read a view of the default.
+    """
+    shared = __funix_shared_global_variables.get(name)
+    if shared is None:
+        return GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES
+    return shared
 
 
 def get_global_variable(name: str) -> Any:
@@ -82,14 +232,44 @@ def get_global_variable(name: str) -> Any:
     Raises:
         RuntimeError: If the user id is not found in session.
     """
-    global __funix_global_variables, __funix_default_global_variables
-    user_id = session.get("__funix_id")
-    if not user_id:
-        raise RuntimeError("User ID not found in session.")
-    if user_id not in __funix_global_variables:
-        __funix_global_variables[user_id] = {}
-    if name not in __funix_global_variables[user_id]:
-        __funix_global_variables[user_id][name] = deepcopy(
-            __funix_default_global_variables.get(name, None)
-        )
-    return __funix_global_variables[user_id].get(name, None)
+    global __funix_default_global_variables
+    _, user_variables, changed, viewed = __get_loaded()
+    if name in user_variables:
+        value = user_variables[name]
+    else:
+        default = __funix_default_global_variables.get(name, None)
+        if is_immutable(default):
+            # No change to it can be seen by another browser, and nothing to keep per browser
+            return default
+        if name in viewed:
+            # The same view, a change through another one would not be seen
+            return viewed[name]
+        if is_shared_global_variable(name):
+            # Copied on the first change, the default is shared until then
+            value = share(default, user_variables, name)
+            if isinstance(value, SharedValue):
+                viewed[name] = value
+                return value
+        else:
+            # `setdefault` keeps the first copy if another request of the same user is racing
+            value = user_variables.setdefault(name, deepcopy(default))
+    if not is_immutable(value):
+        # It may be changed in place, saved at the end of the request
+        changed.add(name)
+    return value
+
+
+def unshare_result(result: Any) -> Any:
+    """
+    Replace the views of the default global variables in the result of a function, for encoding it.
+
+    Parameters:
+        result (Any): The result.
+
+    Returns:
+        Any: The result without views, as it is if the request read no shared defaults.
+    """
+    loaded = g.get("funix_session_variables")
+    if loaded is None or not loaded[3]:
+        return result
+    return unshare(result, 2)
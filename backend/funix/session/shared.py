@@ -0,0 +1,479 @@
+"""
+Copy-on-write views of the default global variables, for the defaults set with `shared=True`.
+
+A browser reading a shared default list, dict or set gets a view of the default object, shared by all the browsers,
+instead of a deep copy of it. The first change through the view (or through a view of a list, dict or set inside it)
+deep copies the default into the variables of the browser, and the view and later reads use the copy. Reading any
+other mutable value inside the default, e.g. a numpy array or an object, deep copies it too, they cannot be watched.
+
+The views behave like the objects in most code, `len`, indexing, iteration, comparison, `random.choice`, etc., but
+they are not instances of `list`, `dict` or `set`, and `json` or C extensions do not take them, use `list(view)` or
+`copy.deepcopy(view)` to get one. Funix unwraps them in the results of the functions.
+"""
+
+from copy import deepcopy
+from threading import Lock
+from typing import Any, Callable, Iterator
+
+SHAREABLE_TYPES = (list, dict, set)
+"""
+The types of the default values shared through views, the values of other mutable types are still deep copied.
+"""
+
+IMMUTABLE_TYPES = (type(None), bool, int, float, complex, str, bytes, range)
+"""
+The types of the default values shared as they are, and the tuples and frozensets of them.
+"""
+
+__thaw_lock = Lock()
+"""
+Lock for copying the default values, the threads of a batch call share the views.
+"""
+
+
+def is_immutable(value: Any) -> bool:
+    """
+    Check if a value can be shared as it is, no change to it can be seen by another browser.
+
+    Parameters:
+        value (Any): The value.
+
+    Returns:
+        bool: Whether the value is immutable.
+    """
+    if type(value) in IMMUTABLE_TYPES:
+        return True
+    if type(value) in (tuple, frozenset):
+        return all(is_immutable(item) for item in value)
+    return False
+
+
+class SharedValue:
+    """
+    A copy-on-write view of a default value, or of a value inside it.
+    """
+
+    __slots__ = ("_root", "_path", "_target", "_variables", "_name")
+
+    def __init__(
+        self,
+        target: Any,
+        variables: dict | None = None,
+        name: str | None = None,
+        root: "SharedValue | None" = None,
+        path: tuple = (),
+    ):
+        """
+        Initialize the SharedValue.
+
+        Parameters:
+            target (Any): The default value, only for the root view.
+            variables (dict | None): The variables of the browser, the copy is saved there, only for the root view.
+            name (str | None): The name of the variable, only for the root view.
+            root (SharedValue | None): The root view, None for the root view itself.
+            path (tuple): The keys of the value in the root value.
+        """
+        self._root = self if root is None else root
+        self._path = path
+        self._target = target
+        """The default value, or the copy of the browser once changed (root view only)."""
+        self._variables = variables
+        """The variables of the browser, None once the default is copied (root view only)."""
+        self._name = name
+
+    @property
+    def shared(self) -> bool:
+        """
+        Whether the view still reads the shared default value.
+        """
+        return self._root._variables is not None
+
+    def _get(self) -> Any:
+        """
+        Get the value of the view, the default value or the copy of the browser.
+
+        Returns:
+            Any: The value.
+        """
+        value = self._root._target
+        for key in self._path:
+            value = value[key]
+        return value
+
+    def _thaw(self) -> Any:
+        """
+        Copy the default value for the browser if it is not yet, before a change.
+
+        Returns:
+            Any: The value of the view in the copy.
+        """
+        root = self._root
+        if root._variables is not None:
+            with get_thaw_lock():
+                if root._variables is not None:
+                    copied = deepcopy(root._target)
+                    # Another view of the browser may have copied it already, or it is set to something else
+                    if root._name not in root._variables:
+                        root._variables[root._name] = copied
+                    root._target = copied
+                    root._variables = None
+        return self._get()
+
+    def _wrap(self, key: Any) -> Any:
+        """
+        Read a value from the view, the lists, dicts and sets inside a shared default are views too, the other
+        mutable values are read from a copy of the default.
+
+        Parameters:
+            key (Any): The key of the value in the value of the view.
+
+        Returns:
+            Any: The value or its view.
+
+        Raises:
+            KeyError | IndexError: If the key is not found.
+        """
+        value = self._get()[key]
+        if not self.shared or is_immutable(value):
+            return value
+        if type(value) in SHAREABLE_TYPES:
+            return SHARED_TYPES[type(value)](
+                None, root=self._root, path=self._path + (key,)
+            )
+        # e.g. an array or an object, the changes to it cannot be seen
+        return self._thaw()[key]
+
+    def _unwrap_items(self) -> Any:
+        """
+        Get the value of the view to iterate its keys or set items, from a copy of the default if any of them is
+        mutable, e.g. an object hashed by its id.
+
+        Returns:
+            Any: The value.
+        """
+        value = self._get()
+        if self.shared and not all(is_immutable(item) for item in value):
+            return self._thaw()
+        return value
+
+    def _copy(self, value: Any) -> Any:
+        """
+        Copy a value made from the shared default, e.g. a slice, so its items are not shared.
+
+        Parameters:
+            value (Any): The value.
+
+        Returns:
+            Any: The copy, or the value if the default is already copied.
+        """
+        return deepcopy(value) if self.shared else value
+
+    def __copy__(self) -> Any:
+        return self.copy()
+
+    def __deepcopy__(self, memo: dict) -> Any:
+        return deepcopy(self._get(), memo)
+
+    def __reduce__(self) -> tuple:
+        # Pickled as the value, e.g. in a shared session store
+        value = self._get()
+        return type(value), (value,)
+
+    def __len__(self) -> int:
+        return len(self._get())
+
+    def __contains__(self, item: Any) -> bool:
+        return unshare(item) in self._get()
+
+    def __bool__(self) -> bool:
+        return bool(self._get())
+
+    def __eq__(self, other: Any) -> bool:
+        return self._get() == unshare(other)
+
+    def __ne__(self, other: Any) -> bool:
+        return self._get() != unshare(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(self._get())
+
+    def __str__(self) -> str:
+        return str(self._get())
+
+    def __format__(self, format_spec: str) -> str:
+        return format(self._get(), format_spec)
+
+    def copy(self) -> Any:
+        return deepcopy(self._get()) if self.shared else self._get().copy()
+
+
+def get_thaw_lock() -> Lock:
+    """
+    Get the lock for copying the default values.
+
+    Returns:
+        Lock: The lock.
+    """
+    return __thaw_lock
+
+
+def _read(name: str) -> Callable:
+    """
+    Make a method reading the value of the view.
+
+    Parameters:
+        name (str): The name of the method of the value.
+
+    Returns:
+        Callable: The method.
+    """
+
+    def method(self: SharedValue, *args: Any, **kwargs: Any) -> Any:
+        return getattr(self._get(), name)(*map(unshare, args), **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+def _write(name: str, in_place: bool = False) -> Callable:
+    """
+    Make a method changing the value of the view, it copies the default first.
+
+    Parameters:
+        name (str): The name of the method of the value.
+        in_place (bool): Whether it is an in-place operator, returning the view.
+
+    Returns:
+        Callable: The method.
+    """
+
+    def method(self: SharedValue, *args: Any, **kwargs: Any) -> Any:
+        # The values from other views are copied, or the copy would share their items
+        args = tuple(
+            deepcopy(arg) if isinstance(arg, SharedValue) else arg for arg in args
+        )
+        result = getattr(self._thaw(), name)(*args, **kwargs)
+        return self if in_place else result
+
+    method.__name__ = name
+    return method
+
+
+def _make_new(name: str) -> Callable:
+    """
+    Make a method returning a new value made from the value of the view, e.g. `+`, copied if it shares the items.
+
+    Parameters:
+        name (str): The name of the method of the value.
+
+    Returns:
+        Callable: The method.
+    """
+
+    def method(self: SharedValue, *args: Any) -> Any:
+        return self._copy(getattr(self._get(), name)(*map(unshare, args)))
+
+    method.__name__ = name
+    return method
+
+
+class SharedList(SharedValue):
+    """
+    A copy-on-write view of a list.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, index: int | slice) -> Any:
+        if isinstance(index, slice):
+            return self._copy(self._get()[index])
+        # The key is the index as it is, negative or not
+        return self._wrap(index)
+
+    def __iter__(self) -> Iterator:
+        if not self.shared:
+            return iter(self._get())
+        # Read again for each item, the default may be copied in between
+        return (self._wrap(index) for index in range(len(self._get())))
+
+    def __reversed__(self) -> Iterator:
+        if not self.shared:
+            return reversed(self._get())
+        return (self._wrap(index) for index in range(len(self._get()) - 1, -1, -1))
+
+    __setitem__ = _write("__setitem__")
+    __delitem__ = _write("__delitem__")
+    __iadd__ = _write("__iadd__", True)
+    __imul__ = _write("__imul__", True)
+    append = _write("append")
+    extend = _write("extend")
+    insert = _write("insert")
+    remove = _write("remove")
+    pop = _write("pop")
+    clear = _write("clear")
+    sort = _write("sort")
+    reverse = _write("reverse")
+
+    index = _read("index")
+    count = _read("count")
+    __lt__ = _read("__lt__")
+    __le__ = _read("__le__")
+    __gt__ = _read("__gt__")
+    __ge__ = _read("__ge__")
+
+    __add__ = _make_new("__add__")
+    __mul__ = _make_new("__mul__")
+    __rmul__ = _make_new("__rmul__")
+
+    def __radd__(self, other: Any) -> Any:
+        return unshare(other) + self._copy(list(self._get()))
+
+
+class SharedDict(SharedValue):
+    """
+    A copy-on-write view of a dict.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._wrap(key)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self._wrap(key) if key in self._get() else default
+
+    def __iter__(self) -> Iterator:
+        return iter(self._unwrap_items())
+
+    def __reversed__(self) -> Iterator:
+        return reversed(self._unwrap_items())
+
+    def keys(self) -> Any:
+        return self._unwrap_items().keys()
+
+    def values(self) -> Any:
+        if not self.shared:
+            return self._get().values()
+        return [self._wrap(key) for key in list(self._unwrap_items())]
+
+    def items(self) -> Any:
+        if not self.shared:
+            return self._get().items()
+        return [(key, self._wrap(key)) for key in list(self._unwrap_items())]
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if key in self._get():
+            return self._wrap(key)
+        return self._thaw().setdefault(key, default)
+
+    __setitem__ = _write("__setitem__")
+    __delitem__ = _write("__delitem__")
+    __ior__ = _write("__ior__", True)
+    pop = _write("pop")
+    popitem = _write("popitem")
+    clear = _write("clear")
+    update = _write("update")
+
+    __or__ = _make_new("__or__")
+    __ror__ = _make_new("__ror__")
+
+
+class SharedSet(SharedValue):
+    """
+    A copy-on-write view of a set, the items of a set are hashable, they are not views.
+    """
+
+    __slots__ = ()
+
+    def __iter__(self) -> Iterator:
+        return iter(self._unwrap_items())
+
+    __ior__ = _write("__ior__", True)
+    __iand__ = _write("__iand__", True)
+    __isub__ = _write("__isub__", True)
+    __ixor__ = _write("__ixor__", True)
+    add = _write("add")
+    discard = _write("discard")
+    remove = _write("remove")
+    pop = _write("pop")
+    clear = _write("clear")
+    update = _write("update")
+    intersection_update = _write("intersection_update")
+    difference_update = _write("difference_update")
+    symmetric_difference_update = _write("symmetric_difference_update")
+
+    issubset = _read("issubset")
+    issuperset = _read("issuperset")
+    isdisjoint = _read("isdisjoint")
+    union = _make_new("union")
+    intersection = _make_new("intersection")
+    difference = _make_new("difference")
+    symmetric_difference = _make_new("symmetric_difference")
+    __or__ = _make_new("__or__")
+    __and__ = _make_new("__and__")
+    __sub__ = _make_new("__sub__")
+    __xor__ = _make_new("__xor__")
+    __lt__ = _read("__lt__")
+    __le__ = _read("__le__")
+    __gt__ = _read("__gt__")
+    __ge__ = _read("__ge__")
+
+
+SHARED_TYPES: dict[type, type[SharedValue]] = {
+    list: SharedList,
+    dict: SharedDict,
+    set: SharedSet,
+}
+"""
+The views of the shareable types.
+"""
+
+
+def share(value: Any, variables: dict, name: str) -> Any:
+    """
+    Get the value of a default global variable for a browser that has not set it.
+
+    Parameters:
+        value (Any): The default value.
+        variables (dict): The variables of the browser.
+        name (str): The name of the variable.
+
+    Returns:
+        Any: A view of the default value, or the value itself if it is immutable, or a deep copy of it saved in the
+             variables for the other types.
+    """
+    if is_immutable(value):
+        return value
+    if type(value) in SHARED_TYPES:
+        return SHARED_TYPES[type(value)](value, variables, name)
+    # `setdefault` keeps the first copy if another request of the same user is racing
+    return variables.setdefault(name, deepcopy(value))
+
+
+def unshare(value: Any, depth: int = 0) -> Any:
+    """
+    Get the value of a view, for the code that needs the real object, e.g. JSON encoding. The value must not be
+    changed, it may be the shared default value.
+
+    Parameters:
+        value (Any): The value, or a view.
+        depth (int): How deep the tuples, lists and dicts are searched for views.
+
+    Returns:
+        Any: The value, with the views replaced.
+    """
+    if isinstance(value, SharedValue):
+        return value._get()
+    if depth > 0:
+        # Rebuilt only if there are views inside
+        if type(value) in (tuple, list):
+            items = [unshare(item, depth - 1) for item in value]
+            if any(new is not old for new, old in zip(items, value)):
+                return type(value)(items)
+        elif type(value) is dict:
+            items = {key: unshare(item, depth - 1) for key, item in value.items()}
+            if any(items[key] is not item for key, item in value.items()):
+                return items
+    return value
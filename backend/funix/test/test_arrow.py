@@ -0,0 +1,125 @@
+"""
+Test the funix.util.arrow module, the Arrow IPC transport for DataFrames.
+"""
+
+from base64 import b64decode, b64encode
+from unittest import TestCase, main, skipUnless
+
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+
+from funix import funix
+from funix.app import app
+from funix.decorator import enable_wrapper
+from funix.util.arrow import ARROW_KEY, ARROW_MIME, is_arrow_enabled
+
+try:
+    import pandera
+
+    pandera_use = True
+except ImportError:
+    pandera_use = False
+
+enable_wrapper()
+
+
+@funix()
+def arrow_result(scale: int = 2) -> DataFrame:
+    return DataFrame({"a": [1 * scale, 2 * scale, 3 * scale], "b": [0.5, 1.5, 2.5]})
+
+
+@funix()
+def arrow_table(
+    df: DataFrame = DataFrame({"a": [1, 2, 3], "b": [0.5, 1.5, 2.5]}),
+    scale: int = 2,
+) -> DataFrame:
+    return DataFrame({"a": df["a"] * scale, "b": df["b"] * scale})
+
+
+@funix()
+def arrow_table_types(
+    df: DataFrame = DataFrame({"a": [1, 2, 3], "b": [0.5, 1.5, 2.5]}),
+) -> list:
+    return [str(df["a"].dtype), str(df["b"].dtype)]
+
+
+def to_arrow(dataframe: DataFrame) -> dict:
+    import pyarrow
+
+    table = pyarrow.Table.from_pandas(dataframe, preserve_index=False)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return {ARROW_KEY: b64encode(sink.getvalue().to_pybytes()).decode()}
+
+
+def from_arrow(value: dict) -> DataFrame:
+    import pyarrow
+
+    with pyarrow.ipc.open_stream(b64decode(value[ARROW_KEY])) as reader:
+        return reader.read_all().to_pandas()
+
+
+class TestArrow(TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.expected = DataFrame({"a": [2, 4, 6], "b": [0.5, 1.5, 2.5]})
+
+    def test_json(self):
+        response = self.client.post("/call/arrow_result", json={"scale": 2})
+        self.assertEqual(response.json, [self.expected.to_dict(orient="records")])
+
+    def test_json_with_wildcard_accept(self):
+        response = self.client.post(
+            "/call/arrow_result", json={"scale": 2}, headers={"Accept": "*/*"}
+        )
+        self.assertEqual(response.json, [self.expected.to_dict(orient="records")])
+
+    @skipUnless(is_arrow_enabled(), "pyarrow is not installed")
+    def test_arrow_result(self):
+        response = self.client.post(
+            "/call/arrow_result",
+            json={"scale": 2},
+            headers={"Accept": f"{ARROW_MIME}, application/json"},
+        )
+        self.assertIn("Accept", response.headers["Vary"])
+        assert_frame_equal(from_arrow(response.json[0]), self.expected)
+
+    @skipUnless(is_arrow_enabled(), "pyarrow is not installed")
+    @skipUnless(pandera_use, "DataFrame arguments need pandera")
+    def test_arrow_arguments(self):
+        body = {
+            ARROW_KEY: to_arrow(DataFrame({"a": [1, 2, 3], "b": [0.5, 1.5, 2.5]}))[
+                ARROW_KEY
+            ],
+            "scale": 2,
+        }
+        response = self.client.post("/call/arrow_table", json=body)
+        self.assertEqual(
+            response.json,
+            [[{"a": a, "b": b} for a, b in ((2, 1.0), (4, 3.0), (6, 5.0))]],
+        )
+
+    @skipUnless(is_arrow_enabled(), "pyarrow is not installed")
+    @skipUnless(pandera_use, "DataFrame arguments need pandera")
+    def test_inferred_float_arguments(self):
+        # Arrow JS infers Float64 for every number column of the sheet
+        body = to_arrow(DataFrame({"a": [1.0, 2.0, 3.0], "b": [0.5, 1.5, 2.5]}))
+        response = self.client.post("/call/arrow_table_types", json=body)
+        self.assertEqual(response.json, [["int64", "float64"]])
+        body = to_arrow(DataFrame({"a": [1.5, 2.0, 3.0], "b": [0.5, 1.5, 2.5]}))
+        response = self.client.post("/call/arrow_table_types", json=body)
+        self.assertEqual(response.json, [["float64", "float64"]])
+
+    @skipUnless(pandera_use, "DataFrame arguments need pandera")
+    def test_json_arguments(self):
+        body = {"a": [1, 2, 3], "b": [0.5, 1.5, 2.5], "scale": 2}
+        response = self.client.post("/call/arrow_table", json=body)
+        self.assertEqual(
+            response.json,
+            [[{"a": a, "b": b} for a, b in ((2, 1.0), (4, 3.0), (6, 5.0))]],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Test the cells (`treat_as="cell"`) of funix.decorator.call, row by row, vectorized and batched.
+"""
+
+from unittest import TestCase, main
+
+from numpy import ndarray
+
+from funix import funix
+from funix.app import app
+from funix.decorator import enable_wrapper
+
+enable_wrapper()
+
+
+@funix(treat_as={("a", "b"): "cell"})
+def cell_add(a: int, b: int, negative: bool) -> int:
+    return -(a + b) if negative else a + b
+
+
+@funix(treat_as={("a", "b"): "cell"}, vectorized=True)
+def cell_add_vectorized(a: int, b: int, negative: bool) -> int:
+    assert isinstance(a, list)
+    return [-(x + y) if negative else x + y for x, y in zip(a, b)]
+
+
+@funix(treat_as={("a", "b"): "cell"}, vectorized="numpy", batch_size=7)
+def cell_add_numpy(a: int, b: int, negative: bool) -> int:
+    assert isinstance(a, ndarray)
+    return -(a + b) if negative else a + b
+
+
+@funix(treat_as={("a", "b"): "cell"}, batch_size=3)
+def cell_add_batched(a: int, b: int, negative: bool) -> int:
+    return -(a + b) if negative else a + b
+
+
+@funix(treat_as={"a": "cell"}, vectorized=True)
+def cell_wrong_length(a: int) -> int:
+    return a[:-1]
+
+
+class TestCell(TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.rows = 20
+        self.body = {
+            "a": list(range(self.rows)),
+            "b": list(range(0, 2 * self.rows, 2)),
+            "negative": True,
+        }
+        self.expected = [str(-3 * i) for i in range(self.rows)]
+
+    def call(self, path: str, body: dict):
+        return self.client.post(f"/call/{path}", json=body).json
+
+    def test_row_by_row(self):
+        self.assertEqual(
+            self.call("cell_add", self.body), [{"result": self.expected}]
+        )
+
+    def test_vectorized(self):
+        self.assertEqual(
+            self.call("cell_add_vectorized", self.body), [{"result": self.expected}]
+        )
+
+    def test_vectorized_numpy_batched(self):
+        self.assertEqual(
+            self.call("cell_add_numpy", self.body), [{"result": self.expected}]
+        )
+
+    def test_batched(self):
+        self.assertEqual(
+            self.call("cell_add_batched", self.body), [{"result": self.expected}]
+        )
+
+    def test_empty(self):
+        body = {"a": [], "b": [], "negative": False}
+        self.assertEqual(self.call("cell_add_batched", body), [{"result": []}])
+
+    def test_wrong_length(self):
+        result = self.call("cell_wrong_length", {"a": [1, 2, 3]})[0]["result"]
+        self.assertEqual(result[0]["error_type"], "wrapper")
+
+    def test_no_cell(self):
+        with self.assertRaises(ValueError):
+
+            @funix(vectorized=True)
+            def no_cell(a: int) -> int:
+                return a
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Test the funix.decorator.executor module.
+"""
+
+from contextvars import ContextVar
+from threading import Event, Thread
+from time import sleep
+from unittest import TestCase, main
+
+from funix.decorator.executor import CallExecutor
+
+request_name: ContextVar[str] = ContextVar("request_name")
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+class TestCallExecutor(TestCase):
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            CallExecutor("test", concurrency=0)
+        with self.assertRaises(ValueError):
+            CallExecutor("test", executor="fiber")
+        with self.assertRaises(ValueError):
+            CallExecutor("test", max_queue=-1)
+
+    def test_run_thread(self):
+        executor = CallExecutor("test", concurrency=2)
+        self.assertEqual(executor.run(square, {"x": 3}), 9)
+
+    def test_run_thread_context(self):
+        executor = CallExecutor("test", concurrency=2)
+        request_name.set("funix")
+        self.assertEqual(executor.run(lambda: request_name.get(""), {}), "funix")
+
+    def test_run_process(self):
+        executor = CallExecutor("test", concurrency=1, executor="process")
+        self.assertEqual(executor.run(square, {"x": 4}), 16)
+
+    def test_queue_full(self):
+        executor = CallExecutor("test", concurrency=1, max_queue=0)
+        self.assertTrue(executor.acquire())
+        self.assertFalse(executor.acquire())
+        self.assertEqual(executor.stats()["rejected"], 1)
+        executor.release()
+        self.assertTrue(executor.acquire())
+        executor.release()
+
+    def test_busy_response(self):
+        executor = CallExecutor("test", concurrency=1, max_queue=0)
+        response = executor.busy_response()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(response.json["error_type"], "safe_checker")
+
+    def test_fifo_and_positions(self):
+        executor = CallExecutor("test", concurrency=1)
+        self.assertTrue(executor.acquire())
+
+        order = []
+        positions = {}
+
+        def waiter(index: int, queued: Event):
+            def on_wait(position: int):
+                positions.setdefault(index, []).append(position)
+                queued.set()
+
+            executor.acquire(on_wait)
+            order.append(index)
+            executor.release()
+
+        threads = []
+        for i in range(3):
+            queued = Event()
+            thread = Thread(target=waiter, args=(i, queued))
+            thread.start()
+            queued.wait(5)
+            threads.append(thread)
+
+        stats = executor.stats()
+        self.assertEqual(stats["running"], 1)
+        self.assertEqual(stats["queued"], 3)
+
+        executor.release()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(order, [0, 1, 2])
+        self.assertEqual(positions[0], [1])
+        self.assertEqual(positions[2][0], 3)
+        self.assertEqual(executor.stats()["completed"], 4)
+
+    def test_concurrency_limit(self):
+        executor = CallExecutor("test", concurrency=2)
+        running = []
+        peak = []
+
+        def worker():
+            executor.acquire()
+            try:
+                running.append(1)
+                peak.append(len(running))
+                sleep(0.01)
+                running.pop()
+            finally:
+                executor.release(0.01)
+
+        threads = [Thread(target=worker) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(peak), 2)
+        self.assertEqual(executor.stats()["completed"], 10)
+
+
+if __name__ == "__main__":
+    main()
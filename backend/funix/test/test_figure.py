@@ -0,0 +1,96 @@
+"""
+Test the funix.decorator.figure module, the static images of matplotlib figures.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, main
+
+from matplotlib.figure import Figure
+
+from funix import funix
+from funix.app import app
+from funix.decorator import enable_wrapper
+from funix.config.switch import GlobalSwitchOption
+from funix.decorator.figure import get_figure_key, get_render_stats, render_figure
+
+enable_wrapper()
+
+
+def make_figure(points: int) -> Figure:
+    figure = Figure()
+    axes = figure.subplots()
+    axes.plot(range(points), [i * i for i in range(points)], label="square")
+    axes.legend()
+    return figure
+
+
+@funix(matplotlib_format="png")
+def figure_png(points: int = 10) -> Figure:
+    return make_figure(points)
+
+
+@funix(matplotlib_format="svg")
+def figure_svg(points: int = 10) -> Figure:
+    return make_figure(points)
+
+
+class TestFigure(TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+
+    def call(self, function: str, points: int) -> str:
+        return self.client.post(f"/call/{function}", json={"points": points}).json[0]
+
+    def test_key(self):
+        self.assertEqual(
+            get_figure_key(make_figure(5), "png"), get_figure_key(make_figure(5), "png")
+        )
+        self.assertNotEqual(
+            get_figure_key(make_figure(5), "png"), get_figure_key(make_figure(6), "png")
+        )
+        self.assertNotEqual(
+            get_figure_key(make_figure(5), "png"), get_figure_key(make_figure(5), "svg")
+        )
+
+    def test_key_limit(self):
+        limit = GlobalSwitchOption.FIGURE_CACHE_KEY_LIMIT
+        try:
+            GlobalSwitchOption.FIGURE_CACHE_KEY_LIMIT = 1024
+            self.assertIsNone(get_figure_key(make_figure(5), "png"))
+            stats = get_render_stats()
+            image = render_figure(make_figure(5), "png")
+            self.assertTrue(image.startswith(b"\x89PNG"))
+            self.assertEqual(get_render_stats()["uncached"], stats["uncached"] + 1)
+            self.assertEqual(get_render_stats()["cached"], stats["cached"])
+        finally:
+            GlobalSwitchOption.FIGURE_CACHE_KEY_LIMIT = limit
+
+    def test_parallel(self):
+        with ThreadPoolExecutor(8) as pool:
+            images = list(
+                pool.map(
+                    lambda i: render_figure(make_figure(20 + i % 4), "png"), range(16)
+                )
+            )
+        for i, image in enumerate(images):
+            self.assertEqual(image, images[i % 4])
+
+    def test_png(self):
+        uri = self.call("figure_png", 7)
+        self.assertTrue(uri.startswith("/file/"))
+        response = self.client.get(uri)
+        self.assertEqual(response.mimetype, "image/png")
+        response.close()
+        renders = get_render_stats()["renders"]
+        self.assertEqual(self.call("figure_png", 7), uri)
+        self.assertEqual(get_render_stats()["renders"], renders)
+
+    def test_svg(self):
+        response = self.client.get(self.call("figure_svg", 7))
+        self.assertEqual(response.mimetype, "image/svg+xml")
+        self.assertIn("sandbox", response.headers["Content-Security-Policy"])
+        response.close()
+
+
+if __name__ == "__main__":
+    main()
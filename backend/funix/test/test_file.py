@@ -0,0 +1,175 @@
+"""
+Test the funix.decorator.file module, the `/file/<fid>` service.
+"""
+
+from os.path import exists, join
+from tempfile import TemporaryDirectory
+from time import sleep
+from unittest import TestCase, main
+from wsgiref.util import FileWrapper
+
+from numpy import arange, uint16
+
+from funix.app import app
+from funix.config.switch import GlobalSwitchOption
+from funix.decorator import enable_wrapper
+from funix.decorator.file import get_file_info, get_files_stats, get_static_uri
+from funix.util.storage import to_buffer
+
+enable_wrapper()
+
+
+class TestFile(TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.expire_time = GlobalSwitchOption.FILE_LINK_EXPIRE_TIME
+        self.bigger_data = GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP
+        self.memory_limit = GlobalSwitchOption.FILE_MEMORY_LIMIT
+
+    def tearDown(self):
+        GlobalSwitchOption.FILE_LINK_EXPIRE_TIME = self.expire_time
+        GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP = self.bigger_data
+        GlobalSwitchOption.FILE_MEMORY_LIMIT = self.memory_limit
+
+    def test_same_bytes(self):
+        first = get_static_uri(b"funix same bytes")
+        self.assertEqual(get_static_uri(b"funix same bytes"), first)
+        self.assertNotEqual(get_static_uri(b"funix other bytes"), first)
+        self.assertEqual(self.client.get(first).data, b"funix same bytes")
+
+    def test_list(self):
+        uris = get_static_uri([b"funix list 1", b"funix list 2", b"funix list 1"])
+        self.assertEqual(uris[0], uris[2])
+        self.assertNotEqual(uris[0], uris[1])
+
+    def test_path(self):
+        with TemporaryDirectory() as directory:
+            path = join(directory, "funix.txt")
+            with open(path, "w") as f:
+                f.write("funix path")
+            uri = get_static_uri(path)
+            self.assertTrue(uri.endswith(".txt"))
+            self.assertEqual(get_static_uri(path), uri)
+            response = self.client.get(uri)
+            self.assertEqual(response.data, b"funix path")
+            response.close()
+
+    def test_temp(self):
+        GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP = 16
+        data = b"funix temp " * 16
+        uri = get_static_uri(data)
+        self.assertEqual(get_static_uri(data), uri)
+        response = self.client.get(uri)
+        self.assertEqual(response.data, data)
+        response.close()
+
+    def test_expire(self):
+        GlobalSwitchOption.FILE_LINK_EXPIRE_TIME = 0.2
+        uri = get_static_uri(b"funix expire")
+        sleep(0.1)
+        # Registered again, the link lives on
+        self.assertEqual(get_static_uri(b"funix expire"), uri)
+        sleep(0.15)
+        self.assertEqual(self.client.get(uri).status_code, 200)
+        sleep(0.2)
+        self.assertEqual(self.client.get(uri).status_code, 404)
+        self.assertNotEqual(get_static_uri(b"funix expire"), uri)
+
+    def test_expire_temp(self):
+        GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP = 16
+        GlobalSwitchOption.FILE_LINK_EXPIRE_TIME = 0.1
+        uri = get_static_uri(b"funix expire temp " * 16)
+        path = get_file_info(uri[len("/file/") :])
+        self.assertTrue(exists(path))
+        sleep(0.3)
+        self.assertEqual(self.client.get(uri).status_code, 404)
+        self.assertFalse(exists(path))
+
+    def test_memory_limit(self):
+        GlobalSwitchOption.FILE_MEMORY_LIMIT = 2048
+        first = get_static_uri(b"1" * 1024)
+        second = get_static_uri(b"2" * 1024)
+        self.assertEqual(self.client.get(first).status_code, 200)
+        # The second file is the least recently served one
+        third = get_static_uri(b"3" * 1024)
+        stats = get_files_stats()
+        self.assertLessEqual(stats["resident_bytes"], 2048)
+        self.assertTrue(exists(get_file_info(second[len("/file/") :])))
+        self.assertFalse(exists(get_file_info(first[len("/file/") :])))
+        response = self.client.get(second)
+        self.assertEqual(response.data, b"2" * 1024)
+        response.close()
+        self.assertEqual(get_files_stats()["misses"], stats["misses"] + 1)
+        self.assertEqual(self.client.get(third).status_code, 200)
+
+    def test_range(self):
+        data = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 16
+        uri = get_static_uri(data)
+        response = self.client.get(uri)
+        self.assertEqual(response.mimetype, "image/png")
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        etag = response.headers["ETag"]
+        response.close()
+        response = self.client.get(uri, headers={"Range": "bytes=8-15"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, bytes(range(8)))
+        self.assertEqual(response.headers["Content-Range"], f"bytes 8-15/{len(data)}")
+        response.close()
+        response = self.client.get(uri, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        response.close()
+
+    def test_sniff(self):
+        GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP = 16
+        uri = get_static_uri(b"ID3" + b"\x00" * 64)
+        response = self.client.get(uri, headers={"Range": "bytes=0-2"})
+        self.assertEqual(response.mimetype, "audio/mpeg")
+        self.assertEqual(response.data, b"ID3")
+        response.close()
+
+    def test_range_file_wrapper(self):
+        GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP = 16
+        data = bytes(range(256))
+        uri = get_static_uri(data)
+        # A generic wrapper does not stop at `Content-Length`
+        response = self.client.get(
+            uri,
+            headers={"Range": "bytes=2-5"},
+            environ_base={"wsgi.file_wrapper": FileWrapper},
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, data[2:6])
+        response.close()
+
+    def test_buffer(self):
+        array = arange(4096, dtype=uint16)
+        uri = get_static_uri(array)
+        self.assertEqual(get_static_uri(memoryview(array.tobytes())), uri)
+        response = self.client.get(uri, headers={"Range": "bytes=2-5"})
+        self.assertEqual(response.data, array[1:3].tobytes())
+        response.close()
+        # Strided arrays are copied
+        self.assertEqual(get_static_uri(array[::2]), get_static_uri(array[::2].copy()))
+        self.assertRaises(ValueError, get_static_uri, 1)
+
+    def test_writable_buffer(self):
+        array = arange(16, dtype=uint16)
+        content = array.tobytes()
+        uri = get_static_uri(array)
+        # Changed after it is returned, the link still serves what was returned
+        array[0] = 100
+        self.assertEqual(self.client.get(uri).data, content)
+        data = bytearray(b"funix writable")
+        get_static_uri(data)
+        data.extend(b" buffer")
+        # Read-only buffers are kept without copying
+        data = b"funix read-only"
+        self.assertIs(to_buffer(memoryview(data)).obj, data)
+
+    def test_not_found(self):
+        self.assertEqual(self.client.get("/file/funix").status_code, 404)
+
+
+if __name__ == "__main__":
+    main()
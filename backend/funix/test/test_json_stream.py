@@ -0,0 +1,117 @@
+"""
+Test the funix.util.json_stream module.
+"""
+
+from json import dumps, loads
+from unittest import TestCase, main
+
+from pandas import DataFrame
+
+from funix import funix
+from funix.app import app
+from funix.config.switch import GlobalSwitchOption
+from funix.decorator import enable_wrapper
+from funix.util.json_stream import (
+    LOG_HEAD_SIZE,
+    DataFrameRecords,
+    iter_json,
+    json_response,
+    make_encoder,
+)
+
+enable_wrapper()
+
+encode = make_encoder()
+
+
+@funix()
+def big_dataframe(rows: int = 30000) -> DataFrame:
+    return DataFrame({"a": range(rows), "b": [f"row {i}" for i in range(rows)]})
+
+
+@funix()
+def big_list(rows: int = 30000) -> list:
+    return list(range(rows))
+
+
+class TestIterJson(TestCase):
+    def test_same_as_dumps(self):
+        values = [
+            1,
+            "funix",
+            None,
+            [],
+            {},
+            list(range(5000)),
+            [{"a": [1, 2]}, 3, (4, 5), {"b": {"c": None}}],
+            {"a": [1, {"b": [2, 3]}, "x"], 1.5: [{"c": 1}], None: [[]]},
+        ]
+        for value in values:
+            self.assertEqual(
+                "".join(iter_json(value, encode)), dumps(value, separators=(",", ":"))
+            )
+
+    def test_dataframe(self):
+        dataframe = DataFrame({"a": range(25), "b": [i / 3 for i in range(25)]})
+        expected = loads(dataframe.to_json(orient="records"))
+        for rows in (1, 7, 25, 100):
+            records = DataFrameRecords(dataframe, rows)
+            text = "".join(iter_json([records, {"c": [records]}], encode))
+            self.assertEqual(loads(text), [expected, {"c": [expected]}])
+        # A long list, encoded in slices
+        text = "".join(iter_json(list(range(2000)) + [records], encode))
+        self.assertEqual(loads(text), list(range(2000)) + [expected])
+
+    def test_empty_dataframe(self):
+        records = DataFrameRecords(DataFrame({"a": []}))
+        self.assertEqual("".join(iter_json(records, encode)), "[]")
+
+
+class TestJsonResponse(TestCase):
+    def test_small(self):
+        with app.app_context():
+            response = json_response({"result": [1, 2]})
+        self.assertFalse(response.is_streamed)
+        self.assertEqual(response.json, {"result": [1, 2]})
+
+    def test_streamed(self):
+        with app.app_context():
+            response = json_response(list(range(100000)))
+        self.assertTrue(response.is_streamed)
+        summary = response.funix_stream_summary
+        self.assertFalse(summary.complete)
+        data = response.get_data(as_text=True)
+        self.assertEqual(loads(data), list(range(100000)))
+        # For the logs, the response is not read before it is sent
+        self.assertEqual(
+            summary.to_dict(),
+            {
+                "streamed": True,
+                "size": len(data),
+                "head": data[:LOG_HEAD_SIZE],
+                "complete": True,
+            },
+        )
+
+    def test_call_dataframe(self):
+        page_size = GlobalSwitchOption.RESULT_PAGE_SIZE
+        # Sent at once, not kept on the server
+        GlobalSwitchOption.RESULT_PAGE_SIZE = -1
+        try:
+            response = app.test_client().post(
+                "/call/big_dataframe", json={"rows": 30000}
+            )
+        finally:
+            GlobalSwitchOption.RESULT_PAGE_SIZE = page_size
+        self.assertEqual(
+            response.json,
+            [[{"a": i, "b": f"row {i}"} for i in range(30000)]],
+        )
+
+    def test_call_list(self):
+        response = app.test_client().post("/call/big_list", json={"rows": 30000})
+        self.assertEqual(response.json, [list(range(30000))])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Test the funix.decorator.limit module, the rate limiters and their stores.
+"""
+
+from multiprocessing import get_context
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from time import sleep
+from unittest import TestCase, main, skipUnless
+from urllib.parse import urlsplit
+
+from flask import request, session
+
+from funix import funix
+from funix.app import app
+from funix.decorator import enable_wrapper
+from funix.decorator.limit import (
+    Limiter,
+    check_rate_limits,
+    get_limit_store,
+    set_limit_store,
+    set_rate_limiters,
+)
+from funix.hint import LimitSource
+from funix.util.limit_store import (
+    MemoryStore,
+    RedisStore,
+    SQLiteStore,
+    get_sqlite_path,
+    is_redis_enabled,
+    parse_limit_store,
+)
+
+try:
+    from fakeredis import TcpFakeServer
+
+    fakeredis_use = True
+except ImportError:
+    fakeredis_use = False
+
+enable_wrapper()
+
+
+@funix(rate_limit=Limiter.session(max_calls=2, period=60))
+def limited_call() -> str:
+    return "funix"
+
+
+@funix()
+def unlimited_call() -> str:
+    return "funix"
+
+
+concurrent_event = Event()
+
+
+@funix(rate_limit=Limiter.concurrent(2, source=LimitSource.FUNCTION))
+def concurrent_call() -> str:
+    concurrent_event.wait(10)
+    return "funix"
+
+
+def record_calls(url: str, calls: int) -> int:
+    limiter = Limiter(max_calls=25, period=60, store=parse_limit_store(url))
+    return sum(
+        limiter.store.update("worker", limiter._update, limiter.period) is None
+        for _ in range(calls)
+    )
+
+
+class StoreTests:
+    """
+    The tests shared by the stores, `store` is set by the subclasses.
+    """
+
+    def tearDown(self):
+        set_limit_store(MemoryStore())
+
+    def test_update(self):
+        limiter = Limiter(max_calls=3, period=60)
+        results = [
+            self.store.update("test_update", limiter._update, 60) for _ in range(4)
+        ]
+        self.assertEqual(results[:3], [None, None, None])
+        self.assertGreater(results[3], 59)
+        self.assertEqual(self.store.update("test_update", lambda *_: (None, 1), 60), 1)
+        self.assertIsNone(self.store.update("test_update", limiter._update, 60))
+
+    def test_expire(self):
+        self.store.update("test_expire", lambda *_: ([1], None), 0.01)
+        sleep(0.05)
+        self.assertIsNone(
+            self.store.update("test_expire", lambda state, _: (state, state), 60)
+        )
+
+    def test_rate_limit(self):
+        set_limit_store(self.store)
+        self.assertIs(get_limit_store(), self.store)
+        client = app.test_client()
+        for _ in range(2):
+            self.assertEqual(
+                client.post("/call/limited_call", json={}).json[0], "funix"
+            )
+        response = client.post("/call/limited_call", json={})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json["error_type"], "safe_checker")
+        # Another browser has its own limit
+        other = app.test_client()
+        self.assertEqual(other.post("/call/limited_call", json={}).json[0], "funix")
+
+    def test_concurrent(self):
+        set_limit_store(self.store)
+        concurrent_event.clear()
+        results = []
+        threads = [
+            Thread(
+                target=lambda: results.append(
+                    app.test_client().post("/call/concurrent_call", json={}).json[0]
+                )
+            )
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        sleep(0.5)
+        response = app.test_client().post("/call/concurrent_call", json={})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        concurrent_event.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["funix", "funix"])
+        response = app.test_client().post("/call/concurrent_call", json={})
+        self.assertEqual(response.json[0], "funix")
+
+    def test_give_back(self):
+        set_limit_store(self.store)
+        concurrent = Limiter.concurrent(2, source=LimitSource.FUNCTION)
+        concurrent.set_scope("test_give_back")
+        rejecting = Limiter.session(max_calls=1, period=60)
+        rejecting.set_scope("test_give_back")
+        with app.test_request_context("/call/limited_call", method="POST"):
+            session["__funix_id"] = "give_back"
+            self.assertIsNone(check_rate_limits([concurrent, rejecting]))
+            response = check_rate_limits([concurrent, rejecting])
+            self.assertEqual(response.status_code, 429)
+            # The rejected call gave its slot back, the first one is still in flight
+            self.assertIsNone(concurrent.rate_limit())
+            self.assertIsNotNone(concurrent.rate_limit())
+            concurrent.finish(1)
+            concurrent.finish(1)
+            self.assertIsNone(concurrent.rate_limit())
+
+
+class TestAlgorithm(TestCase):
+    def calls(self, limiter: Limiter, times: list[float]) -> list:
+        state, results = None, []
+        for now in times:
+            state, result = limiter._update(state, now)
+            results.append(result)
+        return results
+
+    def test_token_bucket(self):
+        limiter = Limiter(max_calls=2, period=10, algorithm="token_bucket")
+        results = self.calls(limiter, [100, 100, 100, 103, 105, 110])
+        self.assertEqual(results[:2], [None, None])
+        self.assertAlmostEqual(results[2], 5)
+        self.assertAlmostEqual(results[3], 2)
+        self.assertEqual(results[4:], [None, None])
+        self.assertEqual(limiter.ttl, 10)
+
+    def test_sliding_window(self):
+        limiter = Limiter(max_calls=4, period=10, algorithm="sliding_window")
+        results = self.calls(limiter, [100, 101, 102, 103, 109, 112, 117, 135])
+        self.assertEqual(results[:4], [None] * 4)
+        self.assertAlmostEqual(results[4], 1)
+        # The 4 calls of the last window weigh 4 * 0.8, until 4 * 0.75 at 112.5
+        self.assertAlmostEqual(results[5], 0.5)
+        self.assertEqual(results[6:], [None, None])
+        self.assertEqual(limiter.ttl, 20)
+
+    def test_cost(self):
+        limiter = Limiter(max_calls=10, period=10, algorithm="token_bucket", cost=4)
+        results = self.calls(limiter, [100, 100, 100, 102])
+        self.assertEqual(results[:2], [None, None])
+        self.assertAlmostEqual(results[2], 2)
+        self.assertIsNone(results[3])
+        with self.assertRaises(ValueError):
+            Limiter(max_calls=10, cost=2)
+        with self.assertRaises(ValueError):
+            Limiter(max_calls=10, algorithm="token_bucket", cost=11)
+
+    def test_time_cost(self):
+        for algorithm in ("token_bucket", "sliding_window"):
+            limiter = Limiter(max_calls=5, period=10, algorithm=algorithm, cost="time")
+            state, result = limiter._update(None, 100)
+            self.assertIsNone(result)
+            # A 30 seconds call takes the budget of 60 seconds
+            state, _ = limiter._finish_update(30)(state, 100.5)
+            state, result = limiter._update(state, 101)
+            self.assertGreater(result, 8)
+            if algorithm == "token_bucket":
+                self.assertAlmostEqual(result, 49.5)
+            self.assertIsNone(limiter._finish_update(None))
+
+    def test_concurrency(self):
+        limiter = Limiter.concurrent(2)
+        results = self.calls(limiter, [100, 100, 100])
+        self.assertEqual(results, [None, None, 1])
+        state, _ = limiter._update(None, 100)
+        state, _ = limiter._update(state, 100)
+        state, _ = limiter._finish_update(4)(state, 104)
+        state, _ = limiter._update(state, 104)
+        self.assertEqual(limiter._update(state, 104)[1], 2)
+        # A call that did not run is given back, the average wall time is kept
+        state, _ = limiter._finish_update(None)(state, 104)
+        self.assertEqual(state, (1, 4))
+        with self.assertRaises(ValueError):
+            Limiter(algorithm="concurrency", cost="time")
+
+    def test_dict(self):
+        limiter = Limiter.from_dict({"per_ip": 5, "algorithm": "token_bucket"})
+        self.assertEqual(limiter.algorithm, "token_bucket")
+        with self.assertRaises(ValueError):
+            Limiter(algorithm="fixed_window")
+
+
+class TestMemoryStore(StoreTests, TestCase):
+    def setUp(self):
+        self.store = parse_limit_store("memory")
+        self.assertIsInstance(self.store, MemoryStore)
+
+    def test_sweep(self):
+        self.store.update("test_sweep", lambda *_: ([1], None), 0)
+        self.store.sweep()
+        self.assertEqual(self.store.stats()["keys"], 0)
+
+    def test_scope(self):
+        shared = Limiter(source=LimitSource.IP)
+        shared.set_scope("first")
+        shared.set_scope("second")
+        self.assertEqual(shared.scope, "first")
+        with self.assertRaises(TypeError):
+            Limiter(store="memory")
+        with self.assertRaises(ValueError):
+            parse_limit_store("mysql://localhost/funix")
+        # Unnamed limiters count per endpoint, the same in every worker
+        unnamed = Limiter(source=LimitSource.FUNCTION)
+        with app.test_request_context("/call/limited_call", method="POST"):
+            self.assertEqual(unnamed._key(), f"{request.endpoint}:FUNCTION:all")
+        self.assertIsNone(unnamed.scope)
+        set_rate_limiters([unnamed])
+        set_rate_limiters([])
+        self.assertEqual(unnamed.scope, "global:0")
+
+    def test_global(self):
+        set_rate_limiters([Limiter.session(max_calls=1, period=60)])
+        try:
+            client = app.test_client()
+            self.assertEqual(
+                client.post("/call/unlimited_call", json={}).status_code, 200
+            )
+            self.assertEqual(
+                client.post("/call/unlimited_call", json={}).status_code, 429
+            )
+        finally:
+            set_rate_limiters([])
+
+    def test_sqlite_path(self):
+        self.assertEqual(get_sqlite_path(urlsplit("sqlite:///limits.db")), "limits.db")
+        self.assertEqual(
+            get_sqlite_path(urlsplit("sqlite:////var/limits.db")), "/var/limits.db"
+        )
+
+
+class TestSQLiteStore(StoreTests, TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.url = f"sqlite:///{join(self.directory.name, 'limits.db')}"
+        self.store = parse_limit_store(self.url)
+        self.assertIsInstance(self.store, SQLiteStore)
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_threads(self):
+        results = []
+        threads = [
+            Thread(target=lambda: results.append(record_calls(self.url, 10)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(results), 25)
+
+    def test_processes(self):
+        with get_context("spawn").Pool(4) as pool:
+            results = pool.starmap(record_calls, [(self.url, 10)] * 4)
+        self.assertEqual(sum(results), 25)
+
+
+@skipUnless(
+    is_redis_enabled() and fakeredis_use, "redis and fakeredis are not installed"
+)
+class TestRedisStore(StoreTests, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = TcpFakeServer(("127.0.0.1", 0))
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        host, port = cls.server.server_address
+        cls.url = f"redis://{host}:{port}/0"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.store = parse_limit_store(self.url)
+        self.assertIsInstance(self.store, RedisStore)
+        self.store.client.flushdb()
+
+    def test_threads(self):
+        results = []
+        threads = [
+            Thread(target=lambda: results.append(record_calls(self.url, 10)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(results), 25)
+
+
+if __name__ == "__main__":
+    main()
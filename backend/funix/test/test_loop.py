@@ -0,0 +1,93 @@
+"""
+Test the funix.util.loop module.
+"""
+
+from asyncio import gather, sleep
+from contextvars import ContextVar
+from threading import Thread
+from unittest import TestCase, main
+
+from funix.util.loop import get_event_loop, iterate_async_generator, run_coroutine
+
+request_name: ContextVar[str] = ContextVar("request_name")
+
+
+class TestRunCoroutine(TestCase):
+    def test_result(self):
+        async def add(a: int, b: int) -> int:
+            await sleep(0)
+            return a + b
+
+        self.assertEqual(run_coroutine(add(1, 2)), 3)
+
+    def test_exception(self):
+        async def fail():
+            raise ValueError("funix")
+
+        with self.assertRaises(ValueError):
+            run_coroutine(fail())
+
+    def test_shared_loop(self):
+        async def current_loop():
+            from asyncio import get_running_loop
+
+            return get_running_loop()
+
+        self.assertIs(run_coroutine(current_loop()), get_event_loop())
+
+    def test_context_variables(self):
+        async def get_name():
+            await sleep(0)
+            return request_name.get("")
+
+        results = {}
+
+        def worker(name: str):
+            request_name.set(name)
+            results[name] = run_coroutine(get_name())
+
+        threads = [Thread(target=worker, args=(f"user{i}",)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {f"user{i}": f"user{i}" for i in range(8)})
+
+    def test_concurrent(self):
+        async def wait(index: int) -> int:
+            await sleep(0.05)
+            return index
+
+        async def fan_out():
+            return await gather(*[wait(i) for i in range(100)])
+
+        self.assertEqual(run_coroutine(fan_out()), list(range(100)))
+
+
+class TestIterateAsyncGenerator(TestCase):
+    def test_iterate(self):
+        async def count(n: int):
+            for i in range(n):
+                await sleep(0)
+                yield i
+
+        self.assertEqual(list(iterate_async_generator(count(5))), [0, 1, 2, 3, 4])
+
+    def test_close(self):
+        closed = []
+
+        async def endless():
+            try:
+                while True:
+                    yield 1
+            finally:
+                closed.append(True)
+
+        generator = iterate_async_generator(endless())
+        self.assertEqual(next(generator), 1)
+        generator.close()
+        self.assertEqual(closed, [True])
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,11 @@ from inspect import Parameter
 from typing import Dict, List, Literal, Optional, TypedDict, Union
 from unittest import TestCase, main
 
-from funix.decorator.magic import get_type_dict, get_type_widget_prop
+from funix.decorator.magic import (
+    get_closure_locals,
+    get_type_dict,
+    get_type_widget_prop,
+)
 
 
 class TestGetTypeDict(TestCase):
@@ -178,5 +182,26 @@ class TestGetTypeWidgetProp(TestCase):
         )
 
 
+class TestGetClosureLocals(TestCase):
+    def test_lambda(self):
+        def make(a: int, b: str):
+            return lambda: (a, b)
+
+        self.assertEqual(get_closure_locals(make(1, "funix")), {"a": 1, "b": "funix"})
+
+    def test_no_closure(self):
+        self.assertEqual(get_closure_locals(lambda: None), {})
+        self.assertEqual(get_closure_locals(len), {})
+
+    def test_empty_cell(self):
+        def make():
+            function = lambda: later
+            later = None
+            del later
+            return function
+
+        self.assertEqual(get_closure_locals(make()), {})
+
+
 if __name__ == "__main__":
     main(verbosity=2)
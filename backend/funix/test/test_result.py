@@ -0,0 +1,139 @@
+"""
+Test the funix.decorator.result module, the result handles of large tables.
+"""
+
+from json import dumps
+from unittest import TestCase, main
+
+from pandas import DataFrame
+
+from funix import funix
+from funix.app import app
+from funix.config.switch import GlobalSwitchOption
+from funix.decorator import enable_wrapper
+from funix.decorator.result import RESULT_KEY, get_dataframe_size, get_result_stats
+
+enable_wrapper()
+
+
+@funix()
+def result_table(rows: int = 25) -> DataFrame:
+    return DataFrame({"a": range(rows), "b": [f"row {i % 5}" for i in range(rows)]})
+
+
+@funix()
+def result() -> str:
+    return "funix"
+
+
+@funix()
+def metrics() -> str:
+    return "funix"
+
+
+class TestResult(TestCase):
+    def setUp(self):
+        self.page_size = GlobalSwitchOption.RESULT_PAGE_SIZE
+        GlobalSwitchOption.RESULT_PAGE_SIZE = 10
+        self.client = app.test_client()
+
+    def tearDown(self):
+        GlobalSwitchOption.RESULT_PAGE_SIZE = self.page_size
+
+    def call(self, rows: int):
+        return self.client.post("/call/result_table", json={"rows": rows}).json[0]
+
+    def page(self, handle: str, **args):
+        return self.client.get(f"/__funix/result/{handle}", query_string=args)
+
+    def test_small(self):
+        self.assertEqual(len(self.call(10)), 10)
+
+    def test_first_page(self):
+        result = self.call(25)
+        self.assertEqual(result["total"], 25)
+        self.assertEqual(result["offset"], 0)
+        self.assertEqual([row["a"] for row in result["rows"]], list(range(10)))
+
+    def test_pages(self):
+        handle = self.call(25)[RESULT_KEY]
+        page = self.page(handle, offset=20, limit=10).json
+        self.assertEqual([row["a"] for row in page["rows"]], list(range(20, 25)))
+        self.assertEqual(page["total"], 25)
+
+    def test_sort_and_filter(self):
+        handle = self.call(25)[RESULT_KEY]
+        page = self.page(
+            handle,
+            sort=dumps([{"field": "a", "sort": "desc"}]),
+            filter=dumps(
+                {"items": [{"field": "b", "operator": "equals", "value": "ROW 1"}]}
+            ),
+        ).json
+        self.assertEqual(page["total"], 5)
+        self.assertEqual([row["a"] for row in page["rows"]], [21, 16, 11, 6, 1])
+        page = self.page(
+            handle,
+            filter=dumps(
+                {
+                    "items": [
+                        {"field": "a", "operator": "<", "value": "2"},
+                        {"field": "a", "operator": ">=", "value": 23},
+                    ],
+                    "logicOperator": "or",
+                }
+            ),
+        ).json
+        self.assertEqual([row["a"] for row in page["rows"]], [0, 1, 23, 24])
+
+    def test_bad_request(self):
+        handle = self.call(25)[RESULT_KEY]
+        response = self.page(handle, sort=dumps([{"field": "c", "sort": "asc"}]))
+        self.assertEqual(response.status_code, 400)
+        response = self.page(
+            handle,
+            filter=dumps({"items": [{"field": "a", "operator": "near", "value": 1}]}),
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_found(self):
+        self.assertEqual(self.page("0" * 32).status_code, 404)
+
+    def test_memory_limit(self):
+        memory_limit = GlobalSwitchOption.RESULT_MEMORY_LIMIT
+        size = get_dataframe_size(result_table(25))
+        GlobalSwitchOption.RESULT_MEMORY_LIMIT = size * 2
+        try:
+            first = self.call(25)[RESULT_KEY]
+            second = self.call(25)[RESULT_KEY]
+            # Using the first table makes the second one the least recently used
+            self.assertEqual(self.page(first).status_code, 200)
+            evicted = get_result_stats()["evicted"]
+            third = self.call(25)[RESULT_KEY]
+            self.assertEqual(get_result_stats()["evicted"], evicted + 1)
+            self.assertEqual(self.page(second).status_code, 404)
+            self.assertEqual(self.page(first).status_code, 200)
+            # A sorted view is counted too
+            self.page(third, sort=dumps([{"field": "a", "sort": "desc"}]))
+            self.assertEqual(self.page(first).status_code, 404)
+            self.assertEqual(get_result_stats()["tables"], 1)
+        finally:
+            GlobalSwitchOption.RESULT_MEMORY_LIMIT = memory_limit
+
+    def test_internal_routes(self):
+        # The routes of funix do not take the names of the functions
+        for name in ("result", "metrics"):
+            self.assertEqual(
+                self.client.post(f"/call/{name}", json={}).json[0], "funix"
+            )
+        self.assertIn("results", self.client.get("/__funix/metrics").json)
+
+    def test_other_session(self):
+        handle = self.call(25)[RESULT_KEY]
+        self.assertEqual(
+            app.test_client().get(f"/__funix/result/{handle}").status_code, 404
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Test the funix.util.scheduler module.
+"""
+
+from threading import Event, enumerate as enumerate_threads
+from unittest import TestCase, main
+
+from funix.util.scheduler import call_later
+
+
+class TestScheduler(TestCase):
+    def test_order(self):
+        calls = []
+        done = Event()
+        call_later(0.2, lambda: (calls.append(3), done.set()))
+        call_later(0.1, calls.append, 2)
+        call_later(0, calls.append, 1)
+        self.assertTrue(done.wait(2))
+        self.assertEqual(calls, [1, 2, 3])
+
+    def test_one_thread(self):
+        done = Event()
+        for _ in range(100):
+            call_later(0.1, lambda: None)
+        call_later(0.1, done.set)
+        names = [thread.name for thread in enumerate_threads()]
+        self.assertEqual(names.count("funix-scheduler"), 1)
+        self.assertTrue(done.wait(2))
+
+    def test_cancel(self):
+        calls = []
+        done = Event()
+        call_later(0.05, calls.append, 1).cancel()
+        call_later(0.1, done.set)
+        self.assertTrue(done.wait(2))
+        self.assertEqual(calls, [])
+
+    def test_error(self):
+        done = Event()
+        call_later(0, lambda: 1 / 0)
+        call_later(0.05, done.set)
+        self.assertTrue(done.wait(2))
+
+
+if __name__ == "__main__":
+    main()
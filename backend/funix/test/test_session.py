@@ -0,0 +1,201 @@
+"""
+Test the funix.session module, the session variables and their stores.
+"""
+
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import sleep
+from unittest import TestCase, main, skipUnless
+
+from funix import funix
+from funix.app import app
+from funix.config.switch import GlobalSwitchOption
+from funix.decorator import enable_wrapper
+from funix.session import (
+    get_global_variable,
+    get_session_store,
+    set_default_global_variable,
+    set_global_variable,
+    set_session_store,
+)
+from funix.util.session_store import (
+    MemoryStore,
+    RedisStore,
+    SQLiteStore,
+    is_redis_enabled,
+    parse_session_store,
+)
+
+try:
+    from fakeredis import TcpFakeServer
+
+    fakeredis_use = True
+except ImportError:
+    fakeredis_use = False
+
+enable_wrapper()
+
+set_default_global_variable("session_history", [])
+
+
+@funix()
+def session_append(item: str) -> list:
+    get_global_variable("session_history").append(item)
+    set_global_variable("session_count", len(get_global_variable("session_history")))
+    return get_global_variable("session_history")
+
+
+@funix()
+def session_count() -> int:
+    return get_global_variable("session_count")
+
+
+class StoreTests:
+    """
+    The tests shared by the stores, `store` is set by the subclasses.
+    """
+
+    def setUp(self):
+        set_session_store(self.store)
+
+    def tearDown(self):
+        set_session_store(MemoryStore())
+
+    def append(self, client, item: str) -> list:
+        return client.post("/call/session_append", json={"item": item}).json[0]
+
+    def test_variables(self):
+        client = app.test_client()
+        self.assertEqual(self.append(client, "a"), ["a"])
+        self.assertEqual(self.append(client, "b"), ["a", "b"])
+        # Another browser starts from the defaults
+        self.assertEqual(self.append(app.test_client(), "c"), ["c"])
+        with client.session_transaction() as session:
+            user_id = session["__funix_id"]
+        self.assertEqual(
+            self.store.load(user_id),
+            {"session_history": ["a", "b"], "session_count": 2},
+        )
+        self.store.delete(user_id)
+        self.assertEqual(self.append(client, "d"), ["d"])
+
+    def test_concurrent_changes(self):
+        self.store.save("concurrent", {"a": 1})
+        first = self.store.load("concurrent")
+        second = self.store.load("concurrent")
+        first["b"] = 2
+        self.store.save("concurrent", first, {"b"})
+        second["c"] = 3
+        self.store.save("concurrent", second, {"c"})
+        self.assertEqual(self.store.load("concurrent"), {"a": 1, "b": 2, "c": 3})
+        self.store.delete("concurrent")
+
+    def test_read_only(self):
+        client = app.test_client()
+        self.append(client, "a")
+        saves = []
+        save = self.store.save
+        self.store.save = lambda *args: saves.append(args) or save(*args)
+        try:
+            self.assertEqual(client.post("/call/session_count", json={}).json[0], "1")
+            self.assertEqual(saves, [])
+            self.append(client, "b")
+            self.assertEqual(len(saves), 1)
+            self.assertEqual(saves[0][2], {"session_history", "session_count"})
+        finally:
+            del self.store.save
+
+    def test_expire(self):
+        expire_time = GlobalSwitchOption.SESSION_EXPIRE_TIME
+        GlobalSwitchOption.SESSION_EXPIRE_TIME = 1
+        try:
+            self.store.save("expired", {"session_count": 1})
+            self.assertIsNotNone(self.store.load("expired"))
+            sleep(1.2)
+            self.assertIsNone(self.store.load("expired"))
+            self.store.sweep()
+        finally:
+            GlobalSwitchOption.SESSION_EXPIRE_TIME = expire_time
+
+
+class TestMemoryStore(StoreTests, TestCase):
+    def setUp(self):
+        self.store = parse_session_store("memory")
+        self.assertIsInstance(self.store, MemoryStore)
+        super().setUp()
+
+    def test_memory_limit(self):
+        memory_limit = GlobalSwitchOption.SESSION_MEMORY_LIMIT
+        GlobalSwitchOption.SESSION_MEMORY_LIMIT = 64 * 1024
+        try:
+            for i in range(5):
+                self.store.save(str(i), {"data": "x" * 10240})
+            self.store.load("0")
+            for i in range(5, 7):
+                self.store.save(str(i), {"data": "x" * 10240})
+            self.assertLessEqual(self.store.stats()["bytes"], 64 * 1024)
+            self.assertIsNotNone(self.store.load("0"))
+            self.assertIsNone(self.store.load("1"))
+            self.assertGreater(self.store.stats()["evicted"], 0)
+        finally:
+            GlobalSwitchOption.SESSION_MEMORY_LIMIT = memory_limit
+
+    def test_batch_threads(self):
+        self.assertIs(get_session_store(), self.store)
+        client = app.test_client()
+        self.append(client, "a")
+        threads = [Thread(target=lambda: self.append(client, "b")) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The requests of a browser share the objects in memory
+        self.assertEqual(self.append(client, "c"), ["a"] + ["b"] * 4 + ["c"])
+
+
+class TestSQLiteStore(StoreTests, TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.url = f"sqlite:///{join(self.directory.name, 'sessions.db')}"
+        self.store = parse_session_store(self.url)
+        self.assertIsInstance(self.store, SQLiteStore)
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_workers(self):
+        client = app.test_client()
+        self.append(client, "a")
+        # Another worker, or after a restart
+        set_session_store(parse_session_store(self.url))
+        self.assertEqual(self.append(client, "b"), ["a", "b"])
+
+
+@skipUnless(
+    is_redis_enabled() and fakeredis_use, "redis and fakeredis are not installed"
+)
+class TestRedisStore(StoreTests, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = TcpFakeServer(("127.0.0.1", 0))
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        host, port = cls.server.server_address
+        cls.url = f"redis://{host}:{port}/0"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.store = parse_session_store(self.url)
+        self.assertIsInstance(self.store, RedisStore)
+        self.store.client.flushdb()
+        super().setUp()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Test the funix.session.shared module, the copy-on-write default global variables.
+"""
+
+from copy import copy, deepcopy
+from pickle import dumps, loads
+from unittest import TestCase, main
+
+from flask import session
+from numpy import zeros
+
+from funix import funix
+from funix.app import app
+from funix.config.switch import GlobalSwitchOption
+from funix.decorator import enable_wrapper
+from funix.prep.global_to_session import do_global_to_session
+from funix.session import (
+    get_global_variable,
+    get_session_store,
+    set_default_global_variable,
+)
+from funix.session.shared import SharedValue, share, unshare
+
+enable_wrapper()
+
+shared_words = ["apple", "banana", "cherry"]
+shared_table = {"fruits": ["apple"], "count": 1}
+
+set_default_global_variable("shared_words", shared_words, shared=True)
+set_default_global_variable("shared_table", shared_table, shared=True)
+set_default_global_variable("copied_words", shared_words)
+set_default_global_variable("switched_words", shared_words)
+set_default_global_variable("unshared_words", shared_words, shared=False)
+set_default_global_variable("immutable_words", tuple(shared_words))
+
+transformed_source = """
+transformed_words = ["apple", "banana"]
+
+def transformed_read() -> list:
+    global transformed_words
+    return transformed_words
+
+def transformed_add(word: str) -> None:
+    global transformed_words
+    transformed_words.append(word)
+"""
+
+
+class Player:
+    def __init__(self):
+        self.score = 0
+
+
+@funix()
+def shared_read(index: int) -> list:
+    words = get_global_variable("shared_words")
+    return [words[index], len(words), words]
+
+
+@funix()
+def shared_add(fruit: str) -> dict:
+    get_global_variable("shared_table")["fruits"].append(fruit)
+    return get_global_variable("shared_table")
+
+
+class TestShare(TestCase):
+    def test_immutable(self):
+        variables = {}
+        self.assertEqual(share("text", variables, "text"), "text")
+        self.assertEqual(variables, {})
+
+    def test_read(self):
+        variables = {}
+        words = share(shared_words, variables, "words")
+        self.assertIsInstance(words, SharedValue)
+        self.assertEqual(words, shared_words)
+        self.assertEqual(list(words), shared_words)
+        self.assertEqual(words[-1], "cherry")
+        self.assertIn("banana", words)
+        self.assertIs(unshare(words), shared_words)
+        self.assertEqual(variables, {})
+
+    def test_write(self):
+        variables = {}
+        words = share(shared_words, variables, "words")
+        words.append("date")
+        words += ["elderberry"]
+        self.assertFalse(words.shared)
+        self.assertEqual(variables["words"], shared_words + ["date", "elderberry"])
+        self.assertEqual(words, variables["words"])
+        self.assertEqual(shared_words, ["apple", "banana", "cherry"])
+
+    def test_nested(self):
+        variables = {}
+        table = share(shared_table, variables, "table")
+        fruits = table["fruits"]
+        self.assertIsInstance(fruits, SharedValue)
+        fruits.append("banana")
+        self.assertEqual(variables["table"]["fruits"], ["apple", "banana"])
+        self.assertEqual(table["fruits"], ["apple", "banana"])
+        self.assertEqual(shared_table, {"fruits": ["apple"], "count": 1})
+
+    def test_copies(self):
+        variables = {}
+        table = share(shared_table, variables, "table")
+        for made in (
+            copy(table),
+            deepcopy(table),
+            loads(dumps(table)),
+            table | {},
+        ):
+            self.assertIs(type(made), dict)
+            made["fruits"].append("banana")
+        self.assertEqual(shared_table, {"fruits": ["apple"], "count": 1})
+        words = share(shared_words, variables, "words")
+        words[:1][0:0] = ["date"]
+        self.assertIs(type(words + []), list)
+        self.assertEqual(shared_words, ["apple", "banana", "cherry"])
+        self.assertEqual(variables, {})
+
+    def test_mutable_items(self):
+        state = {"board": zeros(3), "players": [Player()], "seen": {(1, 2)}}
+        first = {}
+        view = share(state, first, "state")
+        view["board"][0] = 5
+        view["players"][0].score += 1
+        second = {}
+        view = share(state, second, "state")
+        self.assertEqual(view["board"][0], 0)
+        self.assertEqual(view["players"][0].score, 0)
+        self.assertEqual(first["state"]["board"][0], 5)
+        self.assertEqual(first["state"]["players"][0].score, 1)
+        self.assertEqual(state["board"][0], 0)
+        self.assertEqual(state["players"][0].score, 0)
+        # Immutable items, tuples of them too, are shared
+        third = {}
+        self.assertEqual(list(share(state, third, "state")["seen"]), [(1, 2)])
+        self.assertEqual(third, {})
+        players = share([Player()], third, "players")
+        for player in players:
+            player.score += 1
+        self.assertEqual(third["players"][0].score, 1)
+
+    def test_unshare(self):
+        words = share(shared_words, {}, "words")
+        self.assertIs(unshare([1, words], 1)[1], shared_words)
+        result = [1, 2]
+        self.assertIs(unshare(result, 2), result)
+
+
+class TestSharedApp(TestCase):
+    def test_copied(self):
+        with app.test_request_context():
+            session["__funix_id"] = "copied"
+            words = get_global_variable("copied_words")
+            self.assertIs(type(words), list)
+            self.assertIsNot(words, shared_words)
+
+    def test_switch(self):
+        GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES = True
+        try:
+            with app.test_request_context():
+                session["__funix_id"] = "switch"
+                self.assertIsInstance(
+                    get_global_variable("switched_words"), SharedValue
+                )
+                self.assertIs(type(get_global_variable("unshared_words")), list)
+        finally:
+            GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES = False
+
+    def test_immutable(self):
+        with app.test_request_context():
+            session["__funix_id"] = "immutable"
+            self.assertEqual(
+                get_global_variable("immutable_words"), ("apple", "banana", "cherry")
+            )
+        # Not copied into the variables of the browser
+        self.assertIsNone(get_session_store().load("immutable"))
+
+    def test_transform(self):
+        namespace = {}
+        exec(do_global_to_session(transformed_source), namespace)
+        GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES = True
+        try:
+            with app.test_request_context():
+                session["__funix_id"] = "transform"
+                words = namespace["transformed_read"]()
+                self.assertIsInstance(words, SharedValue)
+                namespace["transformed_add"]("cherry")
+                self.assertFalse(words.shared)
+                self.assertEqual(words, ["apple", "banana", "cherry"])
+            with app.test_request_context():
+                session["__funix_id"] = "transform other"
+                self.assertEqual(namespace["transformed_read"](), ["apple", "banana"])
+        finally:
+            GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES = False
+
+    def test_results(self):
+        client = app.test_client()
+        self.assertEqual(
+            client.post("/call/shared_read", json={"index": 1}).json[0],
+            ["banana", 3, shared_words],
+        )
+        self.assertEqual(
+            client.post("/call/shared_add", json={"fruit": "banana"}).json[0],
+            {"fruits": ["apple", "banana"], "count": 1},
+        )
+        self.assertEqual(
+            client.post("/call/shared_add", json={"fruit": "cherry"}).json[0],
+            {"fruits": ["apple", "banana", "cherry"], "count": 1},
+        )
+        self.assertEqual(shared_table, {"fruits": ["apple"], "count": 1})
+        # Another browser starts from the defaults
+        self.assertEqual(
+            app.test_client().post("/call/shared_add", json={"fruit": "date"}).json[0],
+            {"fruits": ["apple", "date"], "count": 1},
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Test the funix.util.storage module, the storage backends of the file service.
+"""
+
+from hashlib import sha256
+from tempfile import TemporaryDirectory
+from time import time
+from unittest import TestCase, main, skipUnless
+
+from funix.app import app
+from funix.decorator import enable_wrapper
+from funix.decorator.file import get_static_uri, set_file_storage
+from funix.util.storage import (
+    LocalStorage,
+    MemoryStorage,
+    S3Storage,
+    is_s3_enabled,
+    parse_file_storage,
+)
+
+try:
+    from moto.server import ThreadedMotoServer
+
+    moto_use = True
+except ImportError:
+    moto_use = False
+
+enable_wrapper()
+
+
+class StorageTests:
+    """
+    The tests shared by the shared storages, `storage` is set by the subclasses.
+    """
+
+    def tearDown(self):
+        set_file_storage(MemoryStorage())
+
+    def test_storage(self):
+        data = b"funix storage " * 64
+        digest = sha256(data).hexdigest()
+        self.assertFalse(self.storage.touch(digest))
+        self.storage.put(digest, data)
+        self.assertTrue(self.storage.touch(digest))
+        file, size = self.storage.open(digest)
+        with file:
+            self.assertEqual(size, len(data))
+            file.seek(14 * 63)
+            self.assertEqual(file.read(), data[14 * 63 :])
+        self.storage.delete(digest, time() - 60)
+        self.assertIsNotNone(self.storage.open(digest))
+        self.storage.delete(digest)
+        self.assertIsNone(self.storage.open(digest))
+
+    def test_serve(self):
+        set_file_storage(self.storage)
+        client = app.test_client()
+        data = b"%PDF-" + b"funix shared " * 64
+        uri = get_static_uri(data)
+        self.assertEqual(uri, f"/file/{sha256(data).hexdigest()}")
+        response = client.get(uri, headers={"Range": "bytes=5-9"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.mimetype, "application/pdf")
+        self.assertEqual(response.data, b"funix")
+        response.close()
+        # Stored by another replica, or before a restart
+        other = b"funix other replica"
+        self.storage.put(sha256(other).hexdigest(), other)
+        response = client.get(f"/file/{sha256(other).hexdigest()}")
+        self.assertEqual(response.data, other)
+        response.close()
+
+
+class TestLocalStorage(StorageTests, TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.storage = parse_file_storage(f"file://{self.directory.name}")
+        self.assertIsInstance(self.storage, LocalStorage)
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_empty(self):
+        digest = sha256(b"").hexdigest()
+        self.storage.put(digest, b"")
+        file, size = self.storage.open(digest)
+        with file:
+            self.assertEqual((size, file.read()), (0, b""))
+
+    def test_sweep(self):
+        self.storage.put("0" * 64, b"funix")
+        self.storage.sweep(time() - 60)
+        self.assertIsNotNone(self.storage.open("0" * 64))
+        self.storage.sweep(time() + 60)
+        self.assertIsNone(self.storage.open("0" * 64))
+
+
+@skipUnless(is_s3_enabled() and moto_use, "boto3 and moto are not installed")
+class TestS3Storage(StorageTests, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadedMotoServer(port=0, verbose=False)
+        cls.server.start()
+        host, port = cls.server.get_host_and_port()
+        cls.url = (
+            f"s3://funix-test/files/?endpoint_url=http://{host}:{port}"
+            "&region_name=us-east-1&aws_access_key_id=funix&aws_secret_access_key=funix"
+        )
+        parse_file_storage(cls.url).client.create_bucket(Bucket="funix-test")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.storage = parse_file_storage(self.url)
+        self.assertIsInstance(self.storage, S3Storage)
+
+
+if __name__ == "__main__":
+    main()
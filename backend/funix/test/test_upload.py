@@ -0,0 +1,191 @@
+"""
+Test the funix.decorator.upload module, the streaming uploads of the upload widgets.
+"""
+
+from base64 import b64encode
+from io import BytesIO
+from os.path import exists
+from typing import List
+from unittest import TestCase, main
+
+from funix import funix
+from funix.app import app
+from funix.config.switch import GlobalSwitchOption
+from funix.decorator import enable_wrapper
+from funix.decorator.limit import Limiter
+from funix.decorator.upload import UPLOAD_PREFIX, get_upload_stats
+from funix.hint import BytesFile, PathFile, StreamFile
+
+enable_wrapper()
+
+upload_paths = []
+
+
+@funix(upload_limit=1024)
+def upload_bytes(files: List[BytesFile]) -> str:
+    return " ".join(file.decode() for file in files)
+
+
+@funix(upload="path")
+def upload_path(file: BytesFile) -> str:
+    upload_paths.append(file)
+    with open(file, "rb") as f:
+        return f.read().decode()
+
+
+@funix(upload="file")
+def upload_file(file: BytesFile) -> str:
+    upload_paths.append(file)
+    return file.read().decode()
+
+
+@funix(upload="file")
+def upload_annotated(path: PathFile, streams: List[StreamFile]) -> list:
+    upload_paths.extend(streams)
+    with open(path, "rb") as f:
+        return [f.read().decode()] + [stream.read().decode() for stream in streams]
+
+
+@funix(secret="funix-upload-secret")
+def upload_secret(file: BytesFile) -> str:
+    return file.decode()
+
+
+@funix(rate_limit=Limiter.session(max_calls=1, period=60))
+def upload_limited(file: BytesFile) -> str:
+    return file.decode()
+
+
+@funix()
+def upload() -> str:
+    return "funix"
+
+
+class TestUpload(TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+
+    def upload(self, function: str, *contents: bytes, headers: dict | None = None):
+        return self.client.post(
+            f"/__funix/upload/{function}",
+            headers=headers,
+            data={
+                "files": [
+                    (BytesIO(content), f"{i}.txt") for i, content in enumerate(contents)
+                ]
+            },
+            content_type="multipart/form-data",
+        )
+
+    def call(self, function: str, **kwargs):
+        return self.client.post(f"/call/{function}", json=kwargs).json
+
+    def test_bytes(self):
+        tokens = self.upload("upload_bytes", b"funix", b"upload").json["tokens"]
+        self.assertEqual(len(tokens), 2)
+        self.assertTrue(all(token.startswith(UPLOAD_PREFIX) for token in tokens))
+        self.assertEqual(self.call("upload_bytes", files=tokens)[0], "funix upload")
+        self.assertGreaterEqual(get_upload_stats()["files"], 2)
+        self.assertGreaterEqual(get_upload_stats()["bytes"], len(b"funixupload"))
+
+    def test_limit(self):
+        response = self.upload("upload_bytes", b"x" * 2048)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json["error_type"], "upload")
+        self.assertEqual(self.upload("upload_unknown", b"x").status_code, 404)
+
+    def test_path_and_file(self):
+        token = self.upload("upload_path", b"funix path").json["tokens"][0]
+        self.assertEqual(self.call("upload_path", file=token)[0], "funix path")
+        self.assertTrue(exists(upload_paths[-1]))
+        token = self.upload("upload_file", b"funix file").json["tokens"][0]
+        self.assertEqual(self.call("upload_file", file=token)[0], "funix file")
+        self.assertTrue(upload_paths[-1].closed)
+
+    def test_owner(self):
+        token = self.upload("upload_path", b"funix owner").json["tokens"][0]
+        other = app.test_client()
+        self.assertEqual(
+            other.post("/call/upload_path", json={"file": token}).json["error_type"],
+            "wrapper",
+        )
+        # Uploaded for another function
+        self.assertEqual(self.call("upload_file", file=token)["error_type"], "wrapper")
+
+    def test_data_uri(self):
+        data_uri = "data:text/plain;base64," + b64encode(b"funix base64").decode()
+        self.assertEqual(self.call("upload_bytes", files=[data_uri])[0], "funix base64")
+        self.assertEqual(self.call("upload_path", file=data_uri)[0], "funix base64")
+        self.assertEqual(self.call("upload_file", file=data_uri)[0], "funix base64")
+
+    def test_multiple(self):
+        tokens = self.upload("upload_bytes", b"b", b"d").json["tokens"]
+        data_uris = [
+            "data:text/plain;base64," + b64encode(content).decode()
+            for content in (b"a", b"c", b"e")
+        ]
+        files = [data_uris[0], tokens[0], data_uris[1], tokens[1], data_uris[2]]
+        self.assertEqual(self.call("upload_bytes", files=files)[0], "a b c d e")
+        files[1] = UPLOAD_PREFIX + "0" * 32
+        self.assertEqual(
+            self.call("upload_bytes", files=files)["error_type"], "wrapper"
+        )
+
+    def test_annotation(self):
+        path = self.upload("upload_annotated", b"path").json["tokens"][0]
+        streams = self.upload("upload_annotated", b"a", b"b").json["tokens"]
+        data_uri = "data:text/plain;base64," + b64encode(b"c").decode()
+        result = self.call("upload_annotated", path=path, streams=streams + [data_uri])
+        self.assertEqual(result[0], ["path", "a", "b", "c"])
+        self.assertTrue(all(stream.closed for stream in upload_paths[-3:]))
+        # The uploaded files are opened, the data URIs are spooled, both are binary streams
+        self.assertEqual(
+            [type(stream).__name__ for stream in upload_paths[-3:]],
+            ["BufferedReader", "BufferedReader", "SpooledTemporaryFile"],
+        )
+
+    def test_function_name(self):
+        self.assertEqual(self.client.post("/call/upload", json={}).json[0], "funix")
+
+    def test_secret(self):
+        self.assertEqual(self.upload("upload_secret", b"funix").status_code, 403)
+        response = self.upload(
+            "upload_secret", b"funix", headers={"X-Funix-Secret": "wrong"}
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.upload(
+            "upload_secret",
+            b"funix secret",
+            headers={"X-Funix-Secret": "funix-upload-secret"},
+        )
+        token = response.json["tokens"][0]
+        result = self.call(
+            "upload_secret", file=token, __funix_secret="funix-upload-secret"
+        )
+        self.assertEqual(result[0], "funix secret")
+
+    def test_rate_limit(self):
+        token = self.upload("upload_limited", b"funix limited").json["tokens"][0]
+        response = self.upload("upload_limited", b"again")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+        # The uploads are counted apart from the calls
+        self.assertEqual(self.call("upload_limited", file=token)[0], "funix limited")
+
+    def test_session_limit(self):
+        session_limit = GlobalSwitchOption.UPLOAD_SESSION_LIMIT
+        GlobalSwitchOption.UPLOAD_SESSION_LIMIT = 4096
+        try:
+            self.assertEqual(self.upload("upload_path", b"x" * 2048).status_code, 200)
+            response = self.upload("upload_path", b"x" * 2048)
+            self.assertEqual(response.status_code, 413)
+            self.assertEqual(response.json["error_type"], "upload")
+            # Another browser has its own limit
+            self.client = app.test_client()
+            self.assertEqual(self.upload("upload_path", b"x" * 2048).status_code, 200)
+        finally:
+            GlobalSwitchOption.UPLOAD_SESSION_LIMIT = session_limit
+
+
+if __name__ == "__main__":
+    main()
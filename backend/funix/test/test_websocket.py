@@ -0,0 +1,169 @@
+"""
+Test the funix.app.websocket module.
+"""
+
+import sys
+from asyncio import sleep as async_sleep
+from io import StringIO
+from json import loads
+from threading import Thread, active_count
+from time import sleep
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from funix.app.websocket import StdoutRouter, redirect_stdout_to_websocket
+from funix.config.switch import GlobalSwitchOption
+from funix.util.loop import run_coroutine
+from funix.util.scheduler import call_later
+
+
+class FakeWebsocket:
+    def __init__(self):
+        self.frames = 0
+        self.text = {"out": "", "err": ""}
+
+    def send(self, message: str):
+        self.frames += 1
+        message = loads(message)
+        stream = "err" if message.get("stream_error") else "out"
+        if message.get("stream_reset"):
+            self.text[stream] = ""
+        self.text[stream] += message["stream_delta"]
+
+
+class TestRedirectStdoutToWebsocket(TestCase):
+    def print_outside(self) -> str:
+        # Captured from the stream the router writes to outside the websockets
+        original = StringIO()
+        with patch.object(sys.stdout, "original", original):
+            print("not captured")
+        return original.getvalue()
+
+    def test_redirect(self):
+        ws = FakeWebsocket()
+        with redirect_stdout_to_websocket(ws):
+            print("funix")
+        self.assertIsInstance(sys.stdout, StdoutRouter)
+        self.assertEqual(ws.text["out"], "funix\n")
+        self.assertEqual(self.print_outside(), "not captured\n")
+        self.assertEqual(ws.text["out"], "funix\n")
+
+    def test_stderr(self):
+        ws = FakeWebsocket()
+        with redirect_stdout_to_websocket(ws):
+            print("error", file=sys.stderr)
+        self.assertEqual(ws.text["err"], "error\n")
+
+    def test_reset_after_exception(self):
+        ws = FakeWebsocket()
+        with self.assertRaises(ValueError):
+            with redirect_stdout_to_websocket(ws):
+                raise ValueError("funix")
+        frames = ws.frames
+        self.assertEqual(self.print_outside(), "not captured\n")
+        self.assertEqual(ws.frames, frames)
+
+    def test_coroutine(self):
+        async def hello():
+            await async_sleep(0)
+            print("from the event loop")
+
+        ws = FakeWebsocket()
+        with redirect_stdout_to_websocket(ws):
+            run_coroutine(hello())
+        self.assertEqual(ws.text["out"], "from the event loop\n")
+
+    def test_concurrent(self):
+        websockets = [FakeWebsocket() for _ in range(32)]
+        lines = 50
+
+        def stream(index: int):
+            with redirect_stdout_to_websocket(websockets[index]):
+                for line in range(lines):
+                    print(f"{index}-{line}")
+                    sleep(0)
+
+        threads = [Thread(target=stream, args=(i,)) for i in range(len(websockets))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for index, ws in enumerate(websockets):
+            expected = "".join(f"{index}-{line}\n" for line in range(lines))
+            self.assertEqual(ws.text["out"], expected)
+
+
+class TestStdoutToWebsocket(TestCase):
+    def setUp(self):
+        self.interval = GlobalSwitchOption.STREAM_FLUSH_INTERVAL
+        self.size = GlobalSwitchOption.STREAM_FLUSH_SIZE
+
+    def tearDown(self):
+        GlobalSwitchOption.STREAM_FLUSH_INTERVAL = self.interval
+        GlobalSwitchOption.STREAM_FLUSH_SIZE = self.size
+
+    def test_coalesce(self):
+        GlobalSwitchOption.STREAM_FLUSH_INTERVAL = 10
+        ws = FakeWebsocket()
+        with redirect_stdout_to_websocket(ws):
+            for line in range(1000):
+                print(line)
+        # The first print, and the rest at exit
+        self.assertLessEqual(ws.frames, 3)
+        self.assertEqual(ws.text["out"], "".join(f"{line}\n" for line in range(1000)))
+
+    def test_trailing_timer(self):
+        GlobalSwitchOption.STREAM_FLUSH_INTERVAL = 0.05
+        ws = FakeWebsocket()
+        # The scheduler thread is started once per process
+        call_later(0, lambda: None)
+        threads = active_count()
+        with redirect_stdout_to_websocket(ws):
+            print("first")
+            print("second")
+            # Sent by the shared scheduler, no thread per burst
+            self.assertEqual(active_count(), threads)
+            sleep(0.2)
+            self.assertEqual(ws.text["out"], "first\nsecond\n")
+
+    def test_trailing_cancelled(self):
+        GlobalSwitchOption.STREAM_FLUSH_INTERVAL = 0.05
+        ws = FakeWebsocket()
+        with redirect_stdout_to_websocket(ws):
+            print("first")
+            print("second")
+        # Sent at exit, the scheduled send is cancelled
+        frames = ws.frames
+        sleep(0.2)
+        self.assertEqual(ws.frames, frames)
+        self.assertEqual(ws.text["out"], "first\nsecond\n")
+
+    def test_size_threshold(self):
+        GlobalSwitchOption.STREAM_FLUSH_INTERVAL = 10
+        GlobalSwitchOption.STREAM_FLUSH_SIZE = 100
+        ws = FakeWebsocket()
+        with redirect_stdout_to_websocket(ws):
+            for _ in range(10):
+                print("x" * 99)
+            self.assertGreaterEqual(ws.frames, 10)
+
+    def test_no_coalesce(self):
+        GlobalSwitchOption.STREAM_FLUSH_INTERVAL = 0
+        ws = FakeWebsocket()
+        with redirect_stdout_to_websocket(ws):
+            for line in range(10):
+                print(line, end="")
+        self.assertEqual(ws.frames, 10)
+        self.assertEqual(ws.text["out"], "0123456789")
+
+    def test_flush_reset(self):
+        ws = FakeWebsocket()
+        with redirect_stdout_to_websocket(ws):
+            print("progress 1", flush=True)
+            print("progress 2", flush=True)
+        self.assertEqual(ws.text["out"], "progress 2\n")
+
+
+if __name__ == "__main__":
+    main()
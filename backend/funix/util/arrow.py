@@ -0,0 +1,138 @@
+"""
+Arrow IPC transport for DataFrames.
+
+When pyarrow is installed, the frontend can send the sheet columns as one Arrow IPC stream and ask for DataFrame
+results in Arrow IPC with `Accept: application/vnd.apache.arrow.stream`. Both travel inside the JSON body as
+`{"__funix_arrow__": "<base64 of the IPC stream>"}`, so the rest of the protocol does not change.
+"""
+
+from base64 import b64decode, b64encode
+from typing import Any, Iterator
+
+from flask import has_request_context, request
+
+__pyarrow_use = False
+"""
+Whether Funix can encode and decode Arrow IPC.
+"""
+
+try:
+    import pyarrow
+
+    __pyarrow_use = True
+except:
+    pass
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+"""
+The MIME type of the Arrow IPC stream format, used in the `Accept` header.
+"""
+
+ARROW_KEY = "__funix_arrow__"
+"""
+The key of the base64 encoded Arrow IPC stream in the JSON body.
+"""
+
+BASE64_CHUNK_SIZE = 3 * 1024 * 16
+"""
+The number of bytes encoded to base64 at once, a multiple of 3 so the chunks can be joined.
+"""
+
+
+def is_arrow_enabled() -> bool:
+    """
+    Whether pyarrow is installed.
+
+    Returns:
+        bool: Whether the Arrow IPC transport is enabled.
+    """
+    return __pyarrow_use
+
+
+def accepts_arrow() -> bool:
+    """
+    Whether the current request asks for DataFrames in Arrow IPC. `*/*` does not count, the MIME type must be listed.
+
+    Returns:
+        bool: Whether to send DataFrames in Arrow IPC.
+    """
+    if not __pyarrow_use or not has_request_context():
+        return False
+    return any(
+        mimetype == ARROW_MIME and quality > 0
+        for mimetype, quality in request.accept_mimetypes
+    )
+
+
+def iter_arrow_json(dataframe: Any) -> Iterator[str]:
+    """
+    Encode the DataFrame to `{"__funix_arrow__": "<base64>"}`, chunk by chunk.
+
+    Parameters:
+        dataframe (pandas.DataFrame): The DataFrame.
+
+    Returns:
+        Iterator[str]: The JSON text.
+    """
+    table = pyarrow.Table.from_pandas(dataframe, preserve_index=False)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    data = memoryview(sink.getvalue())
+    yield '{"' + ARROW_KEY + '":"'
+    for start in range(0, len(data), BASE64_CHUNK_SIZE):
+        yield b64encode(data[start : start + BASE64_CHUNK_SIZE]).decode("ascii")
+    yield '"}'
+
+
+def cast_integer_columns(table: Any, json_schema_props: dict) -> Any:
+    """
+    Cast the float columns of the sheet columns declared as integers to int64. Arrow JS infers Float64 for numbers,
+    so the whole numbers of a sheet may come as floats.
+
+    Parameters:
+        table (pyarrow.Table): The table.
+        json_schema_props (dict): The JSON schema properties of the function parameters.
+
+    Returns:
+        pyarrow.Table: The table, the columns with fractional values are kept as they are.
+    """
+    for index, name in enumerate(table.column_names):
+        items = json_schema_props.get(name, {}).get("items")
+        column = table.column(index)
+        if (
+            not isinstance(items, dict)
+            or items.get("type") != "integer"
+            or not pyarrow.types.is_floating(column.type)
+        ):
+            continue
+        try:
+            # The safe cast fails on fractional values, NaN and infinities
+            table = table.set_column(index, name, column.cast(pyarrow.int64()))
+        except pyarrow.ArrowInvalid:
+            continue
+    return table
+
+
+def pop_arrow_table(function_kwargs: dict, json_schema_props: dict) -> Any:
+    """
+    Pop and decode the Arrow IPC stream sent by the frontend.
+
+    Parameters:
+        function_kwargs (dict): The arguments of the call.
+        json_schema_props (dict): The JSON schema properties of the function parameters, for the declared column
+                                  types, see `cast_integer_columns`.
+
+    Returns:
+        pyarrow.Table | None: The table, or None if there is none.
+
+    Raises:
+        ValueError: If the table is sent but pyarrow is not installed.
+    """
+    value = function_kwargs.pop(ARROW_KEY, None)
+    if value is None:
+        return None
+    if not __pyarrow_use:
+        raise ValueError("Arrow IPC arguments need pyarrow, please install it")
+    with pyarrow.ipc.open_stream(b64decode(value)) as reader:
+        return cast_integer_columns(reader.read_all(), json_schema_props)
@@ -0,0 +1,281 @@
+"""
+Streaming JSON encoder for funix responses.
+
+Big results are not serialized all at once: the envelope is walked and written in chunks, long lists are
+encoded in slices, and DataFrames are written with `to_json` slice by slice, instead of `to_json` → `json.loads` →
+`jsonify`, which needs about three times the size of the payload.
+"""
+
+from itertools import chain
+from json import JSONEncoder
+from typing import Any, Callable, Iterator
+
+from flask import Response, current_app
+
+from funix.util.arrow import accepts_arrow, iter_arrow_json
+
+STREAM_BUFFER_SIZE = 1024 * 64
+"""
+The size (characters) of the chunks written to the response. Results smaller than this are not streamed.
+"""
+
+LIST_SLICE_SIZE = 1024
+"""
+The number of items of a long list encoded at once.
+"""
+
+LIST_WALK_SIZE = 32
+"""
+Lists up to this length are walked item by item, like the result envelopes of funix, so the big values inside them
+are written in slices too.
+"""
+
+DATAFRAME_SLICE_ROWS = 10000
+"""
+The number of rows of a DataFrame encoded at once.
+"""
+
+LOG_HEAD_SIZE = 1024
+"""
+The size (characters) of the head of a streamed response kept for the logs.
+"""
+
+
+class StreamSummary:
+    """
+    The size and the head of a streamed JSON response, for the logs, which cannot read the response before it is
+    sent. It is complete when the response is closed.
+    """
+
+    def __init__(self):
+        """
+        Initialize the StreamSummary.
+        """
+        self.head = ""
+        self.size = 0
+        self.complete = False
+
+    def watch(self, chunks: Iterator[str]) -> Iterator[str]:
+        """
+        Count the chunks as they are sent.
+
+        Parameters:
+            chunks (Iterator[str]): The chunks.
+
+        Returns:
+            Iterator[str]: The same chunks.
+        """
+        for chunk in chunks:
+            if len(self.head) < LOG_HEAD_SIZE:
+                self.head += chunk[: LOG_HEAD_SIZE - len(self.head)]
+            self.size += len(chunk)
+            yield chunk
+        self.complete = True
+
+    def to_dict(self) -> dict:
+        """
+        Get the summary for the logs.
+
+        Returns:
+            dict: The size (characters), the head, and whether the whole response was sent.
+        """
+        return {
+            "streamed": True,
+            "size": self.size,
+            "head": self.head,
+            "complete": self.complete,
+        }
+
+
+class DataFrameRecords:
+    """
+    A DataFrame to be encoded as a list of records, same as `json.loads(dataframe.to_json(orient="records"))`.
+    """
+
+    def __init__(self, dataframe: Any, rows: int = DATAFRAME_SLICE_ROWS):
+        """
+        Initialize the DataFrameRecords.
+
+        Parameters:
+            dataframe (pandas.DataFrame): The DataFrame.
+            rows (int): The number of rows encoded at once.
+        """
+        self.dataframe = dataframe
+        self.rows = rows
+
+    def __iter__(self) -> Iterator[str]:
+        yield "["
+        first = True
+        for start in range(0, len(self.dataframe), self.rows):
+            records = self.dataframe.iloc[start : start + self.rows].to_json(
+                orient="records"
+            )[1:-1]
+            if not records:
+                continue
+            if not first:
+                yield ","
+            first = False
+            yield records
+        yield "]"
+
+
+class DeferredValue(Exception):
+    """
+    Raised by the encoder of `make_encoder` when it meets a `DataFrameRecords`, so the caller encodes it by itself.
+    """
+
+
+def make_encoder(
+    default: Callable[[Any], Any] | None = None,
+    ensure_ascii: bool = True,
+    sort_keys: bool = False,
+) -> Callable[[Any], str]:
+    """
+    Make the encoder for `iter_json`, a compact `JSONEncoder` that raises `DeferredValue` for `DataFrameRecords`.
+
+    Parameters:
+        default (Callable[[Any], Any] | None): The fallback for other unsupported objects.
+        ensure_ascii (bool): Whether to escape non-ASCII characters.
+        sort_keys (bool): Whether to sort the keys of dicts.
+
+    Returns:
+        Callable[[Any], str]: The encoder.
+    """
+
+    def deferred_default(value: Any) -> Any:
+        if isinstance(value, DataFrameRecords):
+            raise DeferredValue()
+        if default is None:
+            raise TypeError(
+                f"Object of type {value.__class__.__name__} is not JSON serializable"
+            )
+        return default(value)
+
+    return JSONEncoder(
+        ensure_ascii=ensure_ascii,
+        sort_keys=sort_keys,
+        separators=(",", ":"),
+        default=deferred_default,
+    ).encode
+
+
+def iter_json(
+    value: Any, encode: Callable[[Any], str], arrow: bool = False
+) -> Iterator[str]:
+    """
+    Encode the value to JSON, chunk by chunk.
+
+    Short lists and dicts holding containers (the result envelope) are walked. Longer lists are encoded in slices of
+    `LIST_SLICE_SIZE` items by the C encoder, a slice is only walked item by item when it has a `DataFrameRecords`
+    inside.
+
+    Parameters:
+        value (Any): The value.
+        encode (Callable[[Any], str]): The encoder, see `make_encoder`.
+        arrow (bool): Whether to encode DataFrames in Arrow IPC, see `funix.util.arrow`.
+
+    Returns:
+        Iterator[str]: The JSON text.
+    """
+    if isinstance(value, DataFrameRecords):
+        yield from iter_arrow_json(value.dataframe) if arrow else value
+    elif isinstance(value, dict):
+        if not any(
+            isinstance(item, (list, tuple, dict, DataFrameRecords))
+            for item in value.values()
+        ):
+            yield encode(value)
+            return
+        yield "{"
+        for index, (key, item) in enumerate(value.items()):
+            # Encoded as a dict, so the key follows the JSON rules of the encoder: `{"key":null}` → `"key"`
+            yield ("," if index else "") + encode({key: None})[1:-6] + ":"
+            yield from iter_json(item, encode, arrow)
+        yield "}"
+    elif isinstance(value, (list, tuple)):
+        yield "["
+        if len(value) <= LIST_WALK_SIZE:
+            for index, item in enumerate(value):
+                if index:
+                    yield ","
+                yield from iter_json(item, encode, arrow)
+            yield "]"
+            return
+        for start in range(0, len(value), LIST_SLICE_SIZE):
+            items = value[start : start + LIST_SLICE_SIZE]
+            try:
+                text = encode(items)[1:-1]
+            except DeferredValue:
+                text = None
+            if text is not None:
+                if text:
+                    yield "," + text if start else text
+                continue
+            for index, item in enumerate(items):
+                if start or index:
+                    yield ","
+                yield from iter_json(item, encode, arrow)
+        yield "]"
+    else:
+        yield encode(value)
+
+
+def buffer_chunks(
+    chunks: Iterator[str], size: int = STREAM_BUFFER_SIZE
+) -> Iterator[str]:
+    """
+    Merge small chunks to chunks of about `size` characters.
+
+    Parameters:
+        chunks (Iterator[str]): The chunks.
+        size (int): The size.
+
+    Returns:
+        Iterator[str]: The merged chunks.
+    """
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield "".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def json_response(value: Any) -> Response:
+    """
+    Create the JSON response of the value, with the settings of the current app's JSON provider.
+    Small results get a normal response, big ones are streamed, with a `StreamSummary` as `funix_stream_summary` for
+    the logs. DataFrames are sent in Arrow IPC if the request asks for it.
+
+    Parameters:
+        value (Any): The value.
+
+    Returns:
+        flask.Response: The response.
+    """
+    provider = current_app.json
+    encode = make_encoder(
+        getattr(provider, "default", None),
+        getattr(provider, "ensure_ascii", True),
+        getattr(provider, "sort_keys", False),
+    )
+    arrow = accepts_arrow()
+    chunks = buffer_chunks(iter_json(value, encode, arrow))
+    first = next(chunks, "")
+    second = next(chunks, None)
+    if second is None:
+        response = Response(first, mimetype="application/json")
+    else:
+        summary = StreamSummary()
+        response = Response(
+            summary.watch(chain((first, second), chunks)), mimetype="application/json"
+        )
+        response.funix_stream_summary = summary
+    if arrow:
+        response.vary.add("Accept")
+    return response
@@ -0,0 +1,290 @@
+"""
+Stores of the rate limiter states, see `funix.decorator.limit`.
+
+The in-memory store is local to the process. The SQLite store is shared by the workers on one host, and the Redis
+store by several replicas, so a client gets the same limit whichever worker serves it, and the limits survive
+restarts. A check and its record are one atomic update of the state of the key.
+"""
+
+from json import dumps, loads
+from os import getpid
+from sqlite3 import Connection, connect
+from threading import Lock, local
+from time import time
+from typing import Any, Callable
+from urllib.parse import SplitResult, urlsplit
+
+__redis_use = False
+"""
+Whether Funix can keep the rate limits in Redis.
+"""
+
+try:
+    import redis
+
+    __redis_use = True
+except:
+    pass
+
+
+def is_redis_enabled() -> bool:
+    """
+    Whether redis is installed.
+
+    Returns:
+        bool: Whether the Redis store can be used.
+    """
+    return __redis_use
+
+
+LimitUpdate = Callable[[Any, float], tuple[Any, Any]]
+"""
+The update of a state, called with the state (None for a new or expired key) and the current `time.time`, returns the
+new state (None to delete the key) and the result of the update. The states are JSON values.
+"""
+
+
+class LimitStore:
+    """
+    Where the states of the rate limiters are kept.
+    """
+
+    def update(self, key: str, update: LimitUpdate, ttl: float) -> Any:
+        """
+        Update the state of the key atomically.
+
+        Parameters:
+            key (str): The key.
+            update (LimitUpdate): The update, it may be called more than once if another process updates the key at
+                                  the same time.
+            ttl (float): The time (seconds) the new state is kept without updates.
+
+        Returns:
+            Any: The result of the update.
+        """
+        raise NotImplementedError
+
+    def sweep(self) -> None:
+        """
+        Delete the expired states.
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """
+        Get the stats of the store.
+
+        Returns:
+            dict: The stats.
+        """
+        return {}
+
+
+class MemoryStore(LimitStore):
+    """
+    Keeps the states in the memory of the process.
+    """
+
+    def __init__(self):
+        """
+        Initialize the MemoryStore.
+        """
+        self._states: dict[str, tuple[Any, float]] = {}
+        """The states and the `time.time` they expire."""
+        self._lock = Lock()
+
+    def update(self, key: str, update: LimitUpdate, ttl: float) -> Any:
+        with self._lock:
+            now = time()
+            found = self._states.get(key)
+            state = found[0] if found is not None and found[1] > now else None
+            new_state, result = update(state, now)
+            if new_state is None:
+                self._states.pop(key, None)
+            else:
+                self._states[key] = (new_state, now + ttl)
+        return result
+
+    def sweep(self) -> None:
+        with self._lock:
+            keys = list(self._states)
+        # In batches, the updates are not blocked for the whole sweep of many keys
+        for start in range(0, len(keys), 10000):
+            with self._lock:
+                now = time()
+                for key in keys[start : start + 10000]:
+                    found = self._states.get(key)
+                    if found is not None and found[1] <= now:
+                        del self._states[key]
+
+    def stats(self) -> dict:
+        return {"keys": len(self._states)}
+
+
+class SQLiteStore(LimitStore):
+    """
+    Keeps the states in a SQLite database, shared by the processes on one host.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the SQLiteStore.
+
+        Parameters:
+            path (str): The path of the database, created if it does not exist.
+        """
+        self.path = path
+        self._local = local()
+        with self.connection as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS funix_limits "
+                "(key TEXT PRIMARY KEY, state TEXT NOT NULL, expire_at REAL NOT NULL)"
+            )
+
+    @property
+    def connection(self) -> Connection:
+        """
+        The connection of this thread, connections are not shared with other threads or forked workers.
+        """
+        if getattr(self._local, "pid", None) != getpid():
+            connection = connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.pid = getpid()
+        return self._local.connection
+
+    def update(self, key: str, update: LimitUpdate, ttl: float) -> Any:
+        connection = self.connection
+        # Takes the write lock at once, the other processes wait for the whole update
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time()
+            row = connection.execute(
+                "SELECT state FROM funix_limits WHERE key = ? AND expire_at > ?",
+                (key, now),
+            ).fetchone()
+            new_state, result = update(None if row is None else loads(row[0]), now)
+            if new_state is None:
+                connection.execute("DELETE FROM funix_limits WHERE key = ?", (key,))
+            else:
+                connection.execute(
+                    "INSERT OR REPLACE INTO funix_limits VALUES (?, ?, ?)",
+                    (key, dumps(new_state), now + ttl),
+                )
+            connection.execute("COMMIT")
+        except:
+            connection.execute("ROLLBACK")
+            raise
+        return result
+
+    def sweep(self) -> None:
+        self.connection.execute(
+            "DELETE FROM funix_limits WHERE expire_at <= ?", (time(),)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "keys": self.connection.execute(
+                "SELECT COUNT(*) FROM funix_limits"
+            ).fetchone()[0]
+        }
+
+
+class RedisStore(LimitStore):
+    """
+    Keeps the states in Redis, or any server speaking its protocol, shared by several replicas. The keys expire in
+    Redis, nothing to sweep.
+    """
+
+    def __init__(self, url: str, prefix: str = "funix:limit:", **client_options: Any):
+        """
+        Initialize the RedisStore.
+
+        Parameters:
+            url (str): The URL of the server, e.g. `redis://localhost:6379/0`.
+            prefix (str): The prefix of the keys.
+            **client_options (Any): The options of `redis.Redis.from_url`.
+
+        Raises:
+            RuntimeError: If redis is not installed.
+        """
+        if not is_redis_enabled():
+            raise RuntimeError("Install redis to keep the rate limits in Redis")
+        self.url = url
+        self.prefix = prefix
+        self.client_options = client_options
+        self._client: Any = None
+        self._client_pid: int | None = None
+
+    @property
+    def client(self) -> Any:
+        """
+        The Redis client of this process, clients are not shared with forked workers.
+        """
+        if self._client_pid != getpid():
+            self._client = redis.Redis.from_url(self.url, **self.client_options)
+            self._client_pid = getpid()
+        return self._client
+
+    def update(self, key: str, update: LimitUpdate, ttl: float) -> Any:
+        key = self.prefix + key
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # The transaction fails if another process changes the key after `WATCH`, then it is retried
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    new_state, result = update(
+                        None if raw is None else loads(raw), time()
+                    )
+                    pipe.multi()
+                    if new_state is None:
+                        pipe.delete(key)
+                    else:
+                        pipe.set(key, dumps(new_state), px=max(int(ttl * 1000), 1))
+                    pipe.execute()
+                    return result
+                except redis.WatchError:
+                    continue
+
+    def sweep(self) -> None:
+        pass
+
+
+def get_sqlite_path(parsed: SplitResult) -> str:
+    """
+    Get the path of the database from a `sqlite://` URL, `sqlite:///limits.db` is relative to the working
+    directory and `sqlite:////var/lib/funix/limits.db` is absolute, as in SQLAlchemy.
+
+    Parameters:
+        parsed (SplitResult): The parsed URL.
+
+    Returns:
+        str: The path.
+    """
+    path = parsed.netloc + parsed.path
+    return path[1:] if parsed.netloc == "" and path.startswith("/") else path
+
+
+def parse_limit_store(url: str) -> LimitStore:
+    """
+    Parse the store from its URL.
+
+    Parameters:
+        url (str): `memory`, `sqlite:///path/to/file.db` (relative to the working directory, `sqlite:////` for an
+                   absolute path, as in SQLAlchemy), or `redis://host:port/db` (also `rediss://` and `unix://`).
+
+    Returns:
+        LimitStore: The store.
+
+    Raises:
+        ValueError: If the URL is not supported.
+    """
+    if url in ("", "memory", "memory://"):
+        return MemoryStore()
+    parsed = urlsplit(url)
+    if parsed.scheme == "sqlite":
+        return SQLiteStore(get_sqlite_path(parsed))
+    if parsed.scheme in ("redis", "rediss", "unix"):
+        return RedisStore(url)
+    raise ValueError(f"Unsupported limit store: {url}")
@@ -0,0 +1,98 @@
+"""
+Shared asyncio event loop for funix.
+
+`async def` functions and async generators decorated by funix are not run with `asyncio.run` per request, they are
+scheduled on one event loop running in a background thread, so the I/O of all in-flight calls is multiplexed.
+"""
+
+from asyncio import AbstractEventLoop, new_event_loop, run_coroutine_threadsafe
+from contextvars import Context, copy_context
+from os import getpid
+from threading import Lock, Thread
+from typing import Any, AsyncGenerator, Awaitable, Coroutine, Generator
+
+__loop: AbstractEventLoop | None = None
+"""
+The shared event loop.
+"""
+
+__loop_pid: int | None = None
+"""
+The process that started the loop. Threads do not survive `fork` (gunicorn workers), so the loop is restarted in
+the child.
+"""
+
+__loop_lock = Lock()
+"""
+Lock for starting the loop.
+"""
+
+
+def get_event_loop() -> AbstractEventLoop:
+    """
+    Get the shared event loop, start it in a daemon thread if needed.
+
+    Returns:
+        AbstractEventLoop: The shared event loop.
+    """
+    global __loop, __loop_pid
+    with __loop_lock:
+        if __loop is None or __loop_pid != getpid():
+            __loop = new_event_loop()
+            __loop_pid = getpid()
+            Thread(
+                target=__loop.run_forever, name="funix-event-loop", daemon=True
+            ).start()
+        return __loop
+
+
+async def __with_context(awaitable: Awaitable, context: Context) -> Any:
+    """
+    Await in the context variables of the caller. Flask's `request` and `session` are context variables,
+    so user functions can still use them (and `funix.session`) on the loop thread.
+
+    Parameters:
+        awaitable (Awaitable): The awaitable.
+        context (Context): The context of the caller.
+
+    Returns:
+        Any: The result of the awaitable.
+    """
+    for variable, value in context.items():
+        variable.set(value)
+    return await awaitable
+
+
+def run_coroutine(coroutine: Coroutine) -> Any:
+    """
+    Run the coroutine on the shared event loop and wait for the result.
+
+    Parameters:
+        coroutine (Coroutine): The coroutine.
+
+    Returns:
+        Any: The result of the coroutine.
+    """
+    return run_coroutine_threadsafe(
+        __with_context(coroutine, copy_context()), get_event_loop()
+    ).result()
+
+
+def iterate_async_generator(async_generator: AsyncGenerator) -> Generator:
+    """
+    Iterate the async generator on the shared event loop, the results are yielded to the caller's thread.
+
+    Parameters:
+        async_generator (AsyncGenerator): The async generator.
+
+    Returns:
+        Generator: The results.
+    """
+    try:
+        while True:
+            try:
+                yield run_coroutine(async_generator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        run_coroutine(async_generator.aclose())
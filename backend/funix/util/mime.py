@@ -0,0 +1,92 @@
+"""
+MIME type sniffing for funix, for the files served without a name.
+"""
+
+from codecs import getincrementaldecoder
+from mimetypes import guess_type
+
+SNIFF_SIZE = 512
+"""
+The number of leading bytes read to sniff the MIME type.
+"""
+
+__signatures: list[tuple[int, bytes, str]] = [
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (8, b"WEBP", "image/webp"),
+    (0, b"BM", "image/bmp"),
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"\xff\xfb", "audio/mpeg"),
+    (0, b"\xff\xf3", "audio/mpeg"),
+    (0, b"\xff\xf2", "audio/mpeg"),
+    (8, b"WAVE", "audio/wav"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b"fLaC", "audio/flac"),
+    (8, b"M4A ", "audio/mp4"),
+    (4, b"ftyp", "video/mp4"),
+    (0, b"\x1aE\xdf\xa3", "video/webm"),
+    (8, b"AVI ", "video/x-msvideo"),
+    (0, b"PK\x03\x04", "application/zip"),
+]
+"""
+The magic numbers, `(offset, bytes, MIME type)`, the first match wins.
+"""
+
+
+def sniff_mimetype(head: bytes) -> str:
+    """
+    Guess the MIME type from the leading bytes of the content.
+
+    Parameters:
+        head (bytes): The leading bytes, see `SNIFF_SIZE`.
+
+    Returns:
+        str: The MIME type, `text/plain` for UTF-8 text and `application/octet-stream` for unknown data. SVG images
+             are served with a `sandbox` CSP by the file service, they may have scripts.
+
+    Examples / Doctest:
+        >>> assert sniff_mimetype(b"\\x89PNG\\r\\n\\x1a\\n") == "image/png"
+        >>> assert sniff_mimetype(b"funix") == "text/plain; charset=utf-8"
+        >>> assert sniff_mimetype(b'<?xml version="1.0"?><svg></svg>') == "image/svg+xml"
+    """
+    for offset, magic, mimetype in __signatures:
+        if head[offset : offset + len(magic)] == magic:
+            return mimetype
+    if b"\x00" not in head:
+        try:
+            # The sniffed bytes may end in the middle of a character
+            getincrementaldecoder("utf-8")().decode(head, len(head) < SNIFF_SIZE)
+            if head.lstrip().startswith((b"<?xml", b"<svg", b"<!DOCTYPE svg")) and (
+                b"<svg" in head or b"<!DOCTYPE svg" in head
+            ):
+                return "image/svg+xml"
+            return "text/plain; charset=utf-8"
+        except UnicodeDecodeError:
+            pass
+    return "application/octet-stream"
+
+
+def get_mimetype(content: bytes | str, named: bool = True) -> str:
+    """
+    Get the MIME type of the content or file.
+
+    Parameters:
+        content (bytes | str): The content, or the path of the file.
+        named (bool): Whether the path has a meaningful name, its extension is tried before sniffing.
+
+    Returns:
+        str: The MIME type.
+    """
+    if isinstance(content, str):
+        if named:
+            mimetype = guess_type(content)[0]
+            if mimetype is not None:
+                return mimetype
+        with open(content, "rb") as f:
+            head = f.read(SNIFF_SIZE)
+    else:
+        head = content[:SNIFF_SIZE]
+    return sniff_mimetype(bytes(head))
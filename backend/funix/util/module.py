@@ -6,6 +6,7 @@ from importlib.util import module_from_spec, spec_from_file_location
 from inspect import getsourcefile, isclass, isfunction
 from os.path import basename
 from string import ascii_letters, digits
+from sys import modules
 from types import ModuleType
 from typing import Any, Optional
 from uuid import uuid4
@@ -53,6 +54,9 @@ def import_module_from_file(path: str, need_name: bool) -> ModuleType:
         name = uuid4().hex
     spec = spec_from_file_location(name, path)
     module = module_from_spec(spec)
+    if name not in modules:
+        # So the functions can be pickled, e.g. for `executor="process"`
+        modules[name] = module
     spec.loader.exec_module(module)
     return module
 
@@ -0,0 +1,121 @@
+"""
+Shared scheduler for delayed calls in funix, e.g. the expiry of file links and result handles.
+
+All calls are kept in one heap and run by one daemon thread, instead of one sleeping `threading.Timer` thread per
+call. The calls should be short, they run one after another. A call can be cancelled through the handle returned by
+`call_later`.
+"""
+
+from heapq import heappop, heappush
+from itertools import count
+from os import getpid
+from threading import Condition, Thread
+from time import monotonic
+from traceback import print_exc
+from typing import Any, Callable
+
+
+class ScheduledCall:
+    """
+    A call waiting in the scheduler, returned by `call_later`.
+    """
+
+    __slots__ = ("function", "args", "cancelled")
+
+    def __init__(self, function: Callable[..., Any], args: tuple):
+        """
+        Initialize the ScheduledCall.
+
+        Parameters:
+            function (Callable[..., Any]): The function.
+            args (tuple): The arguments.
+        """
+        self.function = function
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """
+        Cancel the call, it is dropped when it is due. Nothing happens if it already ran.
+        """
+        self.cancelled = True
+
+
+__heap: list[tuple[float, int, ScheduledCall]] = []
+"""
+The pending calls, `(time.monotonic time, sequence, call)`.
+"""
+
+__counter = count()
+"""
+The sequence of the calls, keeps calls with the same time in order and never compares the functions.
+"""
+
+__condition = Condition()
+"""
+Condition for `__heap`, notified when an earlier call is added.
+"""
+
+__thread_pid: int | None = None
+"""
+The process that started the thread. Threads do not survive `fork` (gunicorn workers), so the thread is restarted
+in the child.
+"""
+
+
+def __run() -> None:
+    """
+    Run the calls when they are due.
+    """
+    while True:
+        with __condition:
+            while True:
+                if not __heap:
+                    __condition.wait()
+                    continue
+                delay = __heap[0][0] - monotonic()
+                if delay <= 0:
+                    _, _, call = heappop(__heap)
+                    if call.cancelled:
+                        continue
+                    break
+                __condition.wait(delay)
+        try:
+            call.function(*call.args)
+        except:
+            print_exc()
+
+
+def call_later(delay: float, function: Callable[..., Any], *args: Any) -> ScheduledCall:
+    """
+    Call the function after the delay, in the scheduler thread.
+
+    Parameters:
+        delay (float): The delay (seconds).
+        function (Callable[..., Any]): The function.
+        *args (Any): The arguments.
+
+    Returns:
+        ScheduledCall: The handle, for cancelling the call.
+    """
+    global __thread_pid
+    with __condition:
+        if __thread_pid != getpid():
+            __thread_pid = getpid()
+            Thread(target=__run, name="funix-scheduler", daemon=True).start()
+        call = ScheduledCall(function, args)
+        entry = (monotonic() + delay, next(__counter), call)
+        heappush(__heap, entry)
+        if __heap[0] is entry:
+            __condition.notify()
+    return call
+
+
+def get_pending_count() -> int:
+    """
+    Get the number of pending calls.
+
+    Returns:
+        int: The number of pending calls, the cancelled ones are counted until they are due.
+    """
+    return len(__heap)
@@ -0,0 +1,439 @@
+"""
+Stores of the session variables, the per-browser globals of `funix.session`.
+
+The in-memory store keeps the variables as they are, local to the process, and evicts the browsers idle for too long
+and the least recently used ones over its memory limit. The SQLite and Redis stores keep them pickled, shared by the
+workers on one host or by several replicas, and survive restarts, the variables must be picklable.
+
+A request saves only the variables it changed over the ones stored, so the concurrent requests of a browser changing
+different variables do not lose each other's changes.
+"""
+
+from collections import OrderedDict
+from os import getpid
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from sqlite3 import Connection, connect
+from sys import getsizeof
+from threading import Lock, local
+from time import time
+from typing import Any
+from urllib.parse import urlsplit
+
+from funix.config.switch import GlobalSwitchOption
+from funix.util.limit_store import get_sqlite_path, is_redis_enabled
+
+Variables = dict[str, Any]
+"""
+The session variables of a browser, name to value.
+"""
+
+
+def get_variables_size(value: Any, depth: int = 4) -> int:
+    """
+    Estimate the memory size of the variables, the containers are followed up to the depth.
+
+    Parameters:
+        value (Any): The value.
+        depth (int): How deep the containers and objects are followed.
+
+    Returns:
+        int: The size (bytes).
+    """
+    size = getsizeof(value)
+    if depth == 0:
+        return size
+    if isinstance(value, dict):
+        return size + sum(
+            get_variables_size(key, depth - 1) + get_variables_size(item, depth - 1)
+            for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(get_variables_size(item, depth - 1) for item in value)
+    if hasattr(value, "__dict__") and not isinstance(value, type):
+        return size + get_variables_size(vars(value), depth - 1)
+    return size
+
+
+def merge_variables(
+    stored: Variables | None, variables: Variables, names: set[str]
+) -> Variables:
+    """
+    Merge the variables changed by a request into the stored ones.
+
+    Parameters:
+        stored (Variables | None): The stored variables, maybe changed by other requests since they were loaded.
+        variables (Variables): The variables of the request.
+        names (set[str]): The names of the variables changed by the request.
+
+    Returns:
+        Variables: The merged variables.
+    """
+    merged = dict(stored or {})
+    for name in names:
+        if name in variables:
+            merged[name] = variables[name]
+        else:
+            merged.pop(name, None)
+    return merged
+
+
+class SessionStore:
+    """
+    Where the session variables are kept.
+    """
+
+    def load(self, user_id: str) -> Variables | None:
+        """
+        Load the variables of the browser, they are saved back with `save` at the end of the request.
+
+        Parameters:
+            user_id (str): The browser, `__funix_id` in the session.
+
+        Returns:
+            Variables | None: The variables, None for a new, expired or evicted browser.
+        """
+        raise NotImplementedError
+
+    def save(
+        self, user_id: str, variables: Variables, names: set[str] | None = None
+    ) -> None:
+        """
+        Save the variables of the browser, it expires after `GlobalSwitchOption.SESSION_EXPIRE_TIME` without
+        requests.
+
+        Parameters:
+            user_id (str): The browser.
+            variables (Variables): The variables.
+            names (set[str] | None): The names of the variables changed, only they are written over the stored
+                                     variables, atomically. None to replace all.
+        """
+        raise NotImplementedError
+
+    def touch(self, user_id: str) -> None:
+        """
+        Keep the variables of the browser from expiring, after a request not changing them.
+
+        Parameters:
+            user_id (str): The browser.
+        """
+        raise NotImplementedError
+
+    def delete(self, user_id: str) -> None:
+        """
+        Delete the variables of the browser.
+
+        Parameters:
+            user_id (str): The browser.
+        """
+        raise NotImplementedError
+
+    def sweep(self) -> None:
+        """
+        Delete the expired variables.
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """
+        Get the stats of the store.
+
+        Returns:
+            dict: The stats.
+        """
+        return {}
+
+
+def get_expire_at(now: float) -> float:
+    """
+    Get when variables saved now expire.
+
+    Parameters:
+        now (float): The current `time.time`.
+
+    Returns:
+        float: The `time.time` they expire, infinity if they never do.
+    """
+    if GlobalSwitchOption.SESSION_EXPIRE_TIME == -1:
+        return float("inf")
+    return now + GlobalSwitchOption.SESSION_EXPIRE_TIME
+
+
+class MemoryStore(SessionStore):
+    """
+    Keeps the variables in the memory of the process, the requests of a browser share the same objects.
+    """
+
+    def __init__(self):
+        """
+        Initialize the MemoryStore.
+        """
+        self._variables: OrderedDict[str, tuple[Variables, float, int]] = OrderedDict()
+        """The variables, the `time.time` they expire and their estimated size, in least recently used order."""
+        self._size = 0
+        self._evicted = 0
+        self._lock = Lock()
+
+    def load(self, user_id: str) -> Variables | None:
+        now = time()
+        with self._lock:
+            found = self._variables.get(user_id)
+            if found is None or found[1] <= now:
+                return None
+            # Used now, it expires later and is the most recently used
+            self._variables[user_id] = (found[0], get_expire_at(now), found[2])
+            self._variables.move_to_end(user_id)
+            return found[0]
+
+    def save(
+        self, user_id: str, variables: Variables, names: set[str] | None = None
+    ) -> None:
+        size = get_variables_size(variables)
+        now = time()
+        with self._lock:
+            found = self._variables.pop(user_id, None)
+            if found is not None:
+                self._size -= found[2]
+                # The requests share the loaded variables, unless another one of a new browser saved first
+                if names is not None and found[0] is not variables and found[1] > now:
+                    variables = merge_variables(found[0], variables, names)
+                    size = max(size, found[2])
+            self._variables[user_id] = (variables, get_expire_at(now), size)
+            self._size += size
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """
+        Evict the expired variables, and the least recently used ones over the memory limit, with the lock held.
+        The variables are in expire order too, the oldest are first.
+
+        Parameters:
+            now (float): The current `time.time`.
+        """
+        limit = GlobalSwitchOption.SESSION_MEMORY_LIMIT
+        while self._variables:
+            user_id, (_, expire_at, size) = next(iter(self._variables.items()))
+            if expire_at > now and (limit == -1 or self._size <= limit):
+                break
+            del self._variables[user_id]
+            self._size -= size
+            if expire_at > now:
+                self._evicted += 1
+
+    def touch(self, user_id: str) -> None:
+        # Done by `load`
+        pass
+
+    def delete(self, user_id: str) -> None:
+        with self._lock:
+            found = self._variables.pop(user_id, None)
+            if found is not None:
+                self._size -= found[2]
+
+    def sweep(self) -> None:
+        with self._lock:
+            self._evict(time())
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._variables),
+            "bytes": self._size,
+            "evicted": self._evicted,
+        }
+
+
+class SQLiteStore(SessionStore):
+    """
+    Keeps the variables pickled in a SQLite database, shared by the processes on one host.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the SQLiteStore.
+
+        Parameters:
+            path (str): The path of the database, created if it does not exist.
+        """
+        self.path = path
+        self._local = local()
+        with self.connection as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS funix_sessions "
+                "(user_id TEXT PRIMARY KEY, variables BLOB NOT NULL, expire_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS funix_sessions_expire_at "
+                "ON funix_sessions (expire_at)"
+            )
+
+    @property
+    def connection(self) -> Connection:
+        """
+        The connection of this thread, connections are not shared with other threads or forked workers.
+        """
+        if getattr(self._local, "pid", None) != getpid():
+            connection = connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.pid = getpid()
+        return self._local.connection
+
+    def load(self, user_id: str) -> Variables | None:
+        row = self.connection.execute(
+            "SELECT variables FROM funix_sessions WHERE user_id = ? AND expire_at > ?",
+            (user_id, time()),
+        ).fetchone()
+        return None if row is None else loads(row[0])
+
+    def save(
+        self, user_id: str, variables: Variables, names: set[str] | None = None
+    ) -> None:
+        connection = self.connection
+        # Takes the write lock at once, the other requests wait for the whole merge
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time()
+            if names is not None:
+                row = connection.execute(
+                    "SELECT variables FROM funix_sessions WHERE user_id = ? AND expire_at > ?",
+                    (user_id, now),
+                ).fetchone()
+                variables = merge_variables(
+                    None if row is None else loads(row[0]), variables, names
+                )
+            connection.execute(
+                "INSERT OR REPLACE INTO funix_sessions VALUES (?, ?, ?)",
+                (user_id, dumps(variables, HIGHEST_PROTOCOL), get_expire_at(now)),
+            )
+            connection.execute("COMMIT")
+        except:
+            connection.execute("ROLLBACK")
+            raise
+
+    def touch(self, user_id: str) -> None:
+        now = time()
+        self.connection.execute(
+            "UPDATE funix_sessions SET expire_at = ? WHERE user_id = ? AND expire_at > ?",
+            (get_expire_at(now), user_id, now),
+        )
+
+    def delete(self, user_id: str) -> None:
+        self.connection.execute(
+            "DELETE FROM funix_sessions WHERE user_id = ?", (user_id,)
+        )
+
+    def sweep(self) -> None:
+        self.connection.execute(
+            "DELETE FROM funix_sessions WHERE expire_at <= ?", (time(),)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "sessions": self.connection.execute(
+                "SELECT COUNT(*) FROM funix_sessions"
+            ).fetchone()[0]
+        }
+
+
+class RedisStore(SessionStore):
+    """
+    Keeps the variables pickled in Redis, or any server speaking its protocol, shared by several replicas. The keys
+    expire in Redis, nothing to sweep.
+    """
+
+    def __init__(self, url: str, prefix: str = "funix:session:", **client_options: Any):
+        """
+        Initialize the RedisStore.
+
+        Parameters:
+            url (str): The URL of the server, e.g. `redis://localhost:6379/0`.
+            prefix (str): The prefix of the keys.
+            **client_options (Any): The options of `redis.Redis.from_url`.
+
+        Raises:
+            RuntimeError: If redis is not installed.
+        """
+        if not is_redis_enabled():
+            raise RuntimeError("Install redis to keep the session variables in Redis")
+        self.url = url
+        self.prefix = prefix
+        self.client_options = client_options
+        self._client: Any = None
+        self._client_pid: int | None = None
+
+    @property
+    def client(self) -> Any:
+        """
+        The Redis client of this process, clients are not shared with forked workers.
+        """
+        if self._client_pid != getpid():
+            import redis
+
+            self._client = redis.Redis.from_url(self.url, **self.client_options)
+            self._client_pid = getpid()
+        return self._client
+
+    def load(self, user_id: str) -> Variables | None:
+        raw = self.client.get(self.prefix + user_id)
+        return None if raw is None else loads(raw)
+
+    def save(
+        self, user_id: str, variables: Variables, names: set[str] | None = None
+    ) -> None:
+        import redis
+
+        expire_time = GlobalSwitchOption.SESSION_EXPIRE_TIME
+        ex = None if expire_time == -1 else expire_time
+        key = self.prefix + user_id
+        if names is None:
+            self.client.set(key, dumps(variables, HIGHEST_PROTOCOL), ex=ex)
+            return
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # The transaction fails if another request changes the key after `WATCH`, then it is retried
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    merged = merge_variables(
+                        None if raw is None else loads(raw), variables, names
+                    )
+                    pipe.multi()
+                    pipe.set(key, dumps(merged, HIGHEST_PROTOCOL), ex=ex)
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
+
+    def touch(self, user_id: str) -> None:
+        expire_time = GlobalSwitchOption.SESSION_EXPIRE_TIME
+        if expire_time != -1:
+            self.client.expire(self.prefix + user_id, expire_time)
+
+    def delete(self, user_id: str) -> None:
+        self.client.delete(self.prefix + user_id)
+
+    def sweep(self) -> None:
+        pass
+
+
+def parse_session_store(url: str) -> SessionStore:
+    """
+    Parse the store from its URL.
+
+    Parameters:
+        url (str): `memory`, `sqlite:///path/to/file.db` (relative to the working directory, `sqlite:////` for an
+                   absolute path, as in SQLAlchemy), or `redis://host:port/db` (also `rediss://` and `unix://`).
+
+    Returns:
+        SessionStore: The store.
+
+    Raises:
+        ValueError: If the URL is not supported.
+    """
+    if url in ("", "memory", "memory://"):
+        return MemoryStore()
+    parsed = urlsplit(url)
+    if parsed.scheme == "sqlite":
+        return SQLiteStore(get_sqlite_path(parsed))
+    if parsed.scheme in ("redis", "rediss", "unix"):
+        return RedisStore(url)
+    raise ValueError(f"Unsupported session store: {url}")
@@ -0,0 +1,598 @@
+"""
+Storage backends of the files returned by funix functions, see `funix.decorator.file`.
+
+The content is stored by its SHA-256 hex digest. The in-memory storage is local to the process, the local directory
+and S3-compatible storages can be shared by several replicas, and survive restarts.
+"""
+
+from collections import OrderedDict
+from io import FileIO, RawIOBase
+from os import fstat, getpid, listdir, remove, replace, stat, utime
+from os.path import join
+from threading import Lock
+from time import time
+from typing import Any, BinaryIO
+from urllib.parse import parse_qsl, urlsplit
+from uuid import uuid4
+
+from funix.config.switch import GlobalSwitchOption
+from funix.util.file import create_safe_tempdir
+
+__boto3_use = False
+"""
+Whether Funix can store files in S3-compatible object storage.
+"""
+
+try:
+    import boto3
+
+    __boto3_use = True
+except:
+    pass
+
+
+def is_s3_enabled() -> bool:
+    """
+    Whether boto3 is installed.
+
+    Returns:
+        bool: Whether the S3 storage can be used.
+    """
+    return __boto3_use
+
+
+StoredFile = tuple[BinaryIO, int]
+"""
+An opened stored file, the readable and seekable file object and its size.
+"""
+
+
+Buffer = bytes | memoryview
+"""
+The content of a file, bytes or a flat memoryview of a buffer returned by a function (e.g. a numpy array).
+"""
+
+
+def to_buffer(value: Any) -> Buffer | None:
+    """
+    Get the content of a bytes-like value, without copying it if it is read-only.
+
+    Parameters:
+        value (Any): The value, e.g. bytes, bytearray, memoryview, numpy.ndarray.
+
+    Returns:
+        Buffer | None: The bytes, or a flat memoryview of a read-only value, None if the value is not bytes-like.
+    """
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return None
+    try:
+        view = memoryview(value)
+    except TypeError:
+        return None
+    if view.readonly and view.c_contiguous:
+        return view.cast("B")
+    # Writable values (e.g. numpy arrays, bytearray) may be changed or resized after they are returned, the content
+    # is kept by its digest, and strided views (e.g. numpy slices) cannot be flattened without a copy
+    with view:
+        return view.tobytes()
+
+
+class BufferFile(RawIOBase):
+    """
+    A read-only file object over a buffer, it never copies the whole buffer.
+    """
+
+    def __init__(self, buffer: Buffer):
+        """
+        Initialize the BufferFile.
+
+        Parameters:
+            buffer (Buffer): The buffer.
+        """
+        super().__init__()
+        self._view = memoryview(buffer)
+        self.size = len(self._view)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = (0, self._position, self.size)[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.size if size < 0 else min(self._position + size, self.size)
+        # One copy for the bytes WSGI needs, not two through `readinto`
+        data = self._view[self._position : max(end, self._position)].tobytes()
+        self._position += len(data)
+        return data
+
+    def readinto(self, buffer: Any) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+class FileStorage:
+    """
+    Where the content of the returned files is kept, by its SHA-256 hex digest.
+    """
+
+    shared: bool = False
+    """Whether other processes can read the files, then the digest is the file id and any replica serves it."""
+
+    def put(self, key: str, content: Buffer) -> None:
+        """
+        Store the content, or only renew it if it is already stored.
+
+        Parameters:
+            key (str): The SHA-256 hex digest of the content.
+            content (Buffer): The content, must not change while it is stored.
+        """
+        raise NotImplementedError
+
+    def touch(self, key: str) -> bool:
+        """
+        Renew the modification time of the stored content.
+
+        Parameters:
+            key (str): The SHA-256 hex digest of the content.
+
+        Returns:
+            bool: Whether the content is stored.
+        """
+        raise NotImplementedError
+
+    def open(self, key: str) -> StoredFile | None:
+        """
+        Open the stored content.
+
+        Parameters:
+            key (str): The SHA-256 hex digest of the content.
+
+        Returns:
+            StoredFile | None: The file object and the size, None if not stored.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str, before: float | None = None) -> None:
+        """
+        Delete the stored content.
+
+        Parameters:
+            key (str): The SHA-256 hex digest of the content.
+            before (float | None): Only delete it if it was not renewed after this `time.time`, None for always.
+        """
+        raise NotImplementedError
+
+    def sweep(self, before: float) -> None:
+        """
+        Delete the contents not renewed after the time, e.g. left by a process that exited.
+
+        Parameters:
+            before (float): The `time.time`.
+        """
+
+    def get_path(self, key: str) -> str | None:
+        """
+        Get the path of the stored content on the local disk.
+
+        Parameters:
+            key (str): The SHA-256 hex digest of the content.
+
+        Returns:
+            str | None: The path, None if it is not on the local disk.
+        """
+        return None
+
+    def stats(self) -> dict:
+        """
+        Get the stats of the storage, for `/__funix/metrics`.
+
+        Returns:
+            dict: The stats.
+        """
+        return {}
+
+
+class MemoryStorage(FileStorage):
+    """
+    Keep the files in memory. Files bigger than `GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP` are written to temp
+    files, and when the files in memory exceed `GlobalSwitchOption.FILE_MEMORY_LIMIT`, the least recently served ones
+    are moved to temp files.
+    """
+
+    def __init__(self):
+        """
+        Initialize the MemoryStorage.
+        """
+        self._lock = Lock()
+        self._resident: OrderedDict[str, Buffer] = OrderedDict()
+        """The contents in memory, the least recently served first."""
+        self._spilled: dict[str, tuple[str, int]] = {}
+        """The contents in temp files, value is the path and the size."""
+        self._touched: dict[str, float] = {}
+        """The `time.time` each content was stored or renewed."""
+        self._spilling: set[str] = set()
+        """The contents being written to temp files."""
+        self._temp_dir: str | None = None
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "resident_bytes": 0,
+            "spilled_bytes": 0,
+            "spilled": 0,
+        }
+        """Files served from memory (hits) and from temp files (misses), the bytes in memory and in temp files, and
+        the number of files moved to temp files because of `GlobalSwitchOption.FILE_MEMORY_LIMIT`."""
+
+    def _write_temp(self, content: Buffer) -> str:
+        """
+        Write the content to a new temp file. Every file gets its own name, so a deleted file can be removed while
+        the same content is written again.
+
+        Parameters:
+            content (Buffer): The content.
+
+        Returns:
+            str: The path.
+        """
+        with self._lock:
+            if self._temp_dir is None:
+                self._temp_dir = create_safe_tempdir()
+        path = join(self._temp_dir, uuid4().hex)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def _spill(self) -> None:
+        """
+        Move the least recently served contents to temp files, until the memory is within
+        `GlobalSwitchOption.FILE_MEMORY_LIMIT`.
+        """
+        limit = GlobalSwitchOption.FILE_MEMORY_LIMIT
+        if limit == -1:
+            return
+        victims = []
+        with self._lock:
+            excess = self._stats["resident_bytes"] - limit
+            for key, content in self._resident.items():
+                if excess <= 0:
+                    break
+                excess -= len(content)
+                if key not in self._spilling:
+                    self._spilling.add(key)
+                    victims.append((key, content))
+        # Written outside the lock, the contents are served from memory until they are moved
+        for key, content in victims:
+            path = self._write_temp(content)
+            with self._lock:
+                self._spilling.discard(key)
+                if key in self._resident:
+                    del self._resident[key]
+                    self._spilled[key] = (path, len(content))
+                    self._stats["resident_bytes"] -= len(content)
+                    self._stats["spilled_bytes"] += len(content)
+                    self._stats["spilled"] += 1
+                    continue
+            # Deleted while writing
+            remove(path)
+
+    def put(self, key: str, content: Buffer) -> None:
+        path = None
+        if (
+            GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP != -1
+            and len(content) >= GlobalSwitchOption.BIGGER_DATA_SAVE_TO_TEMP
+        ):
+            path = self._write_temp(content)
+        with self._lock:
+            exists = key in self._touched
+            self._touched[key] = time()
+            if not exists:
+                if path is None:
+                    self._resident[key] = content
+                    self._stats["resident_bytes"] += len(content)
+                else:
+                    self._spilled[key] = (path, len(content))
+                    self._stats["spilled_bytes"] += len(content)
+        if exists:
+            # Stored by another thread in the meantime
+            if path is not None:
+                remove(path)
+        elif path is None:
+            self._spill()
+
+    def touch(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._touched:
+                return False
+            self._touched[key] = time()
+            return True
+
+    def open(self, key: str) -> StoredFile | None:
+        with self._lock:
+            content = self._resident.get(key)
+            if content is not None:
+                self._resident.move_to_end(key)
+                self._stats["hits"] += 1
+                return BufferFile(content), len(content)
+            spilled = self._spilled.get(key)
+            if spilled is None:
+                return None
+            self._stats["misses"] += 1
+        try:
+            # Unbuffered, so servers with `wsgi.file_wrapper` can `sendfile` from its position
+            return FileIO(spilled[0]), spilled[1]
+        except FileNotFoundError:
+            # Deleted in the meantime
+            return None
+
+    def delete(self, key: str, before: float | None = None) -> None:
+        with self._lock:
+            touched = self._touched.get(key)
+            if touched is None or (before is not None and touched > before):
+                return
+            del self._touched[key]
+            content = self._resident.pop(key, None)
+            if content is not None:
+                self._stats["resident_bytes"] -= len(content)
+            spilled = self._spilled.pop(key, None)
+            if spilled is not None:
+                self._stats["spilled_bytes"] -= spilled[1]
+        if spilled is not None:
+            try:
+                remove(spilled[0])
+            except OSError:
+                pass
+
+    def get_path(self, key: str) -> str | None:
+        spilled = self._spilled.get(key)
+        return None if spilled is None else spilled[0]
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        served = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / served if served else None
+        return stats
+
+
+class LocalStorage(FileStorage):
+    """
+    Keep the files in a local directory. They are opened unbuffered, so servers with `wsgi.file_wrapper` (gunicorn)
+    send them with `sendfile`. The directory can be shared by the replicas on a host or on a network file system, and
+    survives restarts.
+    """
+
+    shared = True
+
+    def __init__(self, directory: str):
+        """
+        Initialize the LocalStorage.
+
+        Parameters:
+            directory (str): The directory, must exist.
+        """
+        self.directory = directory
+
+    def put(self, key: str, content: Buffer) -> None:
+        path = join(self.directory, key)
+        # Readers never see a partly written file
+        temp_path = f"{path}.{uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(content)
+        replace(temp_path, path)
+
+    def touch(self, key: str) -> bool:
+        try:
+            utime(join(self.directory, key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def open(self, key: str) -> StoredFile | None:
+        try:
+            file = FileIO(join(self.directory, key))
+        except FileNotFoundError:
+            return None
+        return file, fstat(file.fileno()).st_size
+
+    def delete(self, key: str, before: float | None = None) -> None:
+        path = join(self.directory, key)
+        try:
+            if before is None or stat(path).st_mtime <= before:
+                remove(path)
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, before: float) -> None:
+        for name in listdir(self.directory):
+            if len(name) == 64:
+                self.delete(name, before)
+
+    def get_path(self, key: str) -> str | None:
+        return join(self.directory, key)
+
+
+class S3File(RawIOBase):
+    """
+    A read-only file object over an S3 object, reads are ranged GET requests from the current position.
+    """
+
+    def __init__(self, client: Any, bucket: str, key: str, size: int):
+        """
+        Initialize the S3File.
+
+        Parameters:
+            client (botocore.client.S3): The S3 client.
+            bucket (str): The bucket.
+            key (str): The object key.
+            size (int): The object size.
+        """
+        super().__init__()
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self.size = size
+        self._position = 0
+        self._body: Any = None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = (0, self._position, self.size)[whence]
+        position = max(base + offset, 0)
+        if position != self._position and self._body is not None:
+            self._body.close()
+            self._body = None
+        self._position = position
+        return position
+
+    def readinto(self, buffer: Any) -> int:
+        if self._position >= self.size:
+            return 0
+        if self._body is None:
+            self._body = self._client.get_object(
+                Bucket=self._bucket, Key=self._key, Range=f"bytes={self._position}-"
+            )["Body"]
+        data = self._body.read(len(buffer))
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def close(self) -> None:
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+        super().close()
+
+
+class S3Storage(FileStorage):
+    """
+    Keep the files in an S3-compatible object storage (AWS S3, MinIO, ...). The credentials are read by boto3, e.g.
+    from `AWS_ACCESS_KEY_ID` and `AWS_SECRET_ACCESS_KEY`. Use a lifecycle rule of the bucket to delete the files left
+    by processes that exited.
+    """
+
+    shared = True
+
+    def __init__(self, bucket: str, prefix: str = "", **client_options: Any):
+        """
+        Initialize the S3Storage.
+
+        Parameters:
+            bucket (str): The bucket.
+            prefix (str): The prefix of the object keys.
+            **client_options (Any): The options of `boto3.client`, e.g. `endpoint_url` and `region_name`.
+
+        Raises:
+            ValueError: If boto3 is not installed.
+        """
+        if not is_s3_enabled():
+            raise ValueError(
+                "The S3 storage needs boto3, install it with `pip install funix[s3]`"
+            )
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client_options = client_options
+        self._client: Any = None
+        self._client_pid: int | None = None
+
+    @property
+    def client(self) -> Any:
+        """
+        The S3 client of this process, clients are not shared with forked workers.
+        """
+        if self._client_pid != getpid():
+            self._client = boto3.client("s3", **self.client_options)
+            self._client_pid = getpid()
+        return self._client
+
+    def _head(self, key: str) -> dict | None:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self.client.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def put(self, key: str, content: Buffer) -> None:
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.prefix + key,
+            Body=content if isinstance(content, bytes) else BufferFile(content),
+        )
+
+    def touch(self, key: str) -> bool:
+        try:
+            # Copied in place on the server, renews `LastModified`
+            self.client.copy_object(
+                Bucket=self.bucket,
+                Key=self.prefix + key,
+                CopySource={"Bucket": self.bucket, "Key": self.prefix + key},
+                MetadataDirective="REPLACE",
+            )
+            return True
+        except self.client.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def open(self, key: str) -> StoredFile | None:
+        head = self._head(key)
+        if head is None:
+            return None
+        size = head["ContentLength"]
+        return S3File(self.client, self.bucket, self.prefix + key, size), size
+
+    def delete(self, key: str, before: float | None = None) -> None:
+        if before is not None:
+            head = self._head(key)
+            if head is None or head["LastModified"].timestamp() > before:
+                return
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+def parse_file_storage(url: str) -> FileStorage:
+    """
+    Parse the storage from its URL.
+
+    Parameters:
+        url (str): `memory`, `file:///path/to/directory`, or `s3://bucket/prefix?endpoint_url=...&region_name=...`.
+
+    Returns:
+        FileStorage: The storage.
+
+    Raises:
+        ValueError: If the URL is not supported.
+    """
+    if url in ("", "memory", "memory://"):
+        return MemoryStorage()
+    parsed = urlsplit(url)
+    if parsed.scheme == "file":
+        return LocalStorage(parsed.netloc + parsed.path)
+    if parsed.scheme == "s3":
+        return S3Storage(
+            parsed.netloc, parsed.path.lstrip("/"), **dict(parse_qsl(parsed.query))
+        )
+    raise ValueError(f"Unsupported file storage: {url}")
@@ -2,7 +2,7 @@
 This file contains all the built-in widget types.
 """
 
-from typing import Any
+from typing import Any, BinaryIO
 
 from funix.widget import code, slider, textarea
 
@@ -281,6 +281,31 @@ class BytesFile(bytes):
     pass
 
 
+@new_built_in_type("file")
+class PathFile(str):
+    """
+    The built-in str type's file, the path of the uploaded file.
+    For input.
+
+    Base Class: str
+    """
+
+    __funix_upload__ = "path"
+
+
+@new_built_in_type("file")
+class StreamFile(BinaryIO):
+    """
+    The built-in binary stream type's file, the uploaded file opened in binary mode (a temp file for the data URIs),
+    it is closed after the call.
+    For input.
+
+    Base Class: typing.BinaryIO
+    """
+
+    __funix_upload__ = "file"
+
+
 def str_code(*args, **kwargs) -> Any:
     """
     The built-in str type's code.
@@ -0,0 +1,87 @@
+"""
+Per-call overhead benchmark: `sys.settrace` frame snatching vs. the direct call path.
+
+Funix used to install a trace function on every HTTP call to snatch the callee's frame, only needed for `Callable`
+results. Now the function is called directly and the locals a lambda needs are read from its closure. This script
+times a trivial function through both paths, plus the end-to-end `POST /call/<path>` through the Flask test client.
+
+Usage:
+    python benchmarks/call_overhead.py [--number 200000]
+"""
+
+import argparse
+import sys
+import timeit
+
+import funix
+from funix.app import app
+from funix.decorator import enable_wrapper
+from funix.decorator.call import call_function
+
+# The routes are only registered once the wrapper is enabled
+enable_wrapper()
+
+
+def call_function_get_frame(func, *args, **kwargs):
+    """
+    The old path, kept here for comparison.
+    """
+    frame = None
+    trace = sys.gettrace()
+
+    def snatch_locals(_frame, name, arg):
+        nonlocal frame
+        if frame is None and name == "call":
+            frame = _frame
+            sys.settrace(trace)
+        return trace
+
+    sys.settrace(snatch_locals)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        sys.settrace(trace)
+    return frame, result
+
+
+@funix.funix()
+def add(a: int = 1, b: int = 2) -> int:
+    return a + b
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=200000)
+    args = parser.parse_args()
+
+    def report(name: str, seconds: float, number: int):
+        print(f"{name:<28} {seconds / number * 1e9:>10.1f} ns/call")
+
+    number = args.number
+    report("direct", timeit.timeit(lambda: add(a=1, b=2), number=number), number)
+    report(
+        "call_function (now)",
+        timeit.timeit(lambda: call_function(add, a=1, b=2), number=number),
+        number,
+    )
+    report(
+        "settrace snatching (before)",
+        timeit.timeit(lambda: call_function_get_frame(add, a=1, b=2), number=number),
+        number,
+    )
+
+    client = app.test_client()
+    assert client.post("/call/add", json={"a": 1, "b": 2}).json == ["3"]
+    requests_number = max(number // 100, 100)
+    report(
+        "POST /call/add",
+        timeit.timeit(
+            lambda: client.post("/call/add", json={"a": 1, "b": 2}),
+            number=requests_number,
+        ),
+        requests_number,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Memory benchmark: encoding large results at once vs. the streaming JSON encoder.
+
+Funix used to turn a DataFrame into records with `json.loads(dataframe.to_json())`, and to encode the whole envelope
+with `jsonify`, so the Python objects and the full JSON text lived in memory together. Now HTTP results go through
+`funix.util.json_stream.json_response`, which writes the envelope chunk by chunk and DataFrames slice by slice.
+This script reports the peak traced memory and the time of both paths for a large DataFrame and a large list,
+consuming the streamed body chunk by chunk the way a WSGI server writes it to the socket.
+
+Usage:
+    python benchmarks/json_memory.py [--rows 1000000]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from flask import jsonify
+from numpy import arange
+from pandas import DataFrame
+
+from funix.app import app
+from funix.config.switch import GlobalSwitchOption
+from funix.decorator.magic import get_dataframe_json
+from funix.util.json_stream import json_response
+
+
+def measure(name: str, encode):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with app.app_context():
+        size = sum(len(chunk) for chunk in encode().iter_encoded())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:<28} {size / 2**20:>8.1f} MiB body {peak / 2**20:>10.1f} MiB peak {elapsed:>8.2f} s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+    # Encode the whole DataFrame, not only the first page of a result handle
+    GlobalSwitchOption.RESULT_PAGE_SIZE = -1
+
+    dataframe = DataFrame(
+        {
+            "id": arange(args.rows),
+            "value": arange(args.rows) / 7,
+            "name": [f"row {i}" for i in range(args.rows)],
+        }
+    )
+    measure(
+        "DataFrame, at once (before)",
+        lambda: jsonify([{"result": [get_dataframe_json(dataframe)]}]),
+    )
+    measure(
+        "DataFrame, streamed (now)",
+        lambda: json_response([{"result": [get_dataframe_json(dataframe, True)]}]),
+    )
+
+    values = [{"id": i, "value": i / 7} for i in range(args.rows)]
+    measure("list, at once (before)", lambda: jsonify([values]))
+    measure("list, streamed (now)", lambda: json_response([values]))
+
+
+if __name__ == "__main__":
+    main()
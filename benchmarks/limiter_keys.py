@@ -0,0 +1,122 @@
+"""
+Limiter benchmark: the memory and speed of the rate limit algorithms under calls from many distinct IPs.
+
+Funix used to keep a deque of call times per source in a dict that never forgot a source, so a scraping attack from
+many IPs grew the memory without bound. Now the states are kept in a `funix.util.limit_store.LimitStore`, expire
+with the period and are swept, and `Limiter(algorithm=...)` can keep a constant-size state per source. This script
+replays calls from distinct IPs through the old dict of deques and through each algorithm on the in-memory store,
+then sweeps the idle sources.
+
+Usage:
+    python benchmarks/limiter_keys.py [--ips 1000000] [--calls 3]
+"""
+
+import argparse
+import time
+import tracemalloc
+from collections import deque
+from typing import Callable
+
+from funix.decorator.limit import Limiter
+from funix.hint import LimitSource
+from funix.util.limit_store import MemoryStore
+
+
+def old_limiter(max_calls: int, period: int) -> tuple[Callable[[str], bool], dict]:
+    call_history = {}
+
+    def call(source: str) -> bool:
+        if source not in call_history:
+            call_history[source] = deque()
+        queue = call_history[source]
+        current_time = time.time()
+        while len(queue) > 0 and current_time - queue[0] > period:
+            queue.popleft()
+        if len(queue) >= max_calls:
+            return False
+        queue.append(current_time)
+        return True
+
+    return call, call_history
+
+
+def new_limiter(
+    algorithm: str, max_calls: int, period: int
+) -> tuple[Callable[[str], bool], MemoryStore]:
+    store = MemoryStore()
+    limiter = Limiter(
+        max_calls=max_calls,
+        period=period,
+        source=LimitSource.IP,
+        store=store,
+        algorithm=algorithm,
+    )
+    limiter.set_scope("benchmark")
+
+    def call(source: str) -> bool:
+        return (
+            store.update(f"benchmark:IP:{source}", limiter._update, limiter.ttl) is None
+        )
+
+    return call, store
+
+
+def replay(call: Callable[[str], bool], ips: list[str], calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        for ip in ips:
+            call(ip)
+    return time.perf_counter() - start
+
+
+def measure(name: str, make, ips: list[str], calls: int):
+    call, _ = make()
+    elapsed = replay(call, ips, calls)
+    tracemalloc.start()
+    call, state = make()
+    replay(call, ips, calls)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del state
+    print(
+        f"{name:<24} {len(ips) * calls / elapsed / 1000:>8.0f} k calls/s"
+        f" {memory / 2**20:>8.0f} MiB {memory / len(ips):>6.0f} B/IP"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ips", type=int, default=1_000_000)
+    parser.add_argument("--calls", type=int, default=3, help="calls per IP")
+    parser.add_argument("--max-calls", type=int, default=10)
+    args = parser.parse_args()
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.ips)]
+
+    measure(
+        "deques (before)",
+        lambda: old_limiter(args.max_calls, 60),
+        ips,
+        args.calls,
+    )
+    for algorithm in ("sliding_log", "sliding_window", "token_bucket"):
+        measure(
+            algorithm,
+            lambda: new_limiter(algorithm, args.max_calls, 60),
+            ips,
+            args.calls,
+        )
+
+    # The sources go idle, the sweep forgets them
+    call, store = new_limiter("token_bucket", args.max_calls, 1)
+    replay(call, ips, 1)
+    time.sleep(1)
+    start = time.perf_counter()
+    store.sweep()
+    print(
+        f"{'sweep':<24} {time.perf_counter() - start:>8.2f} s,"
+        f" {store.stats()['keys']} of {len(ips)} IPs left"
+    )
+
+
+if __name__ == "__main__":
+    main()
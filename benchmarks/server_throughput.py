@@ -0,0 +1,130 @@
+"""
+Throughput benchmark: Flask development server vs. gunicorn production server.
+
+Starts the same Funix app under each server in a subprocess, then hammers `POST /call/<path>` from a pool of
+client threads and reports requests per second and latency percentiles.
+
+Usage:
+    python benchmarks/server_throughput.py [--duration 10] [--clients 32] [--workers 4] [--threads 32] [--sleep 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socket import AF_INET, SOCK_STREAM, socket
+
+import requests
+
+APP_SOURCE = """
+import time
+
+import funix
+
+
+@funix.funix()
+def bench(n: int = 1000, sleep_ms: int = 0) -> int:
+    if sleep_ms:
+        time.sleep(sleep_ms / 1000)
+    return sum(range(n))
+"""
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket(AF_INET, SOCK_STREAM) as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+
+def run_load(port: int, duration: float, clients: int, sleep_ms: int) -> dict:
+    url = f"http://127.0.0.1:{port}/call/bench"
+    deadline = time.time() + duration
+
+    def client() -> list[float]:
+        latencies = []
+        session = requests.Session()
+        while time.time() < deadline:
+            start = time.perf_counter()
+            response = session.post(url, json={"n": 1000, "sleep_ms": sleep_ms})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    with ThreadPoolExecutor(clients) as pool:
+        results = list(pool.map(lambda _: client(), range(clients)))
+
+    latencies = sorted(latency for result in results for latency in result)
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / duration,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def bench_server(
+    app_file: str, port: int, extra_args: list[str], args: argparse.Namespace
+) -> dict:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "funix", app_file, "-F", "-B", "-p", str(port)]
+        + extra_args,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env={**os.environ, "FUNIX_TELEMETRY": "off"},
+    )
+    try:
+        wait_for_port(port)
+        time.sleep(1)
+        return run_load(port, args.duration, args.clients, args.sleep)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument(
+        "--sleep", type=int, default=5, help="simulated I/O per call, in ms"
+    )
+    parser.add_argument("--port", type=int, default=3900)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        app_file = os.path.join(tempdir, "bench_app.py")
+        with open(app_file, "w") as f:
+            f.write(APP_SOURCE)
+
+        servers = {
+            "werkzeug (dev)": [],
+            f"gunicorn ({args.workers}x{args.threads})": [
+                "--workers",
+                str(args.workers),
+                "--threads",
+                str(args.threads),
+            ],
+        }
+        print(
+            f"{args.clients} clients, {args.duration}s per server, {args.sleep}ms simulated I/O per call"
+        )
+        for index, (name, extra_args) in enumerate(servers.items()):
+            result = bench_server(app_file, args.port + index, extra_args, args)
+            print(
+                f"{name:<24} {result['rps']:>9.1f} req/s  "
+                f"p50 {result['p50_ms']:>7.2f} ms  p99 {result['p99_ms']:>7.2f} ms  "
+                f"({result['requests']} requests)"
+            )
+
+
+if __name__ == "__main__":
+    main()
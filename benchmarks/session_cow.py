@@ -0,0 +1,88 @@
+"""
+Session benchmark: the memory of many browsers reading a large default global variable.
+
+Funix used to deep copy the default of a global variable into the variables of a browser the first time it read it,
+so every visitor of an app reading a word list or a lookup table kept its own copy, in the session store, until it
+expired. With `set_default_global_variable(..., shared=True)` (or `GlobalSwitchOption.SHARE_DEFAULT_GLOBAL_VARIABLES`,
+`funix -t -c` for transformed apps), a browser that has not changed the variable reads the default through a
+copy-on-write view of `funix.session.shared`, and only the browsers changing it get a copy.
+This script runs the requests of the sessions through `get_global_variable` and the in-memory session store, with a
+few of them changing the variable.
+
+Usage:
+    python benchmarks/session_cow.py [--sessions 10000] [--words 500] [--write-ratio 0.01]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from flask import Flask, session
+
+from funix.config.switch import GlobalSwitchOption
+from funix.session import (
+    get_global_variable,
+    save_session_variables,
+    set_default_global_variable,
+    set_session_store,
+)
+from funix.util.session_store import MemoryStore
+
+app = Flask(__name__)
+app.secret_key = "benchmark"
+
+
+def simulate(sessions: int, write_ratio: float) -> MemoryStore:
+    store = MemoryStore()
+    set_session_store(store)
+    writer = random.Random(0)
+    for i in range(sessions):
+        with app.test_request_context():
+            session["__funix_id"] = str(i)
+            vocabulary = get_global_variable("vocabulary")
+            word = random.choice(vocabulary["words"])
+            if writer.random() < write_ratio:
+                vocabulary["scores"][word] = [1, 0, 0]
+            save_session_variables()
+    return store
+
+
+def measure(name: str, default: dict, shared: bool, sessions: int, write_ratio):
+    set_default_global_variable("vocabulary", default, shared=shared)
+    start = time.perf_counter()
+    simulate(sessions, write_ratio)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    store = simulate(sessions, write_ratio)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        f"{name:<24} {sessions / elapsed / 1000:>8.1f} k sessions/s"
+        f" {memory / 2**20:>8.1f} MiB {memory / sessions:>8.0f} B/session"
+        f" {sum(len(variables) for variables, _, _ in store._variables.values())} copies"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--words", type=int, default=500)
+    parser.add_argument(
+        "--write-ratio",
+        type=float,
+        default=0.01,
+        help="the ratio of the sessions changing the variable",
+    )
+    args = parser.parse_args()
+    # The store estimates the size of the variables, no eviction here
+    GlobalSwitchOption.SESSION_MEMORY_LIMIT = -1
+    words = [f"word{i}" for i in range(args.words)]
+    default = {"words": words, "scores": {word: [0, 0, 0] for word in words}}
+
+    measure("deepcopy (before)", default, False, args.sessions, args.write_ratio)
+    measure("copy-on-write", default, True, args.sessions, args.write_ratio)
+
+
+if __name__ == "__main__":
+    main()
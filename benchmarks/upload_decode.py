@@ -0,0 +1,126 @@
+"""
+Upload benchmark: reading the files of a "multiple" upload widget one by one vs. in the upload pool.
+
+Funix used to decode every data URI of a "multiple" upload widget with `urlopen`, one after another, before calling
+the function. Now `funix.decorator.upload.get_upload_arguments` decodes data URIs with `base64.b64decode` and reads
+them and remote URLs in parallel in a bounded pool, while the files uploaded to `/upload` are read from disk without
+decoding. This script reports both paths for data URIs and for remote URLs served with a fixed latency, and the
+uploaded files for reference.
+
+Usage:
+    python benchmarks/upload_decode.py [--files 50] [--size 5] [--latency 0.05]
+"""
+
+import argparse
+import os
+import time
+from base64 import b64encode
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from threading import Thread
+from typing import List
+from urllib.request import urlopen
+
+from funix import funix
+from funix.app import app
+from funix.decorator import enable_wrapper
+from funix.decorator.upload import get_upload_arguments
+from funix.hint import BytesFile
+
+enable_wrapper()
+
+
+@funix(upload_limit=-1)
+def upload_benchmark(files: List[BytesFile]) -> int:
+    return len(files)
+
+
+def serial(values: list) -> list:
+    result = []
+    for value in values:
+        with urlopen(value) as rsp:
+            result.append(rsp.read())
+    return result
+
+
+def measure(name: str, read, values: list, size: int):
+    start = time.perf_counter()
+    with app.test_request_context():
+        result = read(values)
+    elapsed = time.perf_counter() - start
+    assert len(result) == len(values) and all(len(item) == size for item in result)
+    print(
+        f"{name:<32} {elapsed:>8.2f} s {len(values) * size / 2**20 / elapsed:>10.1f} MiB/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--size", type=int, default=5, help="MiB per file")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    args = parser.parse_args()
+    size = args.size * 2**20
+    contents = [os.urandom(size) for _ in range(args.files)]
+
+    client = app.test_client()
+    function_id = client.get("/param/upload_benchmark").json["id"]
+
+    def pooled(values: list) -> list:
+        return get_upload_arguments(values, function_id, "bytes")
+
+    data_uris = [
+        "data:application/octet-stream;base64," + b64encode(content).decode()
+        for content in contents
+    ]
+    measure("data URIs, urlopen (before)", serial, data_uris, size)
+    measure("data URIs, pool (now)", pooled, data_uris, size)
+
+    tokens = client.post(
+        "/upload/upload_benchmark",
+        data={
+            "files": [(BytesIO(content), f"{i}") for i, content in enumerate(contents)]
+        },
+        content_type="multipart/form-data",
+    ).json["tokens"]
+    with client.session_transaction() as session:
+        owner = session["__funix_id"]
+
+    def with_session(read):
+        def read_tokens(values: list) -> list:
+            from flask import session
+
+            session["__funix_id"] = owner
+            return read(values)
+
+        return read_tokens
+
+    measure("uploads (now, no decoding)", with_session(pooled), tokens, size)
+
+    with TemporaryDirectory() as directory:
+        for i, content in enumerate(contents):
+            with open(os.path.join(directory, str(i)), "wb") as f:
+                f.write(content)
+
+        class Handler(SimpleHTTPRequestHandler):
+            def __init__(self, *handler_args, **handler_kwargs):
+                super().__init__(*handler_args, directory=directory, **handler_kwargs)
+
+            def do_GET(self):
+                time.sleep(args.latency)
+                super().do_GET()
+
+            def log_message(self, *_):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        urls = [f"http://127.0.0.1:{server.server_port}/{i}" for i in range(args.files)]
+        measure("remote URLs, urlopen (before)", serial, urls, size)
+        measure("remote URLs, pool (now)", pooled, urls, size)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -33,6 +33,7 @@ import { storeAtom } from "../../store";
 import { enqueueSnackbar } from "notistack";
 import FunixRecorder from "../../shared/media";
 import { WidgetProps } from "@rjsf/utils";
+import { UPLOAD_PREFIX, uploadFiles } from "../../shared";
 
 interface FileUploadWidgetInterface {
   widget: WidgetProps;
@@ -95,7 +96,9 @@ const CameraPreviewVideo = () => {
 };
 
 const FileUploadWidget = (props: FileUploadWidgetInterface) => {
-  const [{ backHistory }] = useAtom(storeAtom);
+  const [
+    { backHistory, backend, selectedFunction, functionSecret, appSecret },
+  ] = useAtom(storeAtom);
   const [files, setFiles] = React.useState<File[]>([]);
   const [open, setOpen] = React.useState(false);
   const [cameraOpen, setCameraOpen] = React.useState(false);
@@ -108,9 +111,13 @@ const FileUploadWidget = (props: FileUploadWidgetInterface) => {
   const supportMediaDevices = navigator.mediaDevices !== undefined;
   const funixRecorder = new FunixRecorder();
 
+  // The upload limit of the function (bytes), -1 for no limit
+  const uploadLimit: number = props.widget.schema.upload_limit ?? -1;
+  const maxSize = uploadLimit === -1 ? undefined : uploadLimit;
+
   let dropzoneConfig: DropzoneOptions = !props.multiple
-    ? { multiple: false, maxFiles: 1, maxSize: 1024 * 1024 * 15 }
-    : { multiple: true, maxFiles: 0, maxSize: 1024 * 1024 * 15 };
+    ? { multiple: false, maxFiles: 1, maxSize }
+    : { multiple: true, maxFiles: 0, maxSize };
 
   switch (props.supportType) {
     case "image":
@@ -154,23 +161,43 @@ const FileUploadWidget = (props: FileUploadWidgetInterface) => {
 
   useEffect(() => {
     if (files.length > 0) {
-      if (props.multiple) {
+      if (backend === null || selectedFunction === null) {
         Promise.all(files.map((file) => fileToBase64(file))).then((values) => {
-          props.widget.onChange(values);
-        });
-      } else {
-        fileToBase64(files[0]).then((value) => {
-          props.widget.onChange(value);
+          props.widget.onChange(props.multiple ? values : values[0]);
         });
+        return;
       }
+      // Checked like a call, before the files are read
+      const secret = selectedFunction.secret
+        ? (functionSecret[selectedFunction.path] ?? appSecret)
+        : null;
+      uploadFiles(
+        new URL(`/__funix/upload/${selectedFunction.id}`, backend),
+        props.multiple ? files : [files[0]],
+        secret !== null ? { headers: { "X-Funix-Secret": secret } } : undefined,
+      )
+        .then((response) => {
+          if ("tokens" in response) {
+            props.widget.onChange(
+              props.multiple ? response.tokens : response.tokens[0],
+            );
+          } else {
+            enqueueSnackbar(response.error_body, { variant: "error" });
+          }
+        })
+        .catch((error) => {
+          enqueueSnackbar(`Failed to upload ${fileString}: ${error}`, {
+            variant: "error",
+          });
+        });
     }
   }, [acceptedFiles, update]);
 
   useEffect(() => {
     fileRejections.forEach((file) => {
-      if (file.file.size >= 1024 * 1024 * 15) {
+      if (maxSize !== undefined && file.file.size > maxSize) {
         enqueueSnackbar(
-          `${file.file.name} is bigger than 15MB, use WebAPI to call this function`,
+          `${file.file.name} is bigger than ${fileSizeToReadable(maxSize)}`,
           {
             variant: "warning",
           },
@@ -191,12 +218,17 @@ const FileUploadWidget = (props: FileUploadWidgetInterface) => {
       setFiles([]);
       // ehh no, need somebody write better code please
       const data = backHistory["input"][props.widget.name];
+      // Uploaded files are kept on the server, only data URIs can be restored
+      const isDataUri = (value: any) =>
+        typeof value === "string" && !value.startsWith(UPLOAD_PREFIX);
       if (typeof data === "string") {
-        setFiles([base64stringToFile(data)]);
-      } else {
-        const newFiles = (data as string[]).map((data) =>
-          base64stringToFile(data),
-        );
+        if (isDataUri(data)) {
+          setFiles([base64stringToFile(data)]);
+        }
+      } else if (Array.isArray(data)) {
+        const newFiles = data
+          .filter(isDataUri)
+          .map((data: string) => base64stringToFile(data));
         setFiles(newFiles);
       }
     }
@@ -549,7 +581,9 @@ const FileUploadWidget = (props: FileUploadWidgetInterface) => {
               </TableCell>
               <TableCell colSpan={2} align="right">
                 <Typography variant="caption" component="span">
-                  You can select up to 5 files, limited to 15MB for each file
+                  You can select up to 5 files
+                  {maxSize !== undefined &&
+                    `, limited to ${fileSizeToReadable(maxSize)} in total`}
                 </Typography>
               </TableCell>
             </TableFooter>
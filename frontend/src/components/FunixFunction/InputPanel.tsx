@@ -26,6 +26,7 @@ import _ from "lodash";
 import { Form } from "@rjsf/mui";
 import validator from "@rjsf/validator-ajv8";
 import { RJSFSchema } from "@rjsf/utils";
+import { ARROW_MIME, packSheetColumns } from "../../shared/arrow";
 
 const InputPanel = (props: {
   detail: FunctionDetail;
@@ -218,6 +219,55 @@ const InputPanel = (props: {
     );
   };
 
+  // With pyarrow in the backend, sheet columns are sent and DataFrames are
+  // received in Arrow IPC, see `shared/arrow.ts`
+  const callFunctionHttp = (form: Record<string, any>) => {
+    const url = new URL(`/call/${props.detail.id}`, props.backend);
+    if (!props.detail.arrow) {
+      return callFunctionRaw(url, form);
+    }
+    const sheetColumns = Object.fromEntries(
+      Object.entries(props.detail.schema.properties)
+        .filter(([, value]) => (value as any).widget === "sheet")
+        .map(([key, value]) => [key, (value as any).items?.type]),
+    );
+    return callFunctionRaw(url, packSheetColumns(form, sheetColumns), {
+      headers: { Accept: `${ARROW_MIME}, application/json` },
+    });
+  };
+
+  const isQueueMessage = (data: string) => {
+    if (!data.startsWith('{"queue_position"')) {
+      return false;
+    }
+    const position = JSON.parse(data)["queue_position"];
+    enqueueSnackbar(`Waiting in queue, position ${position}`, {
+      variant: "info",
+      preventDuplicate: true,
+    });
+    return true;
+  };
+
+  // `print_to_web` only sends the new text, rebuild the full output
+  const createStreamDecoder = () => {
+    const buffers: Record<string, string> = { out: "", err: "" };
+    return (data: string) => {
+      if (!data.startsWith('{"stream_delta"')) {
+        return data;
+      }
+      const message = JSON.parse(data);
+      const stream = message["stream_error"] ? "err" : "out";
+      if (message["stream_reset"]) {
+        buffers[stream] = "";
+      }
+      buffers[stream] += message["stream_delta"];
+      const text = buffers[stream];
+      return JSON.stringify([
+        stream === "err" && text.trim() ? `\`${text}\`` : text,
+      ]);
+    };
+  };
+
   const handleSubmitWithoutHistory = async (
     form: Record<string, any> | undefined = undefined,
   ) => {
@@ -226,15 +276,20 @@ const InputPanel = (props: {
     checkResponse().then();
     if (props.preview.websocket) {
       const socket = new WebSocket(getWebsocketUrl());
+      const decodeStream = createStreamDecoder();
       socket.addEventListener("open", function () {
         socket.send(JSON.stringify(newForm));
         props.setOutdated(() => false);
       });
 
       socket.addEventListener("message", function (event) {
-        props.setResponse(() => event.data);
+        if (isQueueMessage(event.data)) {
+          return;
+        }
+        const data = decodeStream(event.data);
+        props.setResponse(() => data);
         props.setOutdated(() => false);
-        setTempOutput(() => event.data);
+        setTempOutput(() => data);
       });
 
       socket.addEventListener("close", async function () {
@@ -242,10 +297,7 @@ const InputPanel = (props: {
         setRequestDone(() => true);
       });
     } else {
-      const response = await callFunctionRaw(
-        new URL(`/call/${props.detail.id}`, props.backend),
-        newForm,
-      );
+      const response = await callFunctionHttp(newForm);
       const result = response.toString();
       props.setResponse(() => result);
       setWaiting(() => false);
@@ -261,6 +313,7 @@ const InputPanel = (props: {
     checkResponse().then();
     if (props.preview.websocket) {
       const socket = new WebSocket(getWebsocketUrl());
+      const decodeStream = createStreamDecoder();
       socket.addEventListener("open", function () {
         setTempOutput(() => null);
         socket.send(JSON.stringify(newForm));
@@ -268,7 +321,10 @@ const InputPanel = (props: {
       });
 
       socket.addEventListener("message", function (event) {
-        const data = structuredClone(event.data);
+        if (isQueueMessage(event.data)) {
+          return;
+        }
+        const data = decodeStream(event.data);
         props.setResponse(() => data);
         setTempOutput(() => data);
       });
@@ -309,10 +365,7 @@ const InputPanel = (props: {
         }
       });
     } else {
-      const response = await callFunctionRaw(
-        new URL(`/call/${props.detail.id}`, props.backend),
-        newForm,
-      );
+      const response = await callFunctionHttp(newForm);
       const result = response.toString();
       props.setResponse(() => result);
       props.setOutdated(() => false);
@@ -1,8 +1,26 @@
-import { GridColDef, GridToolbar } from "@mui/x-data-grid";
+import {
+  GridColDef,
+  GridFilterModel,
+  GridPaginationModel,
+  GridSortModel,
+  GridToolbar,
+} from "@mui/x-data-grid";
 import { DataGrid } from "../../../Key";
 import { Box, Stack, Typography } from "@mui/material";
-import { useMemo } from "react";
+import { useEffect, useMemo, useState } from "react";
 import React from "react";
+import {
+  ARROW_MIME,
+  ArrowTable,
+  arrowToRecords,
+  isArrowTable,
+} from "../../../shared/arrow";
+import {
+  getResultPage,
+  isResultTable,
+  RESULT_KEY,
+  ResultTable,
+} from "../../../shared";
 
 const getStringDisplayLength = (display: string) => {
   const element = document.createElement("div");
@@ -34,26 +52,105 @@ const anyToString = (any: any) => {
   return any.toString();
 };
 
+const decodeRows = (rows: { [key: string]: any }[] | ArrowTable) =>
+  isArrowTable(rows) ? arrowToRecords(rows) : rows;
+
 const OutputDataframe = React.memo(
   (props: {
-    dataframe: { [key: string]: any }[];
+    dataframe: { [key: string]: any }[] | ArrowTable | ResultTable;
     gridHeight: number;
     checkboxSelection: boolean;
+    backend?: URL;
   }) => {
-    const isEmptyDataframe = props.dataframe.length === 0;
+    // Large tables are kept on the server, only the first page is inline,
+    // the others are fetched with the sort and filter of the grid
+    const resultTable = isResultTable(props.dataframe) ? props.dataframe : null;
+    const [page, setPage] = useState<ResultTable | null>(null);
+    const [loading, setLoading] = useState(false);
+    const [paginationModel, setPaginationModel] = useState<GridPaginationModel>(
+      { page: 0, pageSize: 100 },
+    );
+    const [sortModel, setSortModel] = useState<GridSortModel>([]);
+    const [filterModel, setFilterModel] = useState<GridFilterModel>({
+      items: [],
+    });
+
+    const inlineRows = useMemo(
+      () =>
+        isResultTable(props.dataframe)
+          ? decodeRows(props.dataframe.rows)
+          : decodeRows(props.dataframe),
+      [props.dataframe],
+    );
+    const offset = paginationModel.page * paginationModel.pageSize;
+    const isInlinePage =
+      sortModel.length === 0 &&
+      filterModel.items.length === 0 &&
+      offset + paginationModel.pageSize <= inlineRows.length;
+
+    useEffect(() => {
+      if (resultTable === null || isInlinePage || props.backend === undefined) {
+        setPage(() => null);
+        return;
+      }
+      let cancelled = false;
+      const query = new URLSearchParams({
+        offset: offset.toString(),
+        limit: paginationModel.pageSize.toString(),
+        sort: JSON.stringify(sortModel),
+        filter: JSON.stringify(filterModel),
+      });
+      setLoading(() => true);
+      getResultPage(
+        new URL(
+          `/__funix/result/${resultTable[RESULT_KEY]}?${query}`,
+          props.backend,
+        ),
+        { headers: { Accept: `${ARROW_MIME}, application/json` } },
+      )
+        .then((result) => {
+          if (!cancelled) setPage(() => result);
+        })
+        .catch((e) => console.error(e))
+        .finally(() => {
+          if (!cancelled) setLoading(() => false);
+        });
+      return () => {
+        cancelled = true;
+      };
+    }, [
+      resultTable,
+      isInlinePage,
+      offset,
+      paginationModel.pageSize,
+      sortModel,
+      filterModel,
+      props.backend,
+    ]);
+
+    const dataframe = useMemo(() => {
+      if (resultTable === null) {
+        return inlineRows;
+      }
+      if (page !== null) {
+        return decodeRows(page.rows);
+      }
+      return inlineRows.slice(offset, offset + paginationModel.pageSize);
+    }, [resultTable, inlineRows, page, offset, paginationModel.pageSize]);
+    const rowOffset = resultTable === null ? 0 : (page?.offset ?? offset);
+    const isEmptyDataframe = resultTable === null && dataframe.length === 0;
     // const apiRef = useGridApiRef();
 
-    const { columns, newDataframe } = useMemo(() => {
-      if (isEmptyDataframe) {
-        return { columns: [], newDataframe: [] };
+    const columns = useMemo(() => {
+      if (inlineRows.length === 0) {
+        return [];
       }
 
-      const hasId = "id" in props.dataframe[0];
+      const hasId = "id" in inlineRows[0];
       const easyColumns: Record<string, GridColDef> = {};
       const columns: GridColDef[] = [];
-      const newDataframe: { [key: string]: any }[] = [];
 
-      const row = props.dataframe[0];
+      const row = inlineRows[0];
 
       if (!hasId) {
         columns.push({
@@ -74,7 +171,7 @@ const OutputDataframe = React.memo(
         };
       });
 
-      props.dataframe.forEach((row, index) => {
+      inlineRows.forEach((row) => {
         for (const key in row) {
           const width = getStringDisplayLength(anyToString(row[key])) * 1.25;
           if (key in easyColumns) {
@@ -86,20 +183,22 @@ const OutputDataframe = React.memo(
             }
           }
         }
-        if (!hasId) {
-          newDataframe[index] = {
-            id: index,
-            ...row,
-          };
-        } else {
-          newDataframe[index] = row;
-        }
       });
 
       columns.push(...Object.values(easyColumns));
 
-      return { columns, newDataframe, hasId };
-    }, [props.dataframe, isEmptyDataframe]);
+      return columns;
+    }, [inlineRows]);
+
+    const newDataframe = useMemo(() => {
+      if (dataframe.length === 0 || "id" in dataframe[0]) {
+        return dataframe;
+      }
+      return dataframe.map((row, index) => ({
+        id: rowOffset + index,
+        ...row,
+      }));
+    }, [dataframe, rowOffset]);
 
     // useEffect(() => {
     //   if (!apiRef.current) return;
@@ -150,6 +249,19 @@ const OutputDataframe = React.memo(
           // }}
           disableVirtualization
           checkboxSelection={props.checkboxSelection}
+          {...(resultTable !== null && {
+            paginationMode: "server",
+            sortingMode: "server",
+            filterMode: "server",
+            rowCount: page?.total ?? resultTable.total,
+            paginationModel,
+            onPaginationModelChange: setPaginationModel,
+            sortModel,
+            onSortModelChange: setSortModel,
+            filterModel,
+            onFilterModelChange: setFilterModel,
+            loading,
+          })}
           disableAutosize
           autosizeOptions={{
             includeHeaders: true,
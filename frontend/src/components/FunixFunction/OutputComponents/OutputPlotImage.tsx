@@ -1,6 +1,14 @@
 import { Card, CardMedia } from "@mui/material";
 
-export default function OutputPlotMedias(props: { media: string }) {
+export default function OutputPlotMedias(props: {
+  media: string;
+  backend: string;
+}) {
+  // Rendered figures are served by the file service
+  const media = props.media.startsWith("/file/")
+    ? new URL(props.media, props.backend).toString()
+    : props.media;
+
   return (
     <Card
       sx={{
@@ -9,7 +17,7 @@ export default function OutputPlotMedias(props: { media: string }) {
     >
       <CardMedia
         component="img"
-        image={props.media}
+        image={media}
         sx={{
           maxWidth: "100%",
           maxHeight: "100%",
@@ -272,6 +272,7 @@ const OutputPanel = (props: {
         return (
           <OutputDataframe
             dataframe={response}
+            backend={props.backend}
             gridHeight={theme?.funix_grid_height || 400}
             checkboxSelection={
               theme !== null && "funix_grid_checkbox" in theme
@@ -299,7 +300,12 @@ const OutputPanel = (props: {
       case "HTML":
         return <InnerHTML html={response} />;
       case "FigureImage":
-        return <OutputPlotMedias media={response} />;
+        return (
+          <OutputPlotMedias
+            media={response}
+            backend={props.backend.toString()}
+          />
+        );
       case "Images":
       case "Videos":
       case "Audios":
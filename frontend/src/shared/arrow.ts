@@ -0,0 +1,113 @@
+import {
+  Float64,
+  Int64,
+  Table,
+  Vector,
+  tableFromIPC,
+  tableToIPC,
+  vectorFromArray,
+} from "apache-arrow";
+
+// Arrow IPC transport for DataFrames, see `funix.util.arrow` in the backend
+export const ARROW_MIME = "application/vnd.apache.arrow.stream";
+export const ARROW_KEY = "__funix_arrow__";
+
+export type ArrowTable = {
+  [ARROW_KEY]: string;
+};
+
+export const isArrowTable = (value: any): value is ArrowTable =>
+  typeof value === "object" &&
+  value !== null &&
+  !Array.isArray(value) &&
+  typeof value[ARROW_KEY] === "string";
+
+const base64ToBytes = (base64: string) => {
+  const binary = atob(base64);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return bytes;
+};
+
+const bytesToBase64 = (bytes: Uint8Array) => {
+  const chunks: string[] = [];
+  // Chunked, `String.fromCharCode` takes the bytes as arguments
+  for (let i = 0; i < bytes.length; i += 0x8000) {
+    chunks.push(String.fromCharCode(...bytes.subarray(i, i + 0x8000)));
+  }
+  return btoa(chunks.join(""));
+};
+
+export const arrowToRecords = (value: ArrowTable) => {
+  const table = tableFromIPC(base64ToBytes(value[ARROW_KEY]));
+  const fields = table.schema.fields.map((field) => field.name);
+  const columns = fields.map((field) => table.getChild(field)!.toArray());
+  const records: { [key: string]: any }[] = new Array(table.numRows);
+  for (let row = 0; row < table.numRows; row++) {
+    const record: { [key: string]: any } = {};
+    fields.forEach((field, index) => {
+      const cell = columns[index][row];
+      // int64 columns come as BigInt, the grid wants numbers
+      record[field] = typeof cell === "bigint" ? Number(cell) : cell;
+    });
+    records[row] = record;
+  }
+  return records;
+};
+
+const isEmptyCell = (cell: any) => cell === null || cell === undefined;
+
+// Build a sheet column with the declared `items.type` of its parameter. Left
+// to inference, Arrow JS makes Float64 of all numbers, and the int columns
+// would reach pandas as floats
+const sheetColumnToVector = (values: any[], type?: string): Vector => {
+  const cells = values.filter((cell) => !isEmptyCell(cell));
+  if (type === "integer" && cells.every((cell) => Number.isSafeInteger(cell))) {
+    // Int64 vectors take BigInt
+    return vectorFromArray(
+      values.map((cell) => (isEmptyCell(cell) ? null : BigInt(cell))),
+      new Int64(),
+    );
+  }
+  if (
+    (type === "integer" || type === "number") &&
+    cells.every((cell) => typeof cell === "number")
+  ) {
+    return vectorFromArray(values, new Float64());
+  }
+  return vectorFromArray(values);
+};
+
+// Pack the sheet columns of the form into one Arrow IPC table, only if they
+// have the same length, otherwise the form is sent as it is. `columnTypes`
+// maps the names of the sheet columns to their declared `items.type`
+export const packSheetColumns = (
+  form: Record<string, any>,
+  columnTypes: Record<string, string | undefined>,
+) => {
+  const names = Object.keys(columnTypes).filter((name) =>
+    Array.isArray(form[name]),
+  );
+  if (names.length === 0) {
+    return form;
+  }
+  const length = form[names[0]].length;
+  if (names.some((name) => form[name].length !== length)) {
+    return form;
+  }
+  const packed: Record<string, any> = { ...form };
+  const columns: Record<string, Vector> = {};
+  try {
+    names.forEach((name) => {
+      columns[name] = sheetColumnToVector(form[name], columnTypes[name]);
+      delete packed[name];
+    });
+    packed[ARROW_KEY] = bytesToBase64(tableToIPC(new Table(columns), "stream"));
+  } catch {
+    // Mixed types in a column, keep JSON
+    return form;
+  }
+  return packed;
+};
@@ -1,5 +1,6 @@
 import { CellType, cellTypes } from "./sheet";
 import { History } from "./useFunixHistory";
+import { ArrowTable } from "./arrow";
 
 const f = (...args: Parameters<typeof fetch>) =>
   fetch(...args).then((response) => response.json());
@@ -173,6 +174,10 @@ export type FunctionDetail = {
    * Function direction
    */
   direction: "row" | "column" | "row-reverse" | "column-reverse";
+  /**
+   * Whether the backend can send and receive DataFrames in Arrow IPC
+   */
+  arrow?: boolean;
 };
 
 export async function getParam(
@@ -236,6 +241,53 @@ export async function callFunctionRaw(
   }).then((response) => response.text());
 }
 
+// Large DataFrame results are kept on the server, see `funix.decorator.result`
+export const RESULT_KEY = "__funix_result__";
+
+export type ResultTable = {
+  [RESULT_KEY]: string;
+  total: number;
+  offset: number;
+  rows: Record<string, any>[] | ArrowTable;
+};
+
+export const isResultTable = (value: any): value is ResultTable =>
+  typeof value === "object" &&
+  value !== null &&
+  !Array.isArray(value) &&
+  typeof value[RESULT_KEY] === "string";
+
+export async function getResultPage(
+  url: URL,
+  init?: RequestInit,
+): Promise<ResultTable> {
+  return f(url, {
+    ...init,
+    method: "GET",
+    credentials: "include",
+  });
+}
+
+// Files of the upload widgets are streamed to the server, see `funix.decorator.upload`
+export const UPLOAD_PREFIX = "funix-upload:";
+
+export type UploadResponse = { tokens: string[] } | PostCallResponseError;
+
+export async function uploadFiles(
+  url: URL,
+  files: File[],
+  init?: RequestInit,
+): Promise<UploadResponse> {
+  const body = new FormData();
+  files.forEach((file) => body.append("files", file, file.name));
+  return f(url, {
+    ...init,
+    method: "POST",
+    body,
+    credentials: "include",
+  });
+}
+
 export async function verifyToken(
   url: URL,
   secret: string,